@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import create_engine
+
+from twitchbot import ratelimit_twitch_api_queue
+from twitchbot.database import session, Base
+from twitchbot.database.cache import database_cache
+from twitchbot.util import task_util
+
+
+@pytest.fixture
+def fresh_task_state(monkeypatch):
+    """
+    gives the test its own task registry and twitch api queue,
+    as tasks and the queue are bound to the event loop of the asyncio.run() of the test that used them first
+    """
+    monkeypatch.setattr(task_util, 'active_tasks', {})
+    monkeypatch.setattr(ratelimit_twitch_api_queue, 'twitch_api_queue_send_handler', ratelimit_twitch_api_queue.TwitchApiQueueSendHandler())
+
+
+@pytest.fixture
+def sqlite_session(tmp_path):
+    """binds the database session to a new sqlite database in the test's temp folder"""
+    engine = create_engine(f'sqlite:///{tmp_path / "database.sqlite"}')
+    Base.metadata.create_all(engine)
+    session.remove()
+    session.configure(bind=engine)
+    database_cache.clear()
+    yield session
+    session.remove()
+    database_cache.clear()
@@ -0,0 +1,132 @@
+import json
+from datetime import datetime, timezone
+from typing import List, Optional
+from uuid import uuid4
+
+from aiohttp import web, WSMsgType
+
+
+class MockEventSubServer:
+    """
+    a local stand-in for twitch's EventSub websocket (`/ws`) and subscriptions api (`/eventsub/subscriptions`)
+
+    every connection gets a session_welcome, subscriptions created for a session are kept in `subscriptions`,
+    notifications are sent to the newest connection
+    """
+
+    def __init__(self, keepalive_timeout_seconds: int = 10, host: str = '127.0.0.1'):
+        self.keepalive_timeout_seconds = keepalive_timeout_seconds
+        self.host = host
+        self.port = 0
+        self.sockets: List[web.WebSocketResponse] = []
+        self.session_ids: List[str] = []
+        self.subscriptions: List[dict] = []
+        self.deleted_subscription_ids: List[str] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def ws_url(self) -> str:
+        return f'ws://{self.host}:{self.port}/ws'
+
+    @property
+    def subscriptions_url(self) -> str:
+        return f'http://{self.host}:{self.port}/eventsub/subscriptions'
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/ws', self._handle_websocket)
+        app.router.add_post('/eventsub/subscriptions', self._handle_create_subscription)
+        app.router.add_delete('/eventsub/subscriptions', self._handle_delete_subscription)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for socket in self.sockets:
+            await socket.close()
+        await self._runner.cleanup()
+
+    @staticmethod
+    def _message(message_type: str, payload: dict, **metadata) -> str:
+        return json.dumps({
+            'metadata': {
+                'message_id': uuid4().hex,
+                'message_type': message_type,
+                'message_timestamp': datetime.now(timezone.utc).isoformat(),
+                **metadata,
+            },
+            'payload': payload,
+        })
+
+    def _session(self, session_id: str, status: str = 'connected', reconnect_url: Optional[str] = None) -> dict:
+        return {
+            'id': session_id,
+            'status': status,
+            'keepalive_timeout_seconds': self.keepalive_timeout_seconds if status == 'connected' else None,
+            'reconnect_url': reconnect_url,
+        }
+
+    async def _handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+
+        # a migrated connection keeps the session (and subscriptions) of the connection it replaces
+        session_id = request.query.get('session_id') or uuid4().hex
+        self.sockets.append(socket)
+        self.session_ids.append(session_id)
+        await socket.send_str(self._message('session_welcome', {'session': self._session(session_id)}))
+
+        async for message in socket:
+            if message.type == WSMsgType.ERROR:
+                break
+
+        return socket
+
+    async def _handle_create_subscription(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if body.get('transport', {}).get('session_id') not in self.session_ids:
+            return web.json_response({'error': 'Bad Request', 'status': 400, 'message': 'websocket transport session does not exist'}, status=400)
+
+        subscription = {
+            'id': uuid4().hex,
+            'status': 'enabled',
+            'type': body['type'],
+            'version': body['version'],
+            'condition': body['condition'],
+            'transport': body['transport'],
+            'cost': 0,
+        }
+        self.subscriptions.append(subscription)
+        return web.json_response({'data': [subscription], 'total': len(self.subscriptions), 'total_cost': 0, 'max_total_cost': 10}, status=202)
+
+    async def _handle_delete_subscription(self, request: web.Request) -> web.Response:
+        subscription_id = request.query.get('id', '')
+        self.deleted_subscription_ids.append(subscription_id)
+        self.subscriptions = [subscription for subscription in self.subscriptions if subscription['id'] != subscription_id]
+        return web.Response(status=204)
+
+    async def send_keepalive(self):
+        await self.sockets[-1].send_str(self._message('session_keepalive', {}))
+
+    async def send_notification(self, subscription_type: str, event: dict, version: str = '1', message_id: str = None):
+        subscription = next((subscription for subscription in self.subscriptions if subscription['type'] == subscription_type), {})
+        metadata = {'subscription_type': subscription_type, 'subscription_version': version}
+        if message_id:
+            metadata['message_id'] = message_id
+        await self.sockets[-1].send_str(self._message('notification', {'subscription': subscription, 'event': event}, **metadata))
+
+    async def send_session_reconnect(self):
+        session_id = self.session_ids[-1]
+        payload = {'session': self._session(session_id, status='reconnecting', reconnect_url=f'{self.ws_url}?session_id={session_id}')}
+        await self.sockets[-1].send_str(self._message('session_reconnect', payload))
+
+    async def send_revocation(self, subscription_id: str):
+        subscription = next(subscription for subscription in self.subscriptions if subscription['id'] == subscription_id)
+        self.subscriptions.remove(subscription)
+        await self.sockets[-1].send_str(self._message('revocation', {'subscription': {**subscription, 'status': 'authorization_revoked'}}))
+
+    async def drop_connection(self):
+        """closes the newest connection without a session_reconnect, like a network failure"""
+        await self.sockets[-1].close()
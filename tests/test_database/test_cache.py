@@ -0,0 +1,42 @@
+from twitchbot import CustomCommand, add_custom_command, get_custom_command, get_cached_custom_command, get_currency_name, get_cached_currency_name
+from twitchbot import Quote, add_quote, get_cached_quote, delete_quote_by_id
+from twitchbot import set_message_timer, set_message_timer_interval, get_cached_message_timer
+from twitchbot import DBCounter, add_counter, increment_counter, get_cached_counter
+from twitchbot.database import session
+
+
+def test_getters_return_attached_rows(sqlite_session):
+    assert add_custom_command(CustomCommand.create('channel', 'hi', 'hello'))
+    assert get_cached_custom_command('channel', 'hi').response == 'hello'
+
+    # editing the row returned by a getter is saved by session.commit(), like before the cache was added
+    cmd = get_custom_command('channel', 'hi')
+    cmd.response = 'hey'
+    session.commit()
+    session.expire_all()
+    assert get_custom_command('channel', 'hi').response == 'hey'
+
+    currency = get_currency_name('channel')
+    currency.name = 'coins'
+    session.commit()
+    session.expire_all()
+    assert get_currency_name('channel').name == 'coins'
+    assert get_cached_currency_name('channel').name == 'coins'
+
+
+def test_cached_getters_are_invalidated_by_the_modifying_helpers(sqlite_session):
+    assert get_cached_quote('channel', 'q') is None
+    assert add_quote(Quote.create('channel', 'hello', alias='q'))
+    quote = get_cached_quote('channel', 'q')
+    assert quote.value == 'hello' and get_cached_quote('channel', quote.id).value == 'hello'
+    delete_quote_by_id('channel', quote.id)
+    assert get_cached_quote('channel', 'q') is None and get_cached_quote('channel', None) is None
+
+    set_message_timer('channel', 'timer', 'hi', 60)
+    assert get_cached_message_timer('channel', 'timer').interval == 60
+    set_message_timer_interval('channel', 'timer', 30)
+    assert get_cached_message_timer('channel', 'timer').interval == 30
+
+    assert add_counter(DBCounter.create('channel', alias='deaths'))
+    increment_counter('channel', 'deaths', 2)
+    assert get_cached_counter('channel', 'deaths').value == 2
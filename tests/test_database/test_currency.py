@@ -0,0 +1,13 @@
+from twitchbot import get_balance, get_currency_name, set_currency_name, add_balance_to_users
+
+
+def test_mixed_case_channel(sqlite_session):
+    assert get_balance('MixedCase', 'Bob').channel == 'mixedcase'
+    assert get_balance('mixedcase', 'bob') is get_balance('MIXEDCASE', 'BOB')
+
+    add_balance_to_users('MixedCase', ['Bob', 'Al'], 5)
+    assert get_balance('MixedCase', 'al').balance == get_balance('mixedcase', 'bob').balance
+
+    assert get_currency_name('MixedCase').name == 'points'
+    assert set_currency_name('MixedCase', 'coins')
+    assert get_currency_name('mixedCASE').name == 'coins'
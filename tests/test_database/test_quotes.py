@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from twitchbot import Quote, add_quote, search_quotes, get_random_quote, delete_quote_by_id
+from twitchbot.database import quotes as quotes_module
+
+QUOTES = ('the cat sat on the mat', 'a dog ate my homework', 'the dog chased the cat')
+
+
+@pytest.fixture
+def quotes_db(sqlite_session, monkeypatch):
+    monkeypatch.setattr(quotes_module, '_fts_enabled', None)
+    monkeypatch.setattr(quotes_module, '_quote_ids_cache', {})
+    monkeypatch.setattr(quotes_module, '_quote_word_index', {})
+    for value in QUOTES:
+        assert add_quote(Quote.create('channel', value))
+    assert add_quote(Quote.create('other_channel', 'the cat from another channel'))
+    return sqlite_session
+
+
+def _search(query: str):
+    return sorted(quote.value for quote in search_quotes('channel', query))
+
+
+def test_search_quotes_with_fts(quotes_db):
+    assert _search('cat') == ['the cat sat on the mat', 'the dog chased the cat']
+    assert quotes_module._fts_enabled is True
+    assert _search('DOG cat') == ['the dog chased the cat']
+    # user input is not interpreted as FTS5 query syntax
+    assert _search('cat OR "dog') == []
+    assert _search('bird') == [] and _search('!!') == []
+
+
+def test_search_quotes_with_in_memory_index(quotes_db, monkeypatch):
+    monkeypatch.setattr(quotes_module, '_fts_enabled', False)
+    assert _search('cat') == ['the cat sat on the mat', 'the dog chased the cat']
+    assert _search('DOG cat') == ['the dog chased the cat']
+
+    assert add_quote(Quote.create('channel', 'one more cat'))
+    assert _search('cat') == ['one more cat', 'the cat sat on the mat', 'the dog chased the cat']
+
+
+def test_fts_setup_is_retried_after_a_transient_error(quotes_db, monkeypatch):
+    bind = quotes_db.get_bind()
+    begin = bind.begin
+
+    def locked():
+        raise OperationalError('CREATE VIRTUAL TABLE', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(bind, 'begin', locked)
+    # the search falls back to the in-memory index, without disabling FTS5 for good
+    assert _search('cat') == ['the cat sat on the mat', 'the dog chased the cat']
+    assert quotes_module._fts_enabled is None
+
+    monkeypatch.setattr(bind, 'begin', begin)
+    assert _search('cat') == ['the cat sat on the mat', 'the dog chased the cat']
+    assert quotes_module._fts_enabled is True
+
+
+def test_fts_is_disabled_if_sqlite_has_no_fts5(quotes_db, monkeypatch):
+    def no_fts5():
+        raise OperationalError('CREATE VIRTUAL TABLE', {}, Exception('no such module: fts5'))
+
+    monkeypatch.setattr(quotes_db.get_bind(), 'begin', no_fts5)
+    assert _search('dog') == ['a dog ate my homework', 'the dog chased the cat']
+    assert quotes_module._fts_enabled is False
+
+
+def test_get_random_quote(quotes_db):
+    assert get_random_quote('empty_channel') is None
+
+    seen = {get_random_quote('channel').value for _ in range(200)}
+    assert seen == set(QUOTES)
+
+    # the cached quote ids follow added and deleted quotes
+    deleted = next(quote for quote in search_quotes('channel', 'homework'))
+    delete_quote_by_id('channel', deleted.id)
+    assert add_quote(Quote.create('channel', 'a new quote'))
+    seen = {get_random_quote('channel').value for _ in range(200)}
+    assert seen == set(QUOTES) - {'a dog ate my homework'} | {'a new quote'}
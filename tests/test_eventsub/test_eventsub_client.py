@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+from twitchbot import EventSubClient, EventSubSubscriptionTypes, Event, PubSubFollow, PubSubPollData
+from twitchbot import start_twitch_api_queue_send_handler_loop, stop_all_tasks, close_client_session
+from twitchbot.eventsub import client as eventsub_client_module
+from tests.mock_eventsub import MockEventSubServer
+
+HEADERS = {'Client-ID': 'client_id', 'Authorization': 'Bearer token'}
+FOLLOW_EVENT = {
+    'user_id': '1234', 'user_login': 'cool_user', 'user_name': 'Cool_User',
+    'broadcaster_user_id': '1337', 'broadcaster_user_login': 'cooler_user', 'broadcaster_user_name': 'Cooler_User',
+    'followed_at': '2020-07-15T18:16:11.17106713Z',
+}
+POLL_END_EVENT = {
+    'id': 'poll_id', 'broadcaster_user_id': '1337', 'broadcaster_user_login': 'cooler_user', 'title': 'Aren’t shoes just really hard socks?',
+    'choices': [
+        {'id': 'a', 'title': 'Yeah!', 'bits_votes': 0, 'channel_points_votes': 2, 'votes': 7},
+        {'id': 'b', 'title': 'No!', 'bits_votes': 0, 'channel_points_votes': 0, 'votes': 3},
+    ],
+    'status': 'completed',
+}
+
+
+async def _wait_until(predicate, timeout=5):
+    for _ in range(int(timeout / .01)):
+        if predicate():
+            return
+        await asyncio.sleep(.01)
+    raise AssertionError('condition was not met in time')
+
+
+async def _run_client_against_mock_server(events: list):
+    server = MockEventSubServer()
+    await server.start()
+    start_twitch_api_queue_send_handler_loop()
+
+    client = EventSubClient(headers=HEADERS)
+    client.EVENTSUB_WEBSOCKET_URL = server.ws_url
+    client.SUBSCRIPTIONS_API_URL = server.subscriptions_url
+
+    try:
+        assert await client.subscribe(EventSubSubscriptionTypes.follows, {'broadcaster_user_id': '1337', 'moderator_user_id': '1337'})
+        assert await client.subscribe(EventSubSubscriptionTypes.poll_end, {'broadcaster_user_id': '1337'})
+        assert len(server.subscriptions) == 2
+
+        # notifications are forwarded as pubsub events, duplicates (same message id) only once
+        await server.send_notification(EventSubSubscriptionTypes.follows, FOLLOW_EVENT, version='2', message_id='follow')
+        await server.send_notification(EventSubSubscriptionTypes.follows, FOLLOW_EVENT, version='2', message_id='follow')
+        await server.send_notification(EventSubSubscriptionTypes.poll_end, POLL_END_EVENT)
+        await _wait_until(lambda: any(event is Event.on_pubsub_twitch_poll_update for event, _ in events))
+
+        follows = [args[1] for event, args in events if event is Event.on_pubsub_user_follow]
+        assert len(follows) == 1
+        follow: PubSubFollow = follows[0]
+        assert (follow.follower_username, follow.follower_display_name, follow.follower_id, follow.channel_id) == ('cool_user', 'Cool_User', '1234', '1337')
+
+        poll: PubSubPollData = next(args[1] for event, args in events if event is Event.on_pubsub_twitch_poll_update)
+        assert poll.is_poll_complete and poll.status == 'COMPLETED' and poll.total_votes == 10
+        assert [(choice.title, choice.total_votes, choice.base_votes) for choice in poll.ordered_choices] == [('Yeah!', 7, 5), ('No!', 3, 3)]
+
+        # session_reconnect: the session moves to the new connection, its subscriptions are not created again
+        session_id, old_socket = client.session_id, client.socket
+        await server.send_session_reconnect()
+        await _wait_until(lambda: client.socket is not old_socket)
+        assert client.session_id == session_id and len(server.subscriptions) == 2
+
+        # the connection dropping: a new session is opened and the subscriptions are created again for it
+        await server.drop_connection()
+        await _wait_until(lambda: client.session_id not in ('', session_id) and len(server.subscriptions) == 4)
+        assert all(subscription.id for subscription in client.subscriptions.values())
+
+        # revoked subscriptions are forgotten
+        revoked_id = next(subscription.id for subscription in client.subscriptions.values() if subscription.type == EventSubSubscriptionTypes.follows)
+        await server.send_revocation(revoked_id)
+        await _wait_until(lambda: len(client.subscriptions) == 1)
+        assert await client.unsubscribe(EventSubSubscriptionTypes.poll_end, {'broadcaster_user_id': '1337'})
+        assert not client.subscriptions and len(server.deleted_subscription_ids) == 1
+    finally:
+        stop_all_tasks()
+        await close_client_session()
+        await server.stop()
+
+
+def test_eventsub_client_against_mock_server(monkeypatch, fresh_task_state):
+    events = []
+    monkeypatch.setattr(eventsub_client_module, 'forward_event', lambda event, *args, **kwargs: events.append((event, args)))
+    asyncio.run(_run_client_against_mock_server(events))
+
+
+async def _run_client_with_bad_messages(events: list):
+    server = MockEventSubServer()
+    await server.start()
+    start_twitch_api_queue_send_handler_loop()
+
+    client = EventSubClient(headers=HEADERS)
+    client.EVENTSUB_WEBSOCKET_URL = server.ws_url
+    client.SUBSCRIPTIONS_API_URL = server.subscriptions_url
+
+    try:
+        assert await client.subscribe(EventSubSubscriptionTypes.follows, {'broadcaster_user_id': '1337', 'moderator_user_id': '1337'})
+
+        # a notification without a payload raises while it is handled, the client must keep reading after it
+        await server.sockets[-1].send_str(json.dumps({
+            'metadata': {'message_id': 'bad', 'message_type': 'notification', 'subscription_type': EventSubSubscriptionTypes.follows},
+            'payload': None,
+        }))
+        # a redemption whose reward is null
+        await server.send_notification(EventSubSubscriptionTypes.channel_points_redemption,
+                                       {'id': 'redemption', 'broadcaster_user_id': '1337', 'reward': None, 'status': 'unfulfilled'})
+        await server.send_notification(EventSubSubscriptionTypes.follows, FOLLOW_EVENT, version='2')
+        await _wait_until(lambda: any(event is Event.on_pubsub_user_follow for event, _ in events))
+
+        assert any(event is Event.on_pubsub_custom_channel_point_reward for event, _ in events)
+    finally:
+        stop_all_tasks()
+        await close_client_session()
+        await server.stop()
+
+
+def test_eventsub_client_keeps_reading_after_a_bad_message(monkeypatch, fresh_task_state):
+    events = []
+    monkeypatch.setattr(eventsub_client_module, 'forward_event', lambda event, *args, **kwargs: events.append((event, args)))
+    asyncio.run(_run_client_with_bad_messages(events))
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from twitchbot import Channel, cfg, channels, get_balance
+from twitchbot.api import chatters as chatters_module
+from twitchbot.builtin_mods.channel_stat_updater_mod import ChannelStatUpdaterMod
+from twitchbot.builtin_mods.loyalty_ticker_mod import LoyaltyTicketMod
+from twitchbot.modloader import mods
+
+
+CHATTERS_PAGES = [
+    {'data': [{'user_login': 'lurker'}], 'total': 2, 'pagination': {'cursor': 'next'}},
+    {'data': [{'user_login': 'chatter'}], 'total': 2, 'pagination': {}},
+]
+
+
+async def _fake_chatters_pages(channel, headers=None, on_forbidden=None):
+    for page in CHATTERS_PAGES:
+        yield page
+
+
+async def _forbidden_chatters_pages(channel, headers=None, on_forbidden=None):
+    on_forbidden()
+    return
+    yield
+
+
+async def _update_chatters_and_pay(mod: LoyaltyTicketMod):
+    await ChannelStatUpdaterMod().update_all_channel_chatters()
+    # on_channel_chatters_changed is forwarded to the mods as a task
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    mod.viewers_for_channel('loyalty_channel')['chatter'] = time.time()
+    mod.give_loyalty_balance()
+
+
+def test_chatters_update_pays_lurkers_only_if_enabled(sqlite_session, monkeypatch):
+    monkeypatch.setattr(chatters_module, 'iter_channel_chatters_pages', _fake_chatters_pages)
+    monkeypatch.setitem(cfg.data, 'loyalty_amount', 5)
+    monkeypatch.setitem(cfg.data, 'loyalty_pay_lurkers', False)
+    mod = LoyaltyTicketMod()
+    monkeypatch.setitem(mods, mod.name, mod)
+    channel = Channel('loyalty_channel', irc=None)
+
+    try:
+        start = get_balance('loyalty_channel', 'lurker').balance
+        asyncio.run(_update_chatters_and_pay(mod))
+        assert channel.chatters.viewers == {'lurker', 'chatter'}
+        assert mod.channel_present_viewers['loyalty_channel'] == {'lurker', 'chatter'}
+        assert get_balance('loyalty_channel', 'chatter').balance == start + 5
+        assert get_balance('loyalty_channel', 'lurker').balance == start
+
+        monkeypatch.setitem(cfg.data, 'loyalty_pay_lurkers', True)
+        mod.give_loyalty_balance()
+        assert get_balance('loyalty_channel', 'chatter').balance == start + 10
+        assert get_balance('loyalty_channel', 'lurker').balance == start + 5
+    finally:
+        channels.pop('loyalty_channel', None)
+
+
+def test_chatters_are_only_polled_when_used(monkeypatch):
+    monkeypatch.setattr(chatters_module, 'iter_channel_chatters_pages', _forbidden_chatters_pages)
+    monkeypatch.setitem(cfg.data, 'loyalty_pay_lurkers', False)
+    mod = LoyaltyTicketMod()
+    monkeypatch.setitem(mods, mod.name, mod)
+    updater = ChannelStatUpdaterMod()
+    # the loyalty ticker only needs the chatters to pay lurkers
+    assert not updater.chatters_are_used()
+    monkeypatch.setitem(cfg.data, 'loyalty_pay_lurkers', True)
+    assert updater.chatters_are_used()
+
+    channel = Channel('forbidden_channel', irc=None)
+    try:
+        asyncio.run(updater.update_all_channel_chatters())
+        assert channel.chatters.forbidden
+
+        # channels twitch answered with 403 are not requested again
+        monkeypatch.setattr(chatters_module, 'iter_channel_chatters_pages', _fake_chatters_pages)
+        asyncio.run(updater.update_all_channel_chatters())
+        assert not channel.chatters.viewers
+    finally:
+        channels.pop('forbidden_channel', None)
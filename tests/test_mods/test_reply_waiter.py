@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from twitchbot import Channel, Message, channels, reply_wait_queue, wait_for_reply, same_author_and_channel_predicate, custom_predicate
+from twitchbot.builtin_mods.reply_waiter_mod import ReplyWaiter
+
+
+@pytest.fixture
+def channel():
+    channel = Channel('reply_channel', irc=None)
+    yield channel
+    channels.pop('reply_channel', None)
+    reply_wait_queue.clear()
+
+
+def _privmsg(author: str, content: str, channel_name: str = 'reply_channel') -> Message:
+    return Message(f':{author}!{author}@{author}.tmi.twitch.tv PRIVMSG #{channel_name} :{content}')
+
+
+def test_reply_is_given_to_the_matching_waiter(channel):
+    async def main():
+        waiter = ReplyWaiter()
+        question = _privmsg('alice', '!guess')
+        alice = asyncio.ensure_future(wait_for_reply(same_author_and_channel_predicate(question), timeout=1))
+        anyone = asyncio.ensure_future(wait_for_reply(custom_predicate(lambda m: m.content == 'hi', same_author=False, msg=question), timeout=1))
+        await asyncio.sleep(0)
+        assert len(reply_wait_queue) == 2
+
+        # only the waiters that can accept the message are checked
+        assert reply_wait_queue.candidates(_privmsg('bob', 'hi')) == [reply_wait_queue[1]]
+        await waiter.on_raw_message(_privmsg('bob', 'hi'))
+        await waiter.on_raw_message(_privmsg('alice', '42'))
+
+        assert (await alice).content == '42'
+        assert (await anyone).content == 'hi'
+        # waiters are removed as soon as they got their reply
+        assert not reply_wait_queue
+
+    asyncio.run(main())
+
+
+def test_waiters_time_out_and_are_removed(channel):
+    async def main():
+        question = _privmsg('alice', '!guess')
+        result = await wait_for_reply(same_author_and_channel_predicate(question), timeout=0.01, default='none')
+        assert result.timed_out and result.raw_value == 'none'
+        assert not reply_wait_queue
+
+        with pytest.raises(asyncio.TimeoutError):
+            await wait_for_reply(same_author_and_channel_predicate(question), timeout=0.01, raise_on_timeout=True)
+        assert not reply_wait_queue
+
+        # a cancelled wait is removed too
+        task = asyncio.ensure_future(wait_for_reply(same_author_and_channel_predicate(question), timeout=1))
+        await asyncio.sleep(0)
+        assert len(reply_wait_queue) == 1
+        task.cancel()
+        await asyncio.sleep(0)
+        assert not reply_wait_queue
+
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from twitchbot import Channel, Event, channels, event_util
+from twitchbot.poll import polldata, vote_ingestion
+from twitchbot.poll.polldata import PollData, poll_event_processor_loop, get_channel_poll_by_id
+
+
+@pytest.fixture
+def poll_events(monkeypatch):
+    """gives the test its own active polls, and returns the poll events that were forwarded, as (event, poll, *args)"""
+    active_polls = defaultdict(list)
+    monkeypatch.setattr(polldata, 'active_polls', active_polls)
+    monkeypatch.setattr(vote_ingestion, 'active_polls', active_polls)
+    monkeypatch.setattr(polldata, '_active_polls_by_id', {})
+    monkeypatch.setattr(polldata, '_poll_deadlines', [])
+    monkeypatch.setattr(polldata, '_poll_started', None)
+
+    events = []
+    monkeypatch.setattr(event_util, 'forward_event', lambda event, poll_channel, poll, *args, **kwargs: events.append((event, poll, *args)))
+    yield events
+    for name in ('poll_channel', 'other_poll_channel'):
+        channels.pop(name, None)
+
+
+def _ended(events):
+    return [poll for event, poll, *_ in events if event is Event.on_poll_ended]
+
+
+def test_polls_end_in_deadline_order(poll_events):
+    async def main():
+        channel, other_channel = Channel('poll_channel', irc=None), Channel('other_poll_channel', irc=None)
+        slow = PollData(channel, 'owner', 'slow', 0.15, 'a', 'b')
+        fast = PollData(other_channel, 'owner', 'fast', 0.03, 'a', 'b')
+        medium = PollData(channel, 'owner', 'medium', 0.08, 'a', 'b')
+        for poll in (slow, fast, medium):
+            await poll.start()
+        assert polldata.active_polls['poll_channel'] == [slow, medium]
+
+        loop_task = asyncio.ensure_future(poll_event_processor_loop())
+        await asyncio.sleep(0.01)
+        # the loop is sleeping until `fast` ends, a poll that ends before it wakes it up
+        fastest = PollData(channel, 'owner', 'fastest', 0.01, 'a', 'b')
+        await fastest.start()
+
+        await asyncio.sleep(0.05)
+        assert _ended(poll_events) == [fastest, fast]
+        assert get_channel_poll_by_id('poll_channel', fastest.id) is None
+        assert 'other_poll_channel' not in polldata.active_polls
+
+        await asyncio.sleep(0.15)
+        loop_task.cancel()
+        assert _ended(poll_events) == [fastest, fast, medium, slow]
+        assert not polldata.active_polls and not polldata._poll_deadlines
+
+    asyncio.run(main())
+
+
+def test_votes_are_counted_and_tallied_in_batches(poll_events, monkeypatch):
+    monkeypatch.setattr(polldata, 'POLL_TALLY_INTERVAL_SECONDS', 0.02)
+
+    async def main():
+        poll = PollData(Channel('poll_channel', irc=None), 'owner', 'title', 60, 'a', 'b', 'c')
+        await poll.start()
+
+        assert poll.add_vote('Alice ', 1)
+        assert not poll.add_vote('bob', 4)
+        poll.add_normalized_vote('bob', 2)
+        poll.add_normalized_vote('carol', 3)
+        # changing a vote moves it, voting for the same choice again does nothing
+        poll.add_normalized_vote('alice', 2)
+        poll.add_normalized_vote('alice', 2)
+        assert poll.votes == {1: 0, 2: 2, 3: 1}
+        assert poll.has_already_voted('ALICE')
+
+        await asyncio.sleep(0.05)
+        assert [(poll, args) for event, poll, *args in poll_events if event is Event.on_poll_votes_tallied] == [(poll, [4])]
+        assert poll.untallied_votes == 0
+
+        # the later choices move down one id, with their votes and voters
+        poll.remove_choice('B')
+        assert poll.choices == ['a', 'c']
+        assert poll.votes == {1: 0, 2: 1}
+        assert poll.voter_choices == {'carol': 2}
+
+    asyncio.run(main())
+
+
+def test_votes_are_not_tallied_after_the_poll_ended(poll_events, monkeypatch):
+    monkeypatch.setattr(polldata, 'POLL_TALLY_INTERVAL_SECONDS', 0.02)
+
+    async def main():
+        poll = PollData(Channel('poll_channel', irc=None), 'owner', 'title', 0.01, 'a', 'b')
+        await poll.start()
+        poll.add_normalized_vote('alice', 1)
+
+        loop_task = asyncio.ensure_future(poll_event_processor_loop())
+        await asyncio.sleep(0.05)
+        loop_task.cancel()
+
+        assert [event for event, *_ in poll_events] == [Event.on_poll_started, Event.on_poll_ended]
+        assert poll.format_poll_results() == '[1 votes] a ~ [0 votes] b'
+
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientConnectorError, ServerDisconnectedError
+
+from twitchbot import start_twitch_api_queue_send_handler_loop, stop_all_tasks
+from twitchbot.exceptions import TwitchAPICircuitOpenError
+from twitchbot.util import circuit_breaker_util, twitch_api_util
+from twitchbot.util.circuit_breaker_util import CircuitBreaker, CircuitBreakerState, RetryPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker_util.time, 'monotonic', clock)
+    return clock
+
+
+def test_circuit_breaker_state_changes(clock):
+    changes = []
+    breaker = CircuitBreaker('endpoint', failure_threshold=2, reset_timeout=10,
+                             on_state_change=lambda b, old, new: changes.append((old, new)))
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreakerState.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreakerState.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after == 10
+
+    # after the reset timeout only one probe is let through
+    clock.now += 10
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreakerState.HALF_OPEN
+    assert not breaker.allow_request()
+
+    # a failed probe opens the breaker again right away
+    breaker.record_failure()
+    assert breaker.state == CircuitBreakerState.OPEN
+    assert not breaker.allow_request()
+
+    clock.now += 10
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreakerState.CLOSED
+    assert breaker.consecutive_failures == 0
+
+    assert changes == [
+        ('closed', 'open'),
+        ('open', 'half_open'),
+        ('half_open', 'open'),
+        ('open', 'half_open'),
+        ('half_open', 'closed'),
+    ]
+
+
+def test_released_probe_lets_another_probe_through(clock):
+    breaker = CircuitBreaker('endpoint', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+
+
+def test_retry_policy_delay_is_capped_exponential_backoff(monkeypatch):
+    monkeypatch.setattr(circuit_breaker_util.random, 'uniform', lambda low, high: high)
+    policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=3)
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [0.5, 1, 2, 3, 3]
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.headers = {}
+
+    async def json(self):
+        return {'status': self.status}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class FakeSession:
+    """returns (or raises) the given results in order, and records the requests"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return FakeResponse(result)
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    monkeypatch.setattr(twitch_api_util, 'twitch_api_circuit_breakers', {})
+    monkeypatch.setattr(twitch_api_util, 'DEFAULT_TWITCH_API_RETRY_POLICY', RetryPolicy(max_attempts=3, base_delay=0, max_delay=0))
+
+    def use(*results):
+        session = FakeSession(*results)
+        monkeypatch.setattr(twitch_api_util, 'get_client_session', lambda: session)
+        return session
+
+    return use
+
+
+def test_requests_are_retried_on_5xx_and_connection_errors(fake_session):
+    session = fake_session(503, ServerDisconnectedError(), 200)
+    resp, json = asyncio.run(twitch_api_util._request('GET', 'https://api.twitch.tv/helix/a', headers={}))
+    assert resp.status == 200 and len(session.requests) == 3
+
+    # gives up after max_attempts, returning the last response
+    session = fake_session(500, 502, 503)
+    resp, _ = asyncio.run(twitch_api_util._request('GET', 'https://api.twitch.tv/helix/b', headers={}))
+    assert resp.status == 503 and len(session.requests) == 3
+
+
+def test_posts_are_only_retried_if_they_did_not_connect(fake_session):
+    session = fake_session(ServerDisconnectedError())
+    with pytest.raises(ServerDisconnectedError):
+        asyncio.run(twitch_api_util._request('POST', 'https://api.twitch.tv/helix/a', headers={}))
+    assert len(session.requests) == 1
+
+    session = fake_session(503)
+    resp, _ = asyncio.run(twitch_api_util._request('POST', 'https://api.twitch.tv/helix/b', headers={}))
+    assert resp.status == 503 and len(session.requests) == 1
+
+    connector_error = ClientConnectorError(connection_key=None, os_error=OSError('refused'))
+    session = fake_session(connector_error, 200)
+    resp, _ = asyncio.run(twitch_api_util._request('POST', 'https://api.twitch.tv/helix/c', headers={}))
+    assert resp.status == 200 and len(session.requests) == 2
+
+
+def _open_breaker(url: str):
+    breaker = twitch_api_util.get_twitch_api_circuit_breaker(url)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreakerState.OPEN
+
+
+def test_open_circuit_breaker_fails_fast(fake_session):
+    session = fake_session()
+    _open_breaker('https://api.twitch.tv/helix/a')
+
+    with pytest.raises(TwitchAPICircuitOpenError):
+        asyncio.run(twitch_api_util._request('GET', 'https://api.twitch.tv/helix/a?id=1', headers={}))
+    assert not session.requests
+
+
+def test_helpers_return_their_failed_result_while_the_circuit_breaker_is_open(fake_session, monkeypatch, fresh_task_state):
+    session = fake_session()
+    headers = {twitch_api_util.CLIENT_ID_KEY: 'client_id', twitch_api_util.AUTHORIZATION_KEY: 'Bearer token'}
+
+    async def get_user_id(user, headers=None, verbose=True):
+        return 1
+
+    monkeypatch.setattr(twitch_api_util, 'get_user_id', get_user_id)
+    monkeypatch.setattr(twitch_api_util, 'get_nick', lambda: 'bot')
+    monkeypatch.setattr(twitch_api_util, 'get_headers', lambda: headers)
+    _open_breaker(twitch_api_util.UNBAN_API_URL)
+    _open_breaker(twitch_api_util.SHOUTOUT_API_URL)
+    _open_breaker(twitch_api_util.USER_API_URL)
+
+    async def main():
+        with pytest.warns(UserWarning, match='circuit breaker'):
+            status = await twitch_api_util.send_unban('channel', 'user', headers=headers)
+        assert not status.success and status.resp is None
+
+        # requests sent through the twitch api queue
+        start_twitch_api_queue_send_handler_loop()
+        try:
+            with pytest.warns(UserWarning, match='circuit breaker'):
+                status = await twitch_api_util.send_shoutout('channel', 'user', headers=headers)
+            assert not status.success
+        finally:
+            stop_all_tasks()
+
+        assert (await twitch_api_util.get_user_info('user')).id == -1
+
+    asyncio.run(main())
+    assert not session.requests
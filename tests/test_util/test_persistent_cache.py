@@ -0,0 +1,53 @@
+import asyncio
+
+from twitchbot.util import persistent_cache_util
+from twitchbot.util.persistent_cache_util import PersistentTTLCache
+
+
+def test_entries_expire_after_their_ttl(tmp_path, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(persistent_cache_util.time, 'time', lambda: now)
+    cache = PersistentTTLCache(tmp_path / 'cache.sqlite', 'users', ttl=10)
+    cache['a'] = 1
+    assert cache.get('a') == 1
+
+    now += 11
+    assert cache.get('a') is None
+    assert 'a' not in cache
+
+    # expired entries are also not loaded back from disk
+    cache.close()
+    assert PersistentTTLCache(tmp_path / 'cache.sqlite', 'users', ttl=10).get('a') is None
+
+
+def test_entries_are_reloaded_from_disk_after_a_restart(tmp_path):
+    cache = PersistentTTLCache(tmp_path / 'cache.sqlite', 'users', ttl=60)
+    cache.set_many({'a': 1, 'b': {'id': '2'}})
+    cache.set('c', 3)
+    assert cache.pop('c') == 3
+    cache.close()
+
+    restarted = PersistentTTLCache(tmp_path / 'cache.sqlite', 'users', ttl=60)
+    assert restarted.get('a') == 1
+    assert restarted.get('b') == {'id': '2'}
+    assert 'c' not in restarted
+
+
+def test_writes_from_the_event_loop_are_flushed_later(tmp_path, monkeypatch):
+    monkeypatch.setattr(PersistentTTLCache, 'FLUSH_DELAY_SECONDS', 0.05)
+    path = tmp_path / 'cache.sqlite'
+    cache = PersistentTTLCache(path, 'users', ttl=60)
+
+    async def main():
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.pop('b')
+        # only the memory tier and the pending writes are updated inline
+        assert cache.get('a') == 1 and cache.get('b') is None
+        assert PersistentTTLCache(path, 'users', ttl=60).get('a') is None
+
+        await asyncio.sleep(0.2)
+        assert PersistentTTLCache(path, 'users', ttl=60).get('a') == 1
+        assert not cache._pending
+
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from twitchbot.util import ResponseCache, response_cache_util, twitch_api_util
+from twitchbot.util.circuit_breaker_util import RetryPolicy
+
+URL = 'https://api.twitch.tv/helix/a'
+
+
+class FakeResponse:
+    def __init__(self, status, headers=None, json=None):
+        self.status = status
+        self.headers = headers or {}
+        self._json = json
+
+    async def json(self):
+        return self._json
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    # only the cache's clock is replaced, the event loop keeps using the real one
+    monkeypatch.setattr(response_cache_util, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_responses_are_cached_for_their_max_age_or_the_endpoint_ttl(clock):
+    cache = ResponseCache()
+    cache.set_endpoint_ttl(URL, 10)
+
+    resp, json = cache.store('a', URL, FakeResponse(200), {'n': 1})
+    assert json == {'n': 1}
+    assert cache.get_fresh('a', f'{URL}?x=1') is not None
+    clock[0] += 10
+    assert cache.get_fresh('a', URL) is None
+
+    cache.store('b', URL, FakeResponse(200, {'Cache-Control': 'max-age=60'}), {})
+    clock[0] += 30
+    assert cache.get_fresh('b', URL) is not None
+
+    # not cached: endpoints without a TTL, no-store and failed responses
+    cache.store('c', 'https://api.twitch.tv/helix/other', FakeResponse(200), {})
+    cache.store('d', URL, FakeResponse(200, {'Cache-Control': 'no-store'}), {})
+    cache.store('e', URL, FakeResponse(500), {})
+    assert all(cache.get_fresh(key, URL) is None for key in 'cde')
+
+
+def test_expired_responses_with_a_etag_are_revalidated(clock):
+    cache = ResponseCache()
+    cache.set_endpoint_ttl(URL, 10)
+    cache.store('a', URL, FakeResponse(200, {'ETag': '"v1"'}), {'n': 1})
+    clock[0] += 10
+
+    assert cache.conditional_headers('a', {'Client-ID': 'id'}) == {'Client-ID': 'id', 'If-None-Match': '"v1"'}
+    resp, json = cache.store('a', URL, FakeResponse(304, {'Ratelimit-Remaining': '5'}), {})
+    # the 304 serves the cached response, with the 304's headers, for another TTL
+    assert resp.status == 200 and resp.headers == {'Ratelimit-Remaining': '5'}
+    assert json == {'n': 1}
+    assert cache.get_fresh('a', URL) == (resp, json)
+    assert cache.stats()['revalidations'] == 1
+
+
+def test_get_url_revalidates_with_if_none_match(clock, monkeypatch):
+    sent_headers = []
+    responses = [FakeResponse(200, {'ETag': '"v1"'}, {'n': 1}), FakeResponse(304)]
+
+    class FakeSession:
+        def request(self, method, url, headers=None, **kwargs):
+            sent_headers.append(headers)
+            return responses.pop(0)
+
+    cache = ResponseCache()
+    cache.set_endpoint_ttl(URL, 10)
+    monkeypatch.setattr(twitch_api_util, 'twitch_api_response_cache', cache)
+    monkeypatch.setattr(twitch_api_util, 'get_client_session', FakeSession)
+    monkeypatch.setattr(twitch_api_util, 'twitch_api_circuit_breakers', {})
+    monkeypatch.setattr(twitch_api_util, 'DEFAULT_TWITCH_API_RETRY_POLICY', RetryPolicy(max_attempts=1))
+
+    async def main():
+        headers = {twitch_api_util.CLIENT_ID_KEY: 'id'}
+        assert (await twitch_api_util.get_url(URL, headers))[1] == {'n': 1}
+        # served from the cache without a request while it is fresh
+        assert (await twitch_api_util.get_url(URL, headers))[1] == {'n': 1}
+        clock[0] += 10
+        resp, json = await twitch_api_util.get_url(URL, headers)
+        assert resp.status == 200 and json == {'n': 1}
+
+    asyncio.run(main())
+    assert len(sent_headers) == 2
+    assert 'If-None-Match' not in sent_headers[0]
+    assert sent_headers[1]['If-None-Match'] == '"v1"'
@@ -0,0 +1,106 @@
+import asyncio
+
+from twitchbot.ratelimit_twitch_api_queue import TwitchApiQueueSendHandler, PendingTwitchAPIRequestMode
+from twitchbot.util import SingleFlight, twitch_api_util
+from twitchbot.util.circuit_breaker_util import RetryPolicy
+
+
+def test_concurrent_calls_share_one_call():
+    calls = []
+
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do('key', lambda: fetch('first')) for _ in range(5)),
+                                       flight.do('other', lambda: fetch('other')))
+        assert results == ['first'] * 5 + ['other']
+        assert calls == ['first', 'other']
+
+        # the key is forgotten once its call is done, so the next caller starts a new call
+        assert not len(flight)
+        assert await flight.do('key', lambda: fetch('second')) == 'second'
+
+    asyncio.run(main())
+
+
+def test_callers_share_the_exception_and_cancelling_one_does_not_cancel_the_call():
+    started = 0
+
+    async def fail():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.01)
+        raise ValueError('failed')
+
+    async def main():
+        flight = SingleFlight()
+        cancelled = asyncio.ensure_future(flight.do('key', fail))
+        waiters = [flight.do('key', fail) for _ in range(2)]
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert started == 1
+
+    asyncio.run(main())
+
+
+class FakeResponse:
+    status = 200
+    headers = {}
+
+    async def json(self):
+        return {'data': []}
+
+    async def __aenter__(self):
+        await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+def test_identical_concurrent_gets_send_one_request(monkeypatch):
+    requests = []
+
+    class FakeSession:
+        def request(self, method, url, headers=None, **kwargs):
+            requests.append((url, headers.get(twitch_api_util.AUTHORIZATION_KEY)))
+            return FakeResponse()
+
+    monkeypatch.setattr(twitch_api_util, 'get_client_session', FakeSession)
+    monkeypatch.setattr(twitch_api_util, 'twitch_api_circuit_breakers', {})
+    monkeypatch.setattr(twitch_api_util, 'DEFAULT_TWITCH_API_RETRY_POLICY', RetryPolicy(max_attempts=1))
+    token = {twitch_api_util.CLIENT_ID_KEY: 'id', twitch_api_util.AUTHORIZATION_KEY: 'Bearer a'}
+    other_token = {twitch_api_util.CLIENT_ID_KEY: 'id', twitch_api_util.AUTHORIZATION_KEY: 'Bearer b'}
+
+    async def main():
+        results = await asyncio.gather(
+            *(twitch_api_util.get_url('https://api.twitch.tv/helix/a', token) for _ in range(3)),
+            twitch_api_util.get_url('https://api.twitch.tv/helix/a', other_token),
+        )
+        assert len({id(result) for result in results[:3]}) == 1
+
+    asyncio.run(main())
+    # requests made with a different token are not shared, as their response can differ
+    assert sorted(requests) == [('https://api.twitch.tv/helix/a', 'Bearer a'), ('https://api.twitch.tv/helix/a', 'Bearer b')]
+
+
+def test_identical_queued_gets_are_queued_once():
+    async def main():
+        handler = TwitchApiQueueSendHandler()
+        for url in ('https://api.twitch.tv/helix/a', 'https://api.twitch.tv/helix/a', 'https://api.twitch.tv/helix/b'):
+            handler.enqueue_url_request(url, {}, PendingTwitchAPIRequestMode.GET)
+        # posts are never shared, as each one changes something
+        for _ in range(2):
+            handler.enqueue_url_request('https://api.twitch.tv/helix/a', {}, PendingTwitchAPIRequestMode.POST)
+
+        await asyncio.sleep(0)
+        assert handler.queue.queue.qsize() == 4
+
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+from twitchbot import ratelimit_twitch_api_queue
+from twitchbot.data import RateLimit
+from twitchbot.ratelimit_twitch_api_queue import TwitchApiQueueSendHandler, PendingTwitchAPIRequestMode
+
+
+class FakeResponse:
+    def __init__(self, status=200, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+
+class FakeTwitch:
+    """
+    stands in for get_url(), records the urls in the order they were sent,
+    and holds each response until release() is called for its url, or for all urls (if `hold` is set)
+    """
+
+    def __init__(self, statuses=None, headers=None, hold=False):
+        # url => statuses to respond with, in order, then 200
+        self.statuses = {url: list(values) for url, values in (statuses or {}).items()}
+        self.headers = headers
+        self.hold = hold
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._released = {}
+
+    def _release_event(self, url):
+        return self._released.setdefault(url, asyncio.Event())
+
+    def release(self, url=None):
+        if url is None:
+            self.hold = False
+            for event in self._released.values():
+                event.set()
+        else:
+            self._release_event(url).set()
+
+    async def get_url(self, url, headers=None):
+        self.sent.append(url)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.hold:
+                await self._release_event(url).wait()
+            await asyncio.sleep(0)
+            statuses = self.statuses.get(url)
+            return FakeResponse(statuses.pop(0) if statuses else 200, self.headers), {'url': url}
+        finally:
+            self.in_flight -= 1
+
+
+async def _run_dispatcher(handler: TwitchApiQueueSendHandler):
+    while True:
+        await handler.dispatch_next_request()
+
+
+def _enqueue(handler: TwitchApiQueueSendHandler, *urls):
+    return [handler.enqueue_url_request(url, {}, PendingTwitchAPIRequestMode.GET) for url in urls]
+
+
+def test_dispatcher_sends_requests_concurrently_up_to_the_limit(monkeypatch, fresh_task_state):
+    async def main():
+        twitch = FakeTwitch(hold=True)
+        monkeypatch.setattr(ratelimit_twitch_api_queue, 'get_url', twitch.get_url)
+        handler = TwitchApiQueueSendHandler(max_concurrent_requests=2)
+        dispatcher = asyncio.ensure_future(_run_dispatcher(handler))
+
+        futures = _enqueue(handler, 'a', 'b', 'c', 'd', 'e')
+        await asyncio.sleep(0.05)
+        assert twitch.sent == ['a', 'b'] and handler.requests_in_flight == 2
+
+        twitch.release()
+        results = await asyncio.wait_for(asyncio.gather(*futures), 1)
+        dispatcher.cancel()
+
+        assert [json['url'] for _, json in results] == ['a', 'b', 'c', 'd', 'e']
+        assert twitch.max_in_flight == 2
+        assert handler.requests_in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_ratelimited_requests_are_requeued_ahead_of_later_requests(monkeypatch, fresh_task_state):
+    async def main():
+        # the reset is in the past, so the 429 does not make the test wait for it
+        past_reset = {'Ratelimit-Limit': '800', 'Ratelimit-Remaining': '0', 'Ratelimit-Reset': str(int(time.time()) - 1)}
+        twitch = FakeTwitch(statuses={'a': [429, 429]}, headers=past_reset)
+        monkeypatch.setattr(ratelimit_twitch_api_queue, 'get_url', twitch.get_url)
+        handler = TwitchApiQueueSendHandler(max_concurrent_requests=1)
+        dispatcher = asyncio.ensure_future(_run_dispatcher(handler))
+
+        futures = _enqueue(handler, 'a', 'b', 'c')
+        results = await asyncio.wait_for(asyncio.gather(*futures), 1)
+        dispatcher.cancel()
+
+        assert twitch.sent == ['a', 'a', 'a', 'b', 'c']
+        assert [resp.status for resp, _ in results] == [200, 200, 200]
+
+    asyncio.run(main())
+
+
+def test_requests_are_not_requeued_forever(monkeypatch, fresh_task_state):
+    async def main():
+        past_reset = {'Ratelimit-Limit': '800', 'Ratelimit-Remaining': '0', 'Ratelimit-Reset': str(int(time.time()) - 1)}
+        retries = ratelimit_twitch_api_queue.MAX_TWITCH_API_REQUEST_RATELIMITED_RETRIES
+        twitch = FakeTwitch(statuses={'a': [429] * (retries + 1)}, headers=past_reset)
+        monkeypatch.setattr(ratelimit_twitch_api_queue, 'get_url', twitch.get_url)
+        handler = TwitchApiQueueSendHandler()
+        dispatcher = asyncio.ensure_future(_run_dispatcher(handler))
+
+        resp, _ = await asyncio.wait_for(_enqueue(handler, 'a')[0], 1)
+        dispatcher.cancel()
+
+        assert resp.status == 429
+        assert len(twitch.sent) == retries + 1
+
+    asyncio.run(main())
+
+
+def test_requests_in_flight_are_counted_against_the_ratelimit(monkeypatch, fresh_task_state):
+    async def main():
+        reset = int(time.time()) + 60
+        twitch = FakeTwitch(hold=True, headers={'Ratelimit-Limit': '800', 'Ratelimit-Remaining': '10', 'Ratelimit-Reset': str(reset)})
+        monkeypatch.setattr(ratelimit_twitch_api_queue, 'get_url', twitch.get_url)
+        handler = TwitchApiQueueSendHandler()
+        handler.queue.update_ratelimit_reset(RateLimit(remaining=3, limit=800, reset=reset))
+        dispatcher = asyncio.ensure_future(_run_dispatcher(handler))
+
+        # only the 3 requests the ratelimit has left are sent, the 4th waits for it to reset or be updated
+        futures = _enqueue(handler, 'a', 'b', 'c', 'd')
+        await asyncio.sleep(0.05)
+        assert twitch.sent == ['a', 'b', 'c']
+        assert handler.queue.requests_left == 0 and handler.is_currently_ratelimited
+
+        # twitch had not counted the 2 other requests in flight yet when it answered the first one,
+        # the waiting request is then sent right away, without waiting for the reset
+        twitch.release('a')
+        await asyncio.wait_for(futures[0], 1)
+        await asyncio.sleep(0.05)
+        assert twitch.sent == ['a', 'b', 'c', 'd']
+        assert handler.queue.requests_left == 10 - 2 - 1
+
+        twitch.release()
+        await asyncio.wait_for(asyncio.gather(*futures), 1)
+        dispatcher.cancel()
+
+    asyncio.run(main())
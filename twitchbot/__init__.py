@@ -34,6 +34,7 @@ from .poll import *
 from .event_util import *
 from .extra_configs import *
 from .pubsub import *
+from .eventsub import *
 from .translations import *
 from .argument_annotations import *
 from .auto_cast_handler import *
@@ -1,8 +1,10 @@
 import traceback
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Set
 
+from ..enums import Event
 from ..exceptions import BadTwitchAPIResponse
-from ..util import get_channel_chatters, CHANNEL_CHATTERS_API_URL
+from ..util import iter_channel_chatters_pages, CHANNEL_CHATTERS_API_URL
 
 __all__ = [
     'Chatters',
@@ -16,18 +18,39 @@ DATA = 'data'
 @dataclass
 class Chatters:
     channel: str
-    viewers: frozenset = frozenset()
+    # updated in place, so references to it stay up to date
+    viewers: Set[str] = field(default_factory=set)
     viewer_count: int = 0
+    # set once twitch responded with 403 (Forbidden), the token cannot read this channel's chatters
+    forbidden: bool = False
 
     async def update(self):
+        """
+        fetches all pages of the channel's chatters, viewers are added as each page arrives,
+        viewers that are missing from all pages are removed once the last page was received
+
+        triggers `on_channel_chatters_changed` with the added and removed viewers if any changed
+        """
         json = ''
+        seen = set()
+        added = set()
+        complete = False
         try:
-            json = await get_channel_chatters(self.channel)
-            self._verify_base_response_is_valid(json)
+            async for json in iter_channel_chatters_pages(self.channel, on_forbidden=self._mark_forbidden):
+                self._verify_base_response_is_valid(json)
+
+                for viewer in json[DATA]:
+                    login = viewer['user_login']
+                    seen.add(login)
+                    if login not in self.viewers:
+                        self.viewers.add(login)
+                        added.add(login)
 
-            self.viewers = frozenset([viewer['user_login'] for viewer in json[DATA]])
-            self.viewer_count = json[CHATTER_COUNT]
+                self.viewer_count = json[CHATTER_COUNT]
+                # the last page has no cursor, if a later page failed the fetch stops on a page that still has one
+                complete = not (json.get('pagination') or {}).get('cursor')
         except Exception as e:
+            complete = False
             # twitch seems to have removed the chatters from the response from the API for some reason
             # don't want to spam the user with this error again and again, so until a better solution is found for 
             # tracking viewers for the loyalty ticker, just pass for now.
@@ -37,6 +60,18 @@ class Chatters:
             print(f'stack trace:\n{traceback.format_exc()}')
             print('END CHATTERS API ERROR\n')
 
+        # a partial (or failed) fetch cannot tell which viewers left
+        removed = self.viewers - seen if complete else set()
+        self.viewers -= removed
+
+        if added or removed:
+            # avoid circular imports
+            from ..event_util import forward_event
+            forward_event(Event.on_channel_chatters_changed, self.channel, frozenset(added), frozenset(removed), channel=self.channel)
+
+    def _mark_forbidden(self):
+        self.forbidden = True
+
     def __contains__(self, item):
         return item.casefold() in self.viewers
 
@@ -29,6 +29,23 @@ class StreamInfoApi(Api):
         """
         try:
             data = await util.get_stream_data(self.user)
+        except Exception as e:
+            if log:
+                print(translate('stream_info_api_error', user=self.user, error=str(e), error_type=str(type(e)), formatted_exception=format_exc()))
+
+            await self.on_failed_update()
+            return
+
+        await self.update_from_data(data, log=log)
+
+    async def update_from_data(self, data: dict, log=False):
+        """
+        updates the stream info from stream data that was already requested from twitch (such as by a batched request),
+        a empty `data` dict marks the stream as offline
+
+        calls `self.on_successful_update` or `self.on_failed_update` the same way `update()` does
+        """
+        try:
             self.viewer_count = data.get('viewer_count', 0)
             self.title = data.get('title', '')
             self.game_id = data.get('game_id', 0)
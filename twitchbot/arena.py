@@ -3,7 +3,7 @@ from asyncio import Future, ensure_future
 from secrets import choice
 
 from twitchbot.channel import Channel
-from twitchbot.database import add_balance, get_currency_name
+from twitchbot.database import add_balance, get_cached_currency_name
 from .config import get_command_prefix
 from .translations import translate
 
@@ -28,7 +28,7 @@ class Arena:
         self.running = False
 
     async def _start_countdown(self, delay):
-        curname = get_currency_name(self.channel.name).name
+        curname = get_cached_currency_name(self.channel.name).name
 
         await self.channel.send_message(
             translate('arena_opening_message', command_prefix=get_command_prefix(), delay=delay, entry_fee=self.entry_fee, curname=curname))
@@ -44,7 +44,7 @@ class Arena:
                 add_balance(self.channel.name, user, self.entry_fee)
 
         else:
-            currency = get_currency_name(self.channel.name).name
+            currency = get_cached_currency_name(self.channel.name).name
             winner = choice(tuple(self.users))
             winnings = self.entry_fee * len(self.users)
 
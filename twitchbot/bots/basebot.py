@@ -5,16 +5,16 @@ import os
 import warnings
 
 from asyncio import get_event_loop
-from typing import Optional, TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING, FrozenSet
 from threading import Thread
 
 from ..poll import PollData
 from .. import util
 from ..channel import Channel, channels
 from ..command import Command, commands, CustomCommandAction, is_command_on_cooldown, get_time_since_execute, update_command_last_execute
-from ..config import cfg, get_nick, get_command_prefix, get_oauth
-from ..config import generate_config
-from ..database import get_custom_command
+from ..config import cfg, get_nick, get_command_prefix, get_oauth, get_client_id, DEFAULT_CLIENT_ID
+from ..config import generate_config, flush_configs
+from ..database import get_cached_custom_command
 from ..disabled_commands import is_command_disabled
 from ..enums import Event
 from ..enums import MessageType, CommandContext
@@ -26,14 +26,16 @@ from ..modloader import mods
 from ..modloader import trigger_mod_event
 from ..permission import perms
 from ..shared import set_bot
-from ..util import stop_all_tasks
+from ..util import stop_all_tasks, flush_persistent_caches
 from ..command_whitelist import is_command_whitelisted, send_message_on_command_whitelist_deny
-from ..poll import poll_event_processor_loop
+from ..poll import poll_event_processor_loop, active_polls, try_ingest_vote
 from ..event_util import forward_event_with_results, forward_event
 from ..pubsub import PubSubClient
+from ..eventsub import EventSubClient
 from ..extra_configs import logging_config
 from ..irc import Irc
-from ..util import get_oauth_token_info, _check_token
+from ..util import get_oauth_token_info, _check_token, close_client_session, oauth_token_revalidation_loop, \
+    OAUTH_TOKEN_REVALIDATION_TASK_NAME
 from ..translations import translate
 
 if TYPE_CHECKING:
@@ -46,6 +48,7 @@ class BaseBot:
         self.irc = Irc()
         self._running = False
         self.pubsub = PubSubClient()
+        self.eventsub = EventSubClient()
         self.mainloop_task: Optional[asyncio.Task] = None
         set_bot(self)
 
@@ -165,6 +168,14 @@ class BaseBot:
         :param channel: the channel that the user left
         """
 
+    async def on_channel_chatters_changed(self, channel: str, added: FrozenSet[str], removed: FrozenSet[str]):
+        """
+        triggered when a channel's chatters are updated from the twitch api and viewers joined or left
+        :param channel: the name of the channel
+        :param added: the viewers that are now in the channel's chatters
+        :param removed: the viewers that are no longer in the channel's chatters
+        """
+
     async def on_channel_subscription(self, subscriber: str, channel: Channel, msg: Message):
         """
         triggered when a user subscribes
@@ -184,6 +195,14 @@ class BaseBot:
         :param poll: the poll that has ended
         """
 
+    async def on_poll_votes_tallied(self, channel: Channel, poll: PollData, new_votes: int):
+        """
+        triggered at most once every POLL_TALLY_INTERVAL_SECONDS while a poll receives votes, with the votes batched together
+        :param channel: channel the poll originated in
+        :param poll: the poll that received the votes
+        :param new_votes: how many votes were received since the last time this was triggered for the poll
+        """
+
     async def on_pubsub_received(self, raw: 'PubSubData'):
         """
         triggered when data is received from the pubsub client
@@ -247,6 +266,16 @@ class BaseBot:
         for name in cfg.channels:
             Channel(name, irc=self.irc, register_globally=True)
 
+    async def _prefetch_channel_user_ids(self):
+        """resolves the user ids of the bot and all channels up front in batched requests, so later lookups (such as pubsub) hit the cache"""
+        if get_client_id() == DEFAULT_CLIENT_ID:
+            return
+
+        try:
+            await util.get_user_ids([get_nick(), *channels], verbose=False)
+        except Exception as e:
+            print(f'failed to prefetch channel user ids: {e}')
+
     async def get_command_from_msg(self, msg: Message) -> Optional[Command]:
         """
         checks if the start of the msg matches any command names
@@ -259,7 +288,7 @@ class BaseBot:
         if cmd:
             return cmd
 
-        cmd = get_custom_command(msg.channel_name, msg.parts[0].lower())
+        cmd = get_cached_custom_command(msg.channel_name, msg.parts[0].lower())
         if cmd:
             return CustomCommandAction(cmd)
 
@@ -321,11 +350,14 @@ class BaseBot:
     async def shutdown(self):
         await forward_event_with_results(Event.on_bot_shutdown)
         stop_all_tasks()
+        flush_configs()
+        flush_persistent_caches()
         for channel in channels:
             await self.irc.send(f'PART #{channel}')
             await asyncio.sleep(.4)
         await self.irc.send('QUIT')
         await self.irc.try_close_connection()
+        await close_client_session()
         self._running = False
 
     def _get_event_loop(self):
@@ -384,6 +416,7 @@ class BaseBot:
 
         print('connecting to twitch...')
         _check_token(await get_oauth_token_info(get_oauth(remove_prefix=True)))
+        util.add_task(OAUTH_TOKEN_REVALIDATION_TASK_NAME, oauth_token_revalidation_loop())
 
         if not generate_config():
             stop_all_tasks()
@@ -401,6 +434,8 @@ class BaseBot:
         from ..ratelimit_twitch_api_queue import start_twitch_api_queue_send_handler_loop
         start_twitch_api_queue_send_handler_loop()
 
+        await self._prefetch_channel_user_ids()
+
         await self.on_connected()
 
         await trigger_mod_event(Event.on_connected)
@@ -437,6 +472,10 @@ class BaseBot:
 
     async def handle_incoming_message(self, msg: 'Message'):
         forward_event(Event.on_raw_message, msg, channel=msg.channel_name)
+        # votes for the channel's active polls skip the command pipeline
+        if msg.type is MessageType.PRIVMSG and active_polls and try_ingest_vote(msg):
+            return
+
         cmd: Command = (await self.get_command_from_msg(msg)
                         if msg.is_user_message
                         else None)
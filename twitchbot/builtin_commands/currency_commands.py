@@ -10,7 +10,7 @@ from twitchbot import (
     Command,
     Message,
     set_currency_name,
-    get_currency_name,
+    get_cached_currency_name,
     set_balance,
     get_balance,
     session,
@@ -45,12 +45,12 @@ async def cmd_set_currency_name(msg: Message, *args):
         raise InvalidArgumentsError(reason=translate('missing_required_arguments'), cmd=cmd_set_currency_name)
 
     set_currency_name(msg.channel_name, args[0])
-    await msg.reply(translate('currency_name_set', currency_name=get_currency_name(msg.channel_name).name))
+    await msg.reply(translate('currency_name_set', currency_name=get_cached_currency_name(msg.channel_name).name))
 
 
 @Command('getcurrencyname', help=create_translate_callable('builtin_command_help_message_getcurrencyname'))
 async def cmd_get_currency_name(msg: Message, *ignored):
-    await msg.reply(translate('currency_name_get', currency_name=get_currency_name(msg.channel_name).name))
+    await msg.reply(translate('currency_name_get', currency_name=get_cached_currency_name(msg.channel_name).name))
 
 
 @Command('bal', syntax='(target)', help=create_translate_callable('builtin_command_help_message_bal'))
@@ -60,7 +60,7 @@ async def cmd_get_bal(msg: Message, *args):
     else:
         target = msg.author
 
-    currency_name = get_currency_name(msg.channel_name).name
+    currency_name = get_cached_currency_name(msg.channel_name).name
     balance = get_balance(msg.channel_name, target).balance
     await msg.reply(translate('bal_current', target=target, balance=balance, currency_name=currency_name))
 
@@ -84,7 +84,7 @@ async def cmd_set_bal(msg: Message, *args):
     except ValueError:
         raise InvalidArgumentsError(reason=translate('set_bal_invalid_int'))
 
-    await msg.reply(translate('set_bal_success', target=target, balance=args[0], currency_name=get_currency_name(msg.channel_name).name))
+    await msg.reply(translate('set_bal_success', target=target, balance=args[0], currency_name=get_cached_currency_name(msg.channel_name).name))
 
 
 @Command('addbal', permission=MANAGE_CURRENCY_PERMISSION, syntax='<user or all> <amount>',
@@ -102,7 +102,7 @@ async def cmd_add_bal(msg: Message, *args):
     if amount <= 0:
         raise InvalidArgumentsError(translate('add_bal_amount_must_be_positive'), cmd=cmd_add_bal)
 
-    currency = get_currency_name(msg.channel_name).name
+    currency = get_cached_currency_name(msg.channel_name).name
     if target == 'all':
         add_balance_to_all(msg.channel_name, amount)
         await msg.reply(translate('add_bal_add_all', amount=amount, currency=currency))
@@ -134,7 +134,7 @@ async def cmd_sub_bal(msg: Message, *args):
     if amount <= 0:
         raise InvalidArgumentsError(translate('add_bal_amount_must_be_positive'), cmd=cmd_sub_bal)
 
-    currency = get_currency_name(msg.channel_name).name
+    currency = get_cached_currency_name(msg.channel_name).name
 
     if target == 'all':
         subtract_balance_from_all(msg.channel_name, amount)
@@ -168,7 +168,7 @@ async def cmd_give(msg: Message, *args):
     if give <= 0:
         raise InvalidArgumentsError(reason=translate('give_invalid_amount_not_positive'), cmd=cmd_give)
 
-    cur_name = get_currency_name(msg.channel_name).name
+    cur_name = get_cached_currency_name(msg.channel_name).name
 
     if caller.balance < give:
         raise InvalidArgumentsError(reason=translate('give_insufficient_balance', mention=msg.mention, currency=cur_name), cmd=cmd_give)
@@ -209,7 +209,7 @@ async def cmd_gamble(msg: Message, *args):
 
     bal = get_balance_from_msg(msg)
 
-    cur_name = get_currency_name(msg.channel_name).name
+    cur_name = get_cached_currency_name(msg.channel_name).name
     if bal.balance < bet:
         raise InvalidArgumentsError(reason=translate('gamble_insufficient_balance', mention=msg.mention, currency=cur_name), cmd=cmd_gamble)
 
@@ -249,7 +249,7 @@ async def cmd_mine(msg: Message, *args):
         last_mine_time[key] = datetime.now() + timedelta(minutes=5)
 
         await msg.reply(
-            translate('mine_success', author=msg.author, gain=mine_gain, currency=get_currency_name(msg.channel_name).name),
+            translate('mine_success', author=msg.author, gain=mine_gain, currency=get_cached_currency_name(msg.channel_name).name),
             whisper=True)
     else:
         diff = int(abs(diff))
@@ -300,7 +300,7 @@ async def cmd_arena(msg: Message, *args):
             pass
 
     Balance.ensure_exists(msg.channel_name, msg.author)
-    curname = get_currency_name(msg.channel_name).name
+    curname = get_cached_currency_name(msg.channel_name).name
 
     # arena is already running for this channel
     arena = running_arenas.get(msg.channel_name)
@@ -383,7 +383,7 @@ async def cmd_duel(msg: Message, *args):
         raise InvalidArgumentsError(
             reason=translate(
                 'duel_cannot_send_not_enough_balance',
-                bet=bet, curname=get_currency_name(msg.channel_name).name),
+                bet=bet, curname=get_cached_currency_name(msg.channel_name).name),
             cmd=cmd_duel
         )
 
@@ -392,13 +392,13 @@ async def cmd_duel(msg: Message, *args):
         raise InvalidArgumentsError(reason=translate('duel_target_no_balance', target=target), cmd=cmd_duel)
     elif target_balance.balance < bet:
         raise InvalidArgumentsError(
-            reason=translate('duel_target_insufficient_balance', target=target, currency=get_currency_name(msg.channel_name).name),
+            reason=translate('duel_target_insufficient_balance', target=target, currency=get_cached_currency_name(msg.channel_name).name),
             cmd=cmd_duel
         )
 
     add_duel(msg.channel_name, msg.author, target, bet)
 
-    currency_name = get_currency_name(msg.channel_name).name
+    currency_name = get_cached_currency_name(msg.channel_name).name
     await msg.reply(translate('duel_challenged', mention=msg.mention, target=target, bet=bet, currency=currency_name, command_prefix=cfg.prefix))
 
 
@@ -420,5 +420,5 @@ async def cmd_accept(msg: Message, *args):
     add_balance(msg.channel_name, winner, bet)
     subtract_balance(msg.channel_name, loser, bet)
 
-    currency_name = get_currency_name(msg.channel_name).name
+    currency_name = get_cached_currency_name(msg.channel_name).name
     await msg.reply(translate('duel_accept_result', winner=winner, bet=bet, currency=currency_name))
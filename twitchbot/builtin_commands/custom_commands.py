@@ -5,7 +5,7 @@ from twitchbot import (
     delete_custom_command,
     custom_command_exist,
     CustomCommand,
-    session,
+    update_custom_command,
     cfg,
     Command,
     InvalidArgumentsError,
@@ -59,13 +59,9 @@ async def cmd_update_custom_command(msg: Message, *args):
         raise InvalidArgumentsError(reason=translate('add_cmd_invalid_response'),
                                     cmd=cmd_update_custom_command)
 
-    cmd = get_custom_command(msg.channel_name, name)
-    if cmd is None:
+    if not update_custom_command(msg.channel_name, name, resp):
         raise InvalidArgumentsError(reason=translate('update_cmd_not_exists', name=name), cmd=cmd_update_custom_command)
 
-    cmd.response = resp
-    session.commit()
-
     await msg.reply(translate('update_cmd_success', name=name))
 
 
@@ -8,7 +8,7 @@ from twitchbot import (
     get_counter_by_alias,
     add_counter,
     DBCounter,
-    get_counter,
+    get_cached_counter,
     delete_counter_by_id,
     set_counter,
     get_all_counters,
@@ -46,7 +46,7 @@ async def cmd_del_counter(msg: Message, *args):
     if not args:
         raise InvalidArgumentsError(reason=translate('missing_required_arguments'), cmd=cmd_del_counter)
 
-    counter = get_counter(msg.channel_name, args[0])
+    counter = get_cached_counter(msg.channel_name, args[0])
     if counter is None:
         raise InvalidArgumentsError(reason=translate('delcounter_not_found', query=args[0]), cmd=cmd_del_counter)
 
@@ -61,17 +61,15 @@ async def cmd_set_counter(msg: Message, *args):
         raise InvalidArgumentsError(reason=translate('missing_required_arguments'), cmd=cmd_set_counter)
 
     alias_or_id, new_value = args
-    counter = get_counter(msg.channel_name, alias_or_id)
 
     try:
         new_value = int(new_value)
     except ValueError:
         raise InvalidArgumentsError(reason=translate('setcounter_invalid_value'), cmd=cmd_set_counter)
 
-    if counter is None:
+    if set_counter(msg.channel_name, alias_or_id, new_value) is None:
         raise InvalidArgumentsError(reason=translate('delcounter_not_found', query=alias_or_id), cmd=cmd_set_counter)
 
-    set_counter(msg.channel_name, alias_or_id, new_value)
     await msg.reply(translate('setcounter_success', counter=alias_or_id, new_val=new_value))
 
 
@@ -4,7 +4,7 @@ from twitchbot import (
     Command,
     commands,
     CommandContext,
-    Message, get_all_custom_commands,
+    Message, get_cached_custom_commands,
     InvalidArgumentsError,
     get_command,
     is_command_disabled,
@@ -28,7 +28,7 @@ from twitchbot import (
 @Command('commands', context=CommandContext.BOTH, help=create_translate_callable('builtin_command_help_message_commands'))
 async def cmd_commands(msg: Message, *args):
     include_aliases = '-a' in args or '-alias' in args
-    custom_commands = ', '.join(map(attrgetter('name'), get_all_custom_commands(msg.channel_name)))
+    custom_commands = ', '.join(map(attrgetter('name'), get_cached_custom_commands(msg.channel_name)))
     usable_commands = []
     seen = set()
     for command in commands.values():
@@ -1,4 +1,5 @@
 import re
+from random import choice
 
 from twitchbot import (
     Command,
@@ -6,7 +7,9 @@ from twitchbot import (
     delete_quote_by_id,
     add_quote,
     get_quote_by_alias,
-    get_quote,
+    get_cached_quote,
+    get_random_quote,
+    search_quotes,
     Quote,
     cfg,
     InvalidArgumentsError,
@@ -55,12 +58,16 @@ async def cmd_add_quote(msg: Message, *args):
     await msg.reply(resp)
 
 
-@Command('quote', syntax='<ID or ALIAS>', help=create_translate_callable('builtin_command_help_message_quote'))
+@Command('quote', syntax='(ID or ALIAS or search words)', help=create_translate_callable('builtin_command_help_message_quote'))
 async def cmd_get_quote(msg: Message, *args):
     if not args:
-        raise InvalidArgumentsError(reason=translate('missing_required_arguments'), cmd=cmd_get_quote)
+        quote = get_random_quote(msg.channel_name)
+    else:
+        quote = get_cached_quote(msg.channel_name, args[0])
+        if quote is None:
+            matches = search_quotes(msg.channel_name, ' '.join(args))
+            quote = choice(matches) if matches else None
 
-    quote = get_quote(msg.channel_name, args[0])
     if quote is None:
         raise InvalidArgumentsError(reason=translate('quote_not_found'), cmd=cmd_get_quote)
 
@@ -72,7 +79,7 @@ async def cmd_del_quote(msg: Message, *args):
     if not args:
         raise InvalidArgumentsError(reason=translate('missing_required_arguments'), cmd=cmd_del_quote)
 
-    quote = get_quote(msg.channel_name, args[0])
+    quote = get_cached_quote(msg.channel_name, args[0])
     if quote is None:
         raise InvalidArgumentsError(reason=translate('quote_not_found'), cmd=cmd_del_quote)
 
@@ -7,7 +7,7 @@ from twitchbot import (
     message_timer_exist,
     delete_message_timer,
     get_all_message_timers,
-    get_message_timer,
+    get_cached_message_timer,
     cfg,
     Message,
     Command,
@@ -58,7 +58,7 @@ async def cmd_start_timer(msg: Message, *args):
         raise InvalidArgumentsError(translate('missing_required_arguments'), cmd=cmd_start_timer)
 
     name = args[0].lower()
-    timer = get_message_timer(msg.channel_name, name)
+    timer = get_cached_message_timer(msg.channel_name, name)
 
     if not timer:
         raise InvalidArgumentsError(reason=translate('starttimer_timer_not_found', name=name), cmd=cmd_start_timer)
@@ -79,7 +79,7 @@ async def cmd_stop_timer(msg: Message, *args):
         raise InvalidArgumentsError(reason=translate('missing_required_arguments'), cmd=cmd_stop_timer)
 
     name = args[0].lower()
-    timer = get_message_timer(msg.channel_name, name)
+    timer = get_cached_message_timer(msg.channel_name, name)
 
     if not timer:
         raise InvalidArgumentsError(reason=translate('starttimer_timer_not_found', name=name), cmd=cmd_stop_timer)
@@ -100,7 +100,7 @@ async def cmd_del_timer(msg: Message, *args):
         raise InvalidArgumentsError(reason=translate('missing_required_arguments'), cmd=cmd_del_timer)
 
     name = args[0].lower()
-    timer = get_message_timer(msg.channel_name, name)
+    timer = get_cached_message_timer(msg.channel_name, name)
 
     if not timer:
         raise InvalidArgumentsError(reason=translate('starttimer_timer_not_found', name=name), cmd=cmd_del_timer)
@@ -135,7 +135,7 @@ async def cmd_edit_timer(msg: Message, *args):
         raise InvalidArgumentsError(reason=translate('missing_required_arguments'), cmd=cmd_edit_timer)
 
     name = args[0].lower()
-    timer = get_message_timer(msg.channel_name, name)
+    timer = get_cached_message_timer(msg.channel_name, name)
 
     if not timer:
         raise InvalidArgumentsError(reason=translate('starttimer_timer_not_found', name=name), cmd=cmd_edit_timer)
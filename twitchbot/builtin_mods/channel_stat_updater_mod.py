@@ -1,23 +1,71 @@
 import asyncio
+from traceback import format_exc
 
-from twitchbot import Mod, channels, get_nick, add_task, stop_task
+from twitchbot import Mod, BaseBot, Event, channels, add_task, stop_task, get_streams_data, cfg, get_bot
+from twitchbot.events import custom_event_handlers
+from twitchbot.modloader import mods
 
 
 class ChannelStatUpdaterMod(Mod):
     name = 'channelviewerupdater'
     TASK_NAME = 'channelviewerupdateloop'
+    UPDATE_INTERVAL = 120
+
+    async def update_all_channel_stats(self):
+        """refreshes the stream info for all channels using batched requests, channels that are not live are marked offline"""
+        # convert channels.values() to a tuple to be sure it will not resize while iterating over it
+        current_channels = tuple(channels.values())
+        streams = await get_streams_data(channel.name for channel in current_channels)
+
+        for channel in current_channels:
+            await channel.stats.update_from_data(streams.get(channel.name.lower(), {}))
+
+    @staticmethod
+    def chatters_are_used() -> bool:
+        """
+        returns if anything uses the channels' chatters: the loyalty ticker paying lurkers,
+        or a bot, mod or event handler for on_channel_chatters_changed
+        """
+        from .loyalty_ticker_mod import LoyaltyTicketMod
+
+        if cfg.loyalty_pay_lurkers or custom_event_handlers.get(Event.on_channel_chatters_changed):
+            return True
+
+        bot = get_bot()
+        if bot is not None and type(bot).on_channel_chatters_changed is not BaseBot.on_channel_chatters_changed:
+            return True
+
+        # the loyalty ticker only uses the chatters if it pays lurkers, which is checked above
+        return any(type(mod).on_channel_chatters_changed is not Mod.on_channel_chatters_changed
+                   for mod in mods.values() if not isinstance(mod, LoyaltyTicketMod))
+
+    async def update_all_channel_chatters(self):
+        """
+        refreshes the chatters list of all channels, this triggers on_channel_chatters_changed for channels whose chatters changed
+
+        channels whose chatters twitch refused to send (403, the token is missing the moderator:read:chatters scope) are skipped
+        """
+        for channel in tuple(channels.values()):
+            if not channel.chatters.forbidden:
+                await channel.chatters.update()
 
     async def channel_update_loop(self):
         while True:
             while not channels:
                 await asyncio.sleep(3)
 
-            # convert channels.values() to a tuple to be sure it will not resize while iterating over it
-            for channel in tuple(channels.values()):
-                # await channel.chatters.update()
-                await channel.stats.update() # todo: check this uses queued api requests
-                await asyncio.sleep(3)  # delay each updates between channels to avoid sending too many requests too quick
-            await asyncio.sleep(120)  # only update channels every 2 minutes
+            try:
+                await self.update_all_channel_stats()
+            except Exception as e:
+                print(f'[{self.name}] failed to update channel stats: {e}\n{format_exc()}')
+
+            try:
+                if self.chatters_are_used():
+                    await self.update_all_channel_chatters()
+            except Exception as e:
+                print(f'[{self.name}] failed to update channel chatters: {e}\n{format_exc()}')
+
+            await asyncio.sleep(self.UPDATE_INTERVAL)  # only update channels every 2 minutes
 
     async def loaded(self):
         add_task(self.TASK_NAME, self.channel_update_loop())
@@ -1,8 +1,8 @@
 import time
 from asyncio import sleep
-from typing import Dict
+from typing import Dict, FrozenSet, Set
 
-from twitchbot import Mod, add_balance, session, cfg, task_running, add_task, stop_task, Message
+from twitchbot import Mod, add_balance_to_users, session, cfg, task_running, add_task, stop_task, Message
 
 
 class LoyaltyTicketMod(Mod):
@@ -13,6 +13,8 @@ class LoyaltyTicketMod(Mod):
     def __init__(self):
         super().__init__()
         self.channel_viewers: Dict[str, Dict[str, float]] = {}
+        # viewers in each channel's chatters list, kept up to date from the chatters added/removed diffs
+        self.channel_present_viewers: Dict[str, Set[str]] = {}
 
     def viewers_for_channel(self, channel_name: str) -> Dict[str, float]:
         viewers = self.channel_viewers.get(channel_name)
@@ -30,30 +32,51 @@ class LoyaltyTicketMod(Mod):
             add_task(self.LOYALTY_TICKER_TASK_NAME, self._ticker_loop())
 
         self.channel_viewers.clear()
+        self.channel_present_viewers.clear()
 
     async def unloaded(self):
         stop_task(self.LOYALTY_TICKER_TASK_NAME)
         self.channel_viewers.clear()
+        self.channel_present_viewers.clear()
+
+    async def on_channel_chatters_changed(self, channel: str, added: FrozenSet[str], removed: FrozenSet[str]):
+        present = self.channel_present_viewers.setdefault(channel, set())
+        present.update(added)
+        present.difference_update(removed)
 
     async def on_privmsg_received(self, msg: Message):
         self.viewers_for_channel(msg.channel_name)[msg.author] = time.time()
 
+    def give_loyalty_balance(self):
+        """gives loyalty balance to the viewers that chatted recently (and to the viewers in the chatters list if cfg.loyalty_pay_lurkers)"""
+        now = time.time()
+        channel_names = self.channel_viewers.keys()
+        if cfg.loyalty_pay_lurkers:
+            channel_names = channel_names | self.channel_present_viewers.keys()
+
+        for channel_name in tuple(channel_names):
+            viewers = self.viewers_for_channel(channel_name)
+            to_remove = []
+            active = []
+            for viewer, last_chat_time in viewers.items():
+                # has the viewer been inactive for too long?
+                if abs(now - last_chat_time) >= self.REMOVE_FROM_VIEWERS_INACTIVE_SECONDS:
+                    to_remove.append(viewer)
+                    continue
+                # viewer is still active, so give them balance
+                active.append(viewer)
+
+            for viewer in to_remove:
+                del viewers[viewer]
+
+            if cfg.loyalty_pay_lurkers:
+                # viewers in the chatters list get balance even if they have not chatted
+                active.extend(self.channel_present_viewers.get(channel_name, set()).difference(active))
+            add_balance_to_users(channel_name, active, cfg.loyalty_amount, commit=False)
+            session.commit()
+
     async def _ticker_loop(self):
         print(f'loyalty ticker started!')
         while True:
-            now = time.time()
-            for channel_name, viewers in self.channel_viewers.items():
-                to_remove = []
-                for viewer, last_chat_time in viewers.items():
-                    # has the viewer been inactive for too long?
-                    if abs(now - last_chat_time) >= self.REMOVE_FROM_VIEWERS_INACTIVE_SECONDS:
-                        to_remove.append(viewer)
-                        continue
-                    # viewer is still active, so give them balance
-                    add_balance(channel_name, viewer, cfg.loyalty_amount, commit=False)
-
-                for viewer in to_remove:
-                    del viewers[viewer]
-
-                session.commit()
+            self.give_loyalty_balance()
             await sleep(cfg.loyalty_interval)
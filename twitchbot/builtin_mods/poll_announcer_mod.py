@@ -12,3 +12,9 @@ class PollAnnouncerMod(Mod):
 
     async def on_poll_ended(self, channel: Channel, poll: 'PollData'):
         await channel.send_message(f'{poll.title} ~ {poll.format_poll_results()}')
+
+    async def on_poll_votes_tallied(self, channel: Channel, poll: 'PollData', new_votes: int):
+        if not cfg.announce_poll_vote_tallies:
+            return
+
+        await channel.send_message(f'{poll.title} ~ {poll.format_poll_results()} ~ ends in {poll.seconds_left} seconds ~ poll id: {poll.id}')
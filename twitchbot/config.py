@@ -1,18 +1,65 @@
+import asyncio
+import atexit
 import os
 import json
+import tempfile
+import threading
 from pathlib import Path
-from typing import Optional, Union
+from typing import Optional, Union, Set
 from .gui import show_auth_gui
 
 __all__ = ('cfg', 'Config', 'database_cfg', 'CONFIG_FOLDER', 'generate_config', 'get_oauth', 'get_nick', 'get_client_id',
-           'DEFAULT_NICK', 'DEFAULT_OAUTH', 'DEFAULT_CLIENT_ID', 'is_config_valid', 'get_command_prefix', 'message_timer_cfg')
+           'DEFAULT_NICK', 'DEFAULT_OAUTH', 'DEFAULT_CLIENT_ID', 'is_config_valid', 'get_command_prefix', 'message_timer_cfg',
+           'get_oauth_refresh_token', 'get_client_secret', 'flush_configs')
 
 CONFIG_FOLDER = Path('configs')
 
+# configs with a debounced save that has not been written yet
+_configs_pending_save: Set['Config'] = set()
+
+
+def _get_default_file_mode() -> int:
+    # the umask can only be read by setting it, this is done once on import, as changing it is not thread safe
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# permissions of new config files, the same as open() would create them with
+_DEFAULT_FILE_MODE = _get_default_file_mode()
+
+
+def _atomic_write_text(path: Path, text: str, encoding: str):
+    """
+    writes to a temp file next to path then renames it over path, so the file is never left partially written,
+    the file keeps its permissions (new files get the default permissions), as mkstemp() creates the temp file as owner read/write only
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = _DEFAULT_FILE_MODE
+
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
 
 # noinspection PyTypeChecker
 class Config:
     ENCODING = 'utf-8'
+    # saves made while a event loop is running are written together this many seconds after the first one
+    SAVE_DELAY_SECONDS = 1.0
 
     def __init__(self, file_path: Union[str, Path], **defaults):
         if isinstance(file_path, str):
@@ -21,6 +68,11 @@ class Config:
         self.file_path: Path = file_path
         self.data = {}
         self.defaults = defaults
+        # incremented by each save(), the file has the data of `_written_version`
+        self._version = 0
+        self._written_version = 0
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._write_lock = threading.Lock()
 
         self.load()
         self._add_missing_keys()
@@ -49,15 +101,72 @@ class Config:
         self.load()
 
     def save(self):
-        """updates the config file with the current config data"""
-        with open(self.file_path, 'w', encoding=Config.ENCODING) as file:
-            json.dump(self.data, file, indent=2, ensure_ascii=False)
+        """
+        updates the config file with the current config data
+
+        if called from a running event loop, the write is debounced: all the saves within SAVE_DELAY_SECONDS are written at once,
+        and the file is written by a worker thread, call flush() to write it right away (ex: before exiting)
+        """
+        self._version += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+
+        if self._save_handle is None:
+            self._save_handle = loop.call_later(self.SAVE_DELAY_SECONDS, self._write_in_background)
+            _configs_pending_save.add(self)
+
+    def flush(self):
+        """writes the config file now (on the calling thread) if it has unwritten changes"""
+        self._cancel_pending_save()
+        if self._written_version < self._version:
+            self._write(self._version, self._serialize(self.data))
+
+    def _cancel_pending_save(self):
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        _configs_pending_save.discard(self)
+
+    def _write_in_background(self):
+        self._cancel_pending_save()
+        # the data is serialized on the event loop, as it can be changed by the event loop while the worker thread writes it
+        future = asyncio.get_event_loop().run_in_executor(None, self._write_logging_errors, self._version, self._serialize(self.data))
+        future.add_done_callback(self._log_background_write_failure)
+
+    def _log_background_write_failure(self, future: asyncio.Future):
+        # OSErrors are logged by _write_logging_errors(), anything else would be lost with the future
+        if not future.cancelled() and future.exception() is not None:
+            print(f'[CONFIG] unexpected error while saving config "{self.file_path}": {future.exception()!r}')
+
+    def _serialize(self, data: dict) -> str:
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+    def _write(self, version: int, text: str):
+        with self._write_lock:
+            # a newer version was already written (ex: by flush() while this write was waiting for a worker thread)
+            if version <= self._written_version:
+                return
+
+            _atomic_write_text(self.file_path, text, Config.ENCODING)
+            self._written_version = version
+
+    def _write_logging_errors(self, version: int, text: str):
+        try:
+            self._write(version, text)
+        except OSError as e:
+            print(f'[CONFIG] failed to save config "{self.file_path}": {e}')
 
     def load(self):
         """
         loads the config file's contents into this config object's `data` attribute
         creates the config if it doesnt exist
         """
+        # make sure the file has all saved changes before reading it
+        self.flush()
+
         if not self.exist:
             self.create()
 
@@ -75,8 +184,7 @@ class Config:
             except FileExistsError:
                 pass
 
-        with open(self.file_path, 'w', encoding=Config.ENCODING) as file:
-            json.dump(self.defaults, file, indent=2, ensure_ascii=False)
+        _atomic_write_text(self.file_path, self._serialize(self.defaults), Config.ENCODING)
 
     def __getattr__(self, item):
         """allows for getting config values by accessing a attribute"""
@@ -105,10 +213,15 @@ cfg = Config(
     nick=DEFAULT_NICK,
     oauth=DEFAULT_OAUTH,
     client_id=DEFAULT_CLIENT_ID,
+    # optional, if both are set the oauth token is refreshed before it expires
+    oauth_refresh_token='',
+    client_secret='',
     prefix='!',
     default_balance=200,
     loyalty_interval=60,
     loyalty_amount=2,
+    # if True, viewers in the channel's chatters list get loyalty balance too, not only viewers that chatted recently
+    loyalty_pay_lurkers=False,
     owner='BOT_OWNER_NAME',
     channels=['channel'],
     mods_folder='mods',
@@ -127,11 +240,16 @@ cfg = Config(
     ],
     enable_cooldown_bypass_permissions=True,
     disable_command_permission_denied_message=False,
+    # if True, a chat message that is only a choice id counts as a vote while the channel has one active poll
+    enable_bare_number_votes=False,
+    # if True, the poll announcer mod sends the current results of a poll each time its new votes are tallied
+    announce_poll_vote_tallies=False,
 )
 
 message_timer_cfg = Config(
     file_path=CONFIG_FOLDER / 'message_timer_options.json',
     no_chat_message_auto_disable_seconds=300,
+    start_jitter_seconds=5,
 )
 
 database_cfg = Config(
@@ -148,6 +266,15 @@ database_cfg = Config(
 )
 
 
+def flush_configs():
+    """writes all configs that have unwritten saves"""
+    for config in list(_configs_pending_save):
+        config.flush()
+
+
+atexit.register(flush_configs)
+
+
 def generate_config():
     if not is_config_valid(check_client_id=False):
         if input('show the bot config GUI? [Y/N]: ').lower() == 'y':
@@ -250,5 +377,36 @@ def get_client_id() -> str:
     return client_id
 
 
+def _get_optional_config_value(key: str) -> str:
+    """gets a optional config value that supports the `ENV_KEY_HERE` pattern, returns a empty string if it is not set"""
+    from .util import get_env_value, is_env_key
+    value = cfg[key] or ''
+    if is_env_key(value):
+        env_value = get_env_value(value)
+        if env_value is None:
+            print(f'could not get {key.upper()} from environment with key: {value[4:]}')
+            return ''
+        return env_value
+    return value
+
+
+def get_oauth_refresh_token() -> str:
+    """
+    gets the refresh token for the bot accounts OAUTH, returns a empty string if none is set
+
+    if the the refresh token matches the pattern `ENV_KEY_HERE` it will get `KEY_HERE` from os.environ, else it just grabs it from the cfg
+    """
+    return _get_optional_config_value('oauth_refresh_token')
+
+
+def get_client_secret() -> str:
+    """
+    gets the client secret of the twitch app for CLIENT_ID, returns a empty string if none is set
+
+    if the the CLIENT_SECRET matches the pattern `ENV_KEY_HERE` it will get `KEY_HERE` from os.environ, else it just grabs it from the cfg
+    """
+    return _get_optional_config_value('client_secret')
+
+
 def get_command_prefix() -> str:
     return cfg.prefix
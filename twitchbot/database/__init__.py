@@ -1,6 +1,7 @@
 from .quotes import *
 from .commands import *
 from .session import *
+from .cache import *
 from .models import *
 from .currency import *
 from .message_timer import *
@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Set, Tuple, TypeVar
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+__all__ = ('ReadThroughCache', 'database_cache')
+
+T = TypeVar('T')
+CacheKey = Tuple[str, Tuple[Hashable, ...]]
+
+
+def _detached_copy(value):
+    """
+    returns a copy of ORM objects (or lists of them) that is not attached to any session,
+    so cached values never alias the session's instances and are never expired by commits
+    """
+    if isinstance(value, list):
+        return [_detached_copy(item) for item in value]
+
+    mapper = inspect(type(value), raiseerr=False)
+    if mapper is None:
+        return value
+
+    copy = mapper.class_(**{attr.key: getattr(value, attr.key) for attr in mapper.column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
+class ReadThroughCache:
+    """
+    a LRU + TTL bounded read-through cache for database lookups
+
+    entries are keyed by a model and the filter values used to load them,
+    the helpers that modify a model are responsible for calling invalidate() for it
+
+    values are stored as detached copies and are READ-ONLY, changing them does NOT update the database
+    (session.commit() does not see them), use the modifying helpers (ex: set_currency_name) for that
+
+    only the get_cached_* helpers read through this cache,
+    the regular getters (ex: get_custom_command) return instances attached to the session, that can be modified and committed
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, Any]]' = OrderedDict()
+        self._keys_by_model: Dict[str, Set[CacheKey]] = {}
+
+    def get(self, model, filters: Tuple[Hashable, ...], loader: Callable[[], T]) -> T:
+        """returns the cached value for the model and filters, calling loader() to load it if it is missing or expired"""
+        key = (model.__name__, filters)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = _detached_copy(loader())
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self._keys_by_model.setdefault(key[0], set()).add(key)
+
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+        return value
+
+    def invalidate(self, model, *filters_prefix: Hashable) -> None:
+        """removes all the model's entries whose filters start with filters_prefix (all the model's entries if none given)"""
+        size = len(filters_prefix)
+        for key in tuple(self._keys_by_model.get(model.__name__, ())):
+            if key[1][:size] == filters_prefix:
+                self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_model.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def _remove(self, key: CacheKey):
+        self._entries.pop(key, None)
+        keys = self._keys_by_model.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+database_cache = ReadThroughCache()
@@ -1,55 +1,85 @@
 from typing import Optional, List
 
+from .cache import database_cache
 from .session import get_database_session
 from .models import CustomCommand
-from ..util import query_exists
 
 __all__ = (
     'custom_command_exist',
     'get_custom_command',
     'add_custom_command',
+    'update_custom_command',
     'delete_custom_command',
     'get_all_custom_commands',
+    'get_cached_custom_command',
+    'get_cached_custom_commands',
 )
 
 
 def custom_command_exist(channel: str, name: str) -> bool:
-    session = get_database_session()
-    return query_exists(session, CustomCommand.channel == channel, CustomCommand.name == name)
+    return get_cached_custom_command(channel, name) is not None
 
 
 def get_custom_command(channel: str, name: str) -> Optional[CustomCommand]:
     """gets a custom command from the DB, returns the command if found, else None"""
     assert isinstance(name, str), 'name must be of type str'
     session = get_database_session()
-    return session.query(CustomCommand).filter(CustomCommand.channel == channel,
-                                               CustomCommand.name == name).one_or_none()
+    return session.query(CustomCommand).filter(CustomCommand.channel == channel, CustomCommand.name == name).one_or_none()
+
+
+def get_cached_custom_command(channel: str, name: str) -> Optional[CustomCommand]:
+    """
+    cached version of get_custom_command, for lookups that only read the command (ex: handling chat messages)
+
+    READ-ONLY: the returned command is a detached copy, changes made to it are NOT saved by session.commit(),
+    use get_custom_command() or update_custom_command() to change a command
+    """
+    assert isinstance(name, str), 'name must be of type str'
+    return database_cache.get(CustomCommand, (channel, name), lambda: get_custom_command(channel, name))
 
 
 def add_custom_command(cmd: CustomCommand) -> bool:
     """adds a custom command, returns a bool if it was successful"""
 
-    if get_custom_command(cmd.channel, cmd.name) is not None:
+    if custom_command_exist(cmd.channel, cmd.name):
         return False
 
     session = get_database_session()
     session.add(cmd)
     session.commit()
+    database_cache.invalidate(CustomCommand, cmd.channel)
     return True
 
 
+def update_custom_command(channel: str, name: str, response: str) -> bool:
+    """updates the response of a custom command, returns if it was successful"""
+    session = get_database_session()
+    updated = session.query(CustomCommand) \
+        .filter(CustomCommand.channel == channel, CustomCommand.name == name) \
+        .update({CustomCommand.response: response}, synchronize_session=False)
+    session.commit()
+    database_cache.invalidate(CustomCommand, channel)
+    return bool(updated)
+
+
 def delete_custom_command(channel: str, name: str) -> bool:
     """deletes the custom command from the DB if it exist, return if it was successful"""
     assert isinstance(name, str), 'name must be of type str'
 
-    if get_custom_command(channel, name) is None:
+    if not custom_command_exist(channel, name):
         return False
 
     session = get_database_session()
     session.query(CustomCommand).filter(CustomCommand.channel == channel, CustomCommand.name == name).delete()
     session.commit()
+    database_cache.invalidate(CustomCommand, channel)
     return True
 
 
 def get_all_custom_commands(channel: str) -> List[CustomCommand]:
     return get_database_session().query(CustomCommand).filter(CustomCommand.channel == channel).all()
+
+
+def get_cached_custom_commands(channel: str) -> List[CustomCommand]:
+    """cached version of get_all_custom_commands, READ-ONLY: the commands are detached copies, see get_cached_custom_command"""
+    return database_cache.get(CustomCommand, (channel,), lambda: get_all_custom_commands(channel))
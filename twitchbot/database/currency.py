@@ -1,31 +1,49 @@
-from typing import Dict, Optional
+from typing import Optional, Iterable
+from .cache import database_cache
 from .models import Balance, CurrencyName
 from .session import session
 from ..enums import SubtractBalanceResult
+from ..util import insert_or_ignore, upsert
 
 __all__ = [
     'get_balance',
     'set_balance',
     'get_currency_name',
+    'get_cached_currency_name',
     'add_balance',
     'add_balance_to_all',
+    'add_balance_to_users',
     'get_balance_from_msg',
     'set_currency_name',
     'subtract_balance',
     'subtract_balance_from_all',
 ]
 
-currency_name_cache: Dict[str, CurrencyName] = {}
-
-
 def add_balance_to_all(channel: str, value: int):
+    channel = channel.lower()
     session.query(Balance) \
         .filter(Balance.channel == channel) \
         .update({Balance.balance: Balance.balance + value})
     session.commit()
 
 
+def add_balance_to_users(channel: str, users: Iterable[str], value: int, commit=True):
+    """adds balance to all the users in the specified channel, creating missing balances, using one INSERT and one UPDATE"""
+    channel = channel.lower()
+    users = {user.lower() for user in users}
+    if not users:
+        return
+
+    Balance.ensure_all_exist(channel, users)
+    session.query(Balance) \
+        .filter(Balance.channel == channel, Balance.user.in_(users)) \
+        .update({Balance.balance: Balance.balance + value}, synchronize_session=False)
+    if commit:
+        session.commit()
+
+
 def subtract_balance_from_all(channel: str, value: int):
+    channel = channel.lower()
     session.query(Balance) \
         .filter(Balance.channel == channel, Balance.balance >= value) \
         .update({Balance.balance: Balance.balance - value})
@@ -66,6 +84,8 @@ def subtract_balance(channel: str, user: str, value: int, commit=True) -> Subtra
 def get_balance(channel: str, user: str, create_if_missing=True) -> Optional[Balance]:
     """gets the balance of the user for the specified channel"""
 
+    # balances are stored with a lowercase channel name
+    channel = channel.lower()
     user = user.lower()
     bal = session.query(Balance).filter(Balance.channel == channel, Balance.user == user).one_or_none()
 
@@ -73,9 +93,9 @@ def get_balance(channel: str, user: str, create_if_missing=True) -> Optional[Bal
         if not create_if_missing:
             return None
 
-        bal = Balance.create(channel, user)
-        session.add(bal)
-        session.commit()
+        # insert-or-ignore instead of a plain insert, another caller may have created the balance in the meantime
+        Balance.ensure_exists(channel, user)
+        bal = session.query(Balance).filter(Balance.channel == channel, Balance.user == user).one()
 
     return bal
 
@@ -86,35 +106,41 @@ def get_balance_from_msg(msg) -> Balance:
     return get_balance(msg.channel_name, msg.author.lower())
 
 
-def get_currency_name(channel: str) -> CurrencyName:
-    """returns a CurrencyName object for the channel specifed, returns None if it doesnt exist"""
-
-    if channel in currency_name_cache:
-        return currency_name_cache[channel]
-
+def _load_currency_name(channel: str) -> CurrencyName:
+    # channel is lowercase, as currency names are stored with a lowercase channel name
     currency = session.query(CurrencyName).filter(CurrencyName.channel == channel).one_or_none()
     if currency is None:
-        currency = CurrencyName.create(channel, 'points')
-        session.add(currency)
+        insert_or_ignore(session, CurrencyName, {'channel': channel, 'name': 'points'}, ('channel',))
         session.commit()
+        currency = session.query(CurrencyName).filter(CurrencyName.channel == channel).one()
 
-    currency_name_cache[channel] = currency
     return currency
 
 
+def get_currency_name(channel: str) -> CurrencyName:
+    """returns a CurrencyName object for the channel specifed, creating it with the name "points" if it doesnt exist"""
+    return _load_currency_name(channel.lower())
+
+
+def get_cached_currency_name(channel: str) -> CurrencyName:
+    """
+    cached version of get_currency_name, for reading the currency name (ex: in command replies)
+
+    READ-ONLY: the returned CurrencyName is a detached copy, changes made to it are NOT saved by session.commit(),
+    use set_currency_name() to change it
+    """
+    channel = channel.lower()
+    return database_cache.get(CurrencyName, (channel,), lambda: _load_currency_name(channel))
+
+
 def set_currency_name(channel: str, new_name: str) -> bool:
     """sets a channels currency name, return if it was successful"""
 
     if not new_name:
         return False
 
-    currency = get_currency_name(channel)
-
-    if currency is None:
-        session.add(CurrencyName.create(channel, new_name))
-    else:
-        currency.name = new_name
-
-    currency_name_cache[channel] = currency
+    channel = channel.lower()
+    upsert(session, CurrencyName, {'channel': channel, 'name': new_name}, ('channel',), {'name': new_name})
     session.commit()
+    database_cache.invalidate(CurrencyName, channel)
     return True
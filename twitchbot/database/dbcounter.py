@@ -1,12 +1,13 @@
-from sqlalchemy import Integer
 from typing import Union, Optional, List
 
 from .session import session
+from .cache import database_cache
 from .models import DBCounter
+from ..util import upsert
 
 __all__ = ('counter_exist', 'get_all_counters', 'add_counter', 'increment_counter', 'increment_or_add_counter',
            'set_counter', 'delete_counter_by_id', 'delete_counter_by_alias',
-           'get_counter_by_id', 'get_counter_by_alias', 'get_counter')
+           'get_counter_by_id', 'get_counter_by_alias', 'get_counter', 'get_cached_counter')
 
 
 def counter_exist(channel: str, id: int = None, alias: str = None) -> bool:
@@ -34,6 +35,7 @@ def add_counter(counter: DBCounter) -> bool:
 
     session.add(counter)
     session.commit()
+    database_cache.invalidate(DBCounter, counter.channel)
     return True
 
 
@@ -59,57 +61,103 @@ def get_counter(channel: str, id_or_alias: Union[str, int]) -> Optional[DBCounte
         return get_counter_by_alias(channel, str(id_or_alias))
 
 
+def get_cached_counter(channel: str, id_or_alias: Union[str, int]) -> Optional[DBCounter]:
+    """
+    cached version of get_counter, for reading a counter
+
+    READ-ONLY: the returned counter is a detached copy, changes made to it are NOT saved by session.commit(),
+    use set_counter() or increment_counter() to change a counter
+    """
+    try:
+        id = int(id_or_alias)
+        return database_cache.get(DBCounter, (channel, 'id', id), lambda: get_counter_by_id(channel, id))
+    except (ValueError, TypeError):
+        alias = str(id_or_alias)
+        return database_cache.get(DBCounter, (channel, 'alias', alias), lambda: get_counter_by_alias(channel, alias))
+
+
 def delete_counter_by_id(channel: str, id: int) -> None:
     assert isinstance(id, int), 'counter_id must be of type int'
     session.query(DBCounter).filter(DBCounter.channel == channel, DBCounter.id == id).delete()
     session.commit()
+    database_cache.invalidate(DBCounter, channel)
 
 
 def delete_counter_by_alias(channel: str, alias: str) -> None:
     assert isinstance(alias, str), 'counter_alias must be of type str'
     session.query(DBCounter).filter(DBCounter.channel == channel, DBCounter.alias == alias).delete()
     session.commit()
+    database_cache.invalidate(DBCounter, channel)
+
+
+def _counter_filters(channel: str, id_or_alias: Union[str, int]) -> list:
+    """builds the filters used to find a counter, following the same id-then-alias rule as get_counter()"""
+    try:
+        return [DBCounter.channel == channel, DBCounter.id == int(id_or_alias)]
+    except (ValueError, TypeError):
+        return [DBCounter.channel == channel, DBCounter.alias == str(id_or_alias)]
 
 
-def increment_counter(channel: str, id_or_alias: Union[str, int]) -> Optional[int]:
+def _atomic_add_to_counter(filters: list, amount: int) -> Optional[int]:
     """
-    tries to set  the counter an returns the new counter value or None
+    adds amount to the counter in the database using a single `UPDATE ... SET value = value + amount`,
+    the new value is read back before the transaction is committed, so it always reflects this increment.
+
+    does NOT commit, returns None if no counter matched the filters
     """
-    cur_counter = get_counter(channel, id_or_alias)
-    if cur_counter is None:
+    updated = session.query(DBCounter) \
+        .filter(*filters) \
+        .update({DBCounter.value: DBCounter.value + amount}, synchronize_session=False)
+
+    if not updated:
         return None
 
-    cur_counter.value += 1
+    return session.query(DBCounter.value).filter(*filters).scalar()
+
+
+def increment_counter(channel: str, id_or_alias: Union[str, int], amount: int = 1) -> Optional[int]:
+    """
+    atomically increments the counter by amount and returns the new counter value or None
+    """
+    value = _atomic_add_to_counter(_counter_filters(channel, id_or_alias), amount)
+    if value is None:
+        session.rollback()
+        return None
 
     session.commit()
-    return cur_counter.value
+    database_cache.invalidate(DBCounter, channel)
+    return value
 
 
-def increment_or_add_counter(channel: str, alias: str) -> int:
+def increment_or_add_counter(channel: str, alias: str, amount: int = 1) -> int:
     """
-    if the counter does not exits it will be automatically created with the value 0
+    atomically increments the counter by amount,
+    if the counter does not exits it will be automatically created with the value 0 before incrementing
     the countervalue will be returned
     """
-
-    if not counter_exist(channel=channel, alias=alias):
-        counter = DBCounter.create(channel=channel, alias=alias)
-        add_counter(counter)
-
-    return increment_counter(channel, alias)
+    upsert(session, DBCounter, {'channel': channel, 'alias': alias, 'value': amount}, ('channel', 'alias'),
+           {'value': DBCounter.value + amount})
+    value = session.query(DBCounter.value).filter(DBCounter.channel == channel, DBCounter.alias == alias).scalar()
+    session.commit()
+    database_cache.invalidate(DBCounter, channel)
+    return value
 
 
 def set_counter(channel: str, id_or_alias: Union[str, int], new_value) -> Optional[int]:
     """
     tries to set counter an returns the new counter value or None
     """
-    cur_counter = get_counter(channel, id_or_alias)
-    if cur_counter is None:
-        return None
+    updated = session.query(DBCounter) \
+        .filter(*_counter_filters(channel, id_or_alias)) \
+        .update({DBCounter.value: new_value}, synchronize_session=False)
 
-    cur_counter.value = new_value
+    if not updated:
+        session.rollback()
+        return None
 
     session.commit()
-    return cur_counter.value
+    database_cache.invalidate(DBCounter, channel)
+    return new_value
 
 
 def get_all_counters(channel: str) -> List[DBCounter]:
@@ -1,18 +1,161 @@
 import time
-from asyncio import sleep, ensure_future
-from typing import Optional, Dict, List
-
+from asyncio import Event, TimeoutError, wait_for, gather
+from dataclasses import dataclass
+from heapq import heappush, heappop, heapify
+from itertools import count
+from random import uniform
+from typing import Optional, Dict, List, Tuple
+
+from .cache import database_cache
 from .models import MessageTimer
 from .session import session
 from ..channel import channels
+from ..util import add_task, add_nameless_task, task_running
 
-__all__ = ('get_message_timer', 'set_message_timer', 'message_timer_exist', 'set_message_timer_interval',
+__all__ = ('get_message_timer', 'get_cached_message_timer', 'set_message_timer', 'message_timer_exist', 'set_message_timer_interval',
            'set_message_timer_message', 'delete_all_message_timers', 'delete_message_timer', 'set_message_timer_active',
-           'active_message_timers', 'get_all_message_timers', 'restart_message_timer')
+           'active_message_timers', 'get_all_message_timers', 'restart_message_timer', 'MessageTimerScheduler',
+           'message_timer_scheduler')
 
 active_message_timers: Dict[str, MessageTimer] = {}
 
 
+@dataclass
+class _ScheduledTimer:
+    channel: str
+    name: str
+    message: str
+    interval: float
+    # monotonic time the timer is next due at
+    due: float = 0
+    # used to ignore stale heap entries left behind by rescheduling/removing a timer
+    seq: int = 0
+    # seconds since the last chat message in the channel, taken when the timer was (re)scheduled
+    chat_idle_seconds: float = 0
+
+
+class MessageTimerScheduler:
+    """
+    runs every active message timer, across all channels, from a single task using a heap of due times
+
+    timers are given a random start offset (jitter) so timers sharing a interval do not fire at the same time,
+    all timers that are due together are sent as one batch
+    """
+
+    def __init__(self, task_name: str = 'message_timer_scheduler'):
+        self.task_name = task_name
+        self._timers: Dict[str, _ScheduledTimer] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = count()
+        self._wakeup: Optional[Event] = None
+
+    def __contains__(self, key: str):
+        return key in self._timers
+
+    def __len__(self):
+        return len(self._timers)
+
+    def schedule(self, timer: MessageTimer) -> None:
+        """adds or restarts the timer, its first message is sent after its interval plus a random jitter"""
+        key = _key(timer.channel, timer.name)
+        entry = _ScheduledTimer(channel=timer.channel, name=timer.name, message=timer.message, interval=timer.interval)
+        self._timers[key] = entry
+        self._push(key, entry, time.monotonic() + entry.interval + self._jitter(entry.interval))
+        self._ensure_running()
+
+    def reschedule(self, key: str) -> bool:
+        """restarts the interval of a scheduled timer without reloading it, returns if the timer was scheduled"""
+        entry = self._timers.get(key)
+        if entry is None:
+            return False
+
+        self._push(key, entry, time.monotonic() + entry.interval + self._jitter(entry.interval))
+        self._wake()
+        return True
+
+    def update(self, key: str, message: str = None, interval: float = None) -> bool:
+        """updates the message and/or interval of a scheduled timer, returns if the timer was scheduled"""
+        entry = self._timers.get(key)
+        if entry is None:
+            return False
+
+        if message is not None:
+            entry.message = message
+        if interval is not None and interval != entry.interval:
+            # keep the time of the last send, the pushed entry replaces the one due at the old interval (its seq no longer matches)
+            due = max(time.monotonic(), entry.due - entry.interval + interval)
+            entry.interval = interval
+            self._push(key, entry, due)
+            self._wake()
+        return True
+
+    def unschedule(self, key: str) -> bool:
+        """removes the timer from the scheduler, returns if it was scheduled"""
+        if self._timers.pop(key, None) is None:
+            return False
+
+        # the removed timer's heap entries are skipped when popped, compact the heap if they start to pile up
+        if len(self._heap) > 2 * len(self._timers) + 64:
+            self._heap = [item for item in self._heap if item[2] in self._timers and self._timers[item[2]].seq == item[1]]
+            heapify(self._heap)
+        return True
+
+    @staticmethod
+    def _jitter(interval: float) -> float:
+        from ..config import message_timer_cfg
+        return uniform(0, min(interval, max(0, message_timer_cfg.start_jitter_seconds or 0)))
+
+    def _push(self, key: str, entry: _ScheduledTimer, due: float):
+        channel = channels.get(entry.channel)
+        if channel is not None:
+            entry.chat_idle_seconds = max(0, abs(channel.last_privmsg_time - time.time()))
+
+        entry.due = due
+        entry.seq = next(self._seq)
+        heappush(self._heap, (due, entry.seq, key))
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_running(self):
+        if not task_running(self.task_name):
+            add_task(self.task_name, self._run())
+        self._wake()
+
+    def _pop_due(self, now: float) -> List[_ScheduledTimer]:
+        due_timers = []
+        while self._heap and self._heap[0][0] <= now:
+            due, seq, key = heappop(self._heap)
+            entry = self._timers.get(key)
+            if entry is None or entry.seq != seq:
+                continue
+
+            due_timers.append(entry)
+            # keep the timers phase, unless the scheduler fell behind by a whole interval
+            next_due = due + entry.interval
+            self._push(key, entry, next_due if next_due > now else now + entry.interval)
+
+        return due_timers
+
+    async def _run(self):
+        self._wakeup = Event()
+        while True:
+            due_timers = self._pop_due(time.monotonic())
+            if due_timers:
+                add_nameless_task(_send_message_timers(due_timers))
+
+            timeout = max(0, self._heap[0][0] - time.monotonic()) if self._heap else None
+            self._wakeup.clear()
+            try:
+                await wait_for(self._wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
+
+
+message_timer_scheduler = MessageTimerScheduler()
+
+
 def timer_one_or_none(channel, *criteria) -> Optional[MessageTimer]:
     return session.query(MessageTimer).filter(MessageTimer.channel == channel, *criteria).one_or_none()
 
@@ -22,13 +165,23 @@ def get_message_timer(channel: str, name: str) -> Optional[MessageTimer]:
     return timer_one_or_none(channel, MessageTimer.name == name)
 
 
+def get_cached_message_timer(channel: str, name: str) -> Optional[MessageTimer]:
+    """
+    cached version of get_message_timer, for reading a timer (ex: the timer commands)
+
+    READ-ONLY: the returned timer is a detached copy, changes made to it are NOT saved by session.commit(),
+    use the set_message_timer_* helpers to change a timer
+    """
+    return database_cache.get(MessageTimer, (channel, name), lambda: get_message_timer(channel, name))
+
+
 def get_all_message_timers(channel: str) -> List[MessageTimer]:
     return session.query(MessageTimer).filter(MessageTimer.channel == channel).all()
 
 
 def set_message_timer(channel: str, name: str, message: str, interval: float) -> None:
     """updates or adds a MessageTimer to the database"""
-    timer = get_message_timer(channel, name)
+    timer = timer_one_or_none(channel, MessageTimer.name == name)
 
     if timer:
         timer.message = message
@@ -38,29 +191,35 @@ def set_message_timer(channel: str, name: str, message: str, interval: float) ->
         session.add(timer)
 
     session.commit()
+    database_cache.invalidate(MessageTimer, channel)
+    message_timer_scheduler.update(_key(channel, name), message=message, interval=interval)
 
 
 def set_message_timer_interval(channel: str, name: str, interval: float) -> bool:
     """updates a MessageTimers interval, returns a bool if it was successful"""
-    timer = get_message_timer(channel, name)
+    timer = timer_one_or_none(channel, MessageTimer.name == name)
 
     if not timer:
         return False
 
     timer.interval = interval
     session.commit()
+    database_cache.invalidate(MessageTimer, channel)
+    message_timer_scheduler.update(_key(channel, name), interval=interval)
     return True
 
 
 def set_message_timer_message(channel: str, name: str, message: str) -> bool:
     """updates a MessageTimers message, returns a bool if it was successful"""
-    timer = get_message_timer(channel, name)
+    timer = timer_one_or_none(channel, MessageTimer.name == name)
 
     if not timer:
         return False
 
     timer.message = message
     session.commit()
+    database_cache.invalidate(MessageTimer, channel)
+    message_timer_scheduler.update(_key(channel, name), message=message)
     return True
 
 
@@ -69,8 +228,7 @@ def set_message_timer_active(channel: str, name: str, value: bool) -> bool:
     if its already running it updates it as well,
     returns if it was successful"""
 
-    key = _key(channel, name)
-    timer = get_message_timer(channel, name)
+    timer = timer_one_or_none(channel, MessageTimer.name == name)
 
     if not timer:
         return False
@@ -82,6 +240,7 @@ def set_message_timer_active(channel: str, name: str, value: bool) -> bool:
 
     timer.active = value
     session.commit()
+    database_cache.invalidate(MessageTimer, channel)
 
     return True
 
@@ -92,13 +251,17 @@ def message_timer_exist(channel: str, name: str) -> bool:
 
 
 def delete_all_message_timers(channel: str):
+    for timer in get_all_message_timers(channel):
+        _stop_message_timer(channel, timer.name)
+
     session.query(MessageTimer).filter(MessageTimer.channel == channel).delete()
     session.commit()
+    database_cache.invalidate(MessageTimer, channel)
 
 
 def delete_message_timer(channel: str, name: str) -> bool:
     """deletes a timers on the datebase, returns if it was successful"""
-    timer = get_message_timer(channel, name)
+    timer = timer_one_or_none(channel, MessageTimer.name == name)
 
     if not timer:
         return False
@@ -108,36 +271,27 @@ def delete_message_timer(channel: str, name: str) -> bool:
 
     session.delete(timer)
     session.commit()
+    database_cache.invalidate(MessageTimer, channel)
     return True
 
 
-# fixme: bug with restarting a active message timer?
 def restart_message_timer(channel: str, name: str):
-    if _key(channel, name) in active_message_timers:
-        set_message_timer_active(channel, name, False)
-
-    set_message_timer_active(channel, name, True)
+    """restarts the interval of a running timer, or starts it if it is not running"""
+    if not message_timer_scheduler.reschedule(_key(channel, name)):
+        set_message_timer_active(channel, name, True)
 
 
 def _start_message_timer(channel: str, name: str) -> bool:
     """starts a message timer, returns if it was successful"""
     key = _key(channel, name)
-    timer = active_message_timers.get(key)
-
-    if not timer:
-        timer = get_message_timer(channel, name)
-
-    if timer is None or timer.running:
+    if key in message_timer_scheduler:
         return False
 
-    channel = channels.get(channel)
-
-    if not channel:
+    timer = active_message_timers.get(key) or get_cached_message_timer(channel, name)
+    if timer is None or channel not in channels:
         return False
 
-    if not timer.running:
-        timer.task = ensure_future(_message_timer_say_loop(channel, timer))
-
+    message_timer_scheduler.schedule(timer)
     active_message_timers[key] = timer
     return True
 
@@ -145,30 +299,29 @@ def _start_message_timer(channel: str, name: str) -> bool:
 def _stop_message_timer(channel: str, name: str) -> bool:
     """stops a message timer, returns if it was successful"""
     key = _key(channel, name)
-    timer = active_message_timers.get(key)
-
-    if not timer:
-        return False
+    active_message_timers.pop(key, None)
+    return message_timer_scheduler.unschedule(key)
 
-    if not timer.running or timer.task is None:
-        return False
-
-    timer.task.cancel()
-    del active_message_timers[key]
 
-    return True
+async def _send_message_timers(timers: List[_ScheduledTimer]):
+    from ..config import message_timer_cfg
 
+    sending = []
+    for timer in timers:
+        channel = channels.get(timer.channel)
+        if channel is None:
+            continue
 
-async def _message_timer_say_loop(channel, timer):
-    from ..config import message_timer_cfg
-    while True:
-        channel_last_message_time_diff = max(0, abs(channel.last_privmsg_time - time.time()))
-        await sleep(timer.interval)
         if (
                 message_timer_cfg.no_chat_message_auto_disable_seconds <= 0
-                or channel_last_message_time_diff <= message_timer_cfg.no_chat_message_auto_disable_seconds
+                or timer.chat_idle_seconds <= message_timer_cfg.no_chat_message_auto_disable_seconds
         ):
-            await channel.send_message(timer.message)
+            sending.append((timer, channel.send_message(timer.message)))
+
+    results = await gather(*(send for _, send in sending), return_exceptions=True)
+    for (timer, _), result in zip(sending, results):
+        if isinstance(result, Exception):
+            print(f'[MESSAGE_TIMER] failed to send message for timer "{timer.name}" in channel "{timer.channel}": {result}')
 
 
 def _key(channel, name):
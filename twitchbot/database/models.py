@@ -1,18 +1,18 @@
-from asyncio import Task
-from typing import ClassVar
+from typing import Iterable
 
-from sqlalchemy import Column, Integer, String, Float, Boolean
+from sqlalchemy import Column, Integer, String, Float, Boolean, Index
 
 from .session import Base, get_database_session
 from ..config import cfg
 from ..enums import CommandContext
-from ..util import query_exists
+from ..util import insert_or_ignore
 
 __all__ = ('Quote', 'CustomCommand', 'Balance', 'CurrencyName', 'MessageTimer', 'DBCounter')
 
 
 class Quote(Base):
     __tablename__ = 'quotes'
+    __table_args__ = (Index('ix_quotes_channel_alias', 'channel', 'alias', unique=True),)
 
     id = Column(Integer, primary_key=True, nullable=False)
     user = Column(String(255))
@@ -49,6 +49,7 @@ class CustomCommand(Base):
 
 class Balance(Base):
     __tablename__ = 'balance'
+    __table_args__ = (Index('ix_balance_channel_user', 'channel', 'user', unique=True),)
 
     id = Column(Integer, nullable=False, primary_key=True)
     channel = Column(String(255), nullable=False)
@@ -63,17 +64,27 @@ class Balance(Base):
 
     @classmethod
     def ensure_exists(cls, channel: str, user: str, initial_balance: int = None):
+        cls.ensure_all_exist(channel, (user,), initial_balance)
+
+    @classmethod
+    def ensure_all_exist(cls, channel: str, users: Iterable[str], initial_balance: int = None):
+        """creates the balances that do not exist yet for all the users in a single statement"""
         if initial_balance is None:
             initial_balance = cfg.default_balance
 
+        channel = channel.lower()
+        rows = [{'channel': channel, 'user': user, 'balance': initial_balance} for user in set(users)]
+        if not rows:
+            return
+
         db_session = get_database_session()
-        if not query_exists(db_session, cls.channel == channel, cls.user == user):
-            db_session.add(Balance.create(channel=channel, user=user, balance=initial_balance))
-            db_session.commit()
+        insert_or_ignore(db_session, cls, rows, ('channel', 'user'))
+        db_session.commit()
 
 
 class CurrencyName(Base):
     __tablename__ = 'currency_names'
+    __table_args__ = (Index('ix_currency_names_channel', 'channel', unique=True),)
 
     id = Column(Integer, nullable=False, primary_key=True)
     channel = Column(String(255), nullable=False)
@@ -93,11 +104,11 @@ class MessageTimer(Base):
     message = Column(String(520), nullable=False)
     interval = Column(Float, nullable=False)
     active = Column(Boolean, nullable=False, default=False)
-    task: ClassVar[Task] = None
 
     @property
     def running(self):
-        return self.task is not None and not self.task.done()
+        from .message_timer import message_timer_scheduler, _key
+        return _key(self.channel, self.name) in message_timer_scheduler
 
     @classmethod
     def create(cls, channel: str, name: str, message: str, interval: float, active=False):
@@ -106,6 +117,7 @@ class MessageTimer(Base):
 
 class DBCounter(Base):
     __tablename__ = 'counter'
+    __table_args__ = (Index('ix_counter_channel_alias', 'channel', 'alias', unique=True),)
 
     id = Column(Integer, primary_key=True, nullable=False)
     user = Column(String(255))
@@ -1,9 +1,97 @@
-from typing import Union, Optional
+import re
+from random import choice
+from typing import Union, Optional, Dict, List, Set
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from .cache import database_cache
 from .models import Quote
 from .session import session
 
 __all__ = ('quote_exist', 'add_quote', 'get_quote', 'get_quote_by_alias', 'get_quote_by_id', 'delete_all_quotes',
-           'delete_quote_by_alias', 'delete_quote_by_id')
+           'delete_quote_by_alias', 'delete_quote_by_id', 'get_random_quote', 'search_quotes', 'get_cached_quote')
+
+QUOTES_FTS_TABLE = 'quotes_fts'
+_QUOTES_FTS_SETUP = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {QUOTES_FTS_TABLE} USING fts5(value, content='quotes', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS quotes_fts_insert AFTER INSERT ON quotes BEGIN "
+    f"INSERT INTO {QUOTES_FTS_TABLE}(rowid, value) VALUES (new.id, new.value); END",
+    f"CREATE TRIGGER IF NOT EXISTS quotes_fts_delete AFTER DELETE ON quotes BEGIN "
+    f"INSERT INTO {QUOTES_FTS_TABLE}({QUOTES_FTS_TABLE}, rowid, value) VALUES ('delete', old.id, old.value); END",
+    f"CREATE TRIGGER IF NOT EXISTS quotes_fts_update AFTER UPDATE ON quotes BEGIN "
+    f"INSERT INTO {QUOTES_FTS_TABLE}({QUOTES_FTS_TABLE}, rowid, value) VALUES ('delete', old.id, old.value); "
+    f"INSERT INTO {QUOTES_FTS_TABLE}(rowid, value) VALUES (new.id, new.value); END",
+    f"INSERT INTO {QUOTES_FTS_TABLE}({QUOTES_FTS_TABLE}) VALUES ('rebuild')",
+)
+
+# None = not checked yet, True = sqlite FTS5 is used for searching, False = the in-memory index is used instead
+_fts_enabled: Optional[bool] = None
+# channel => list of all quote ids in that channel, used for picking random quotes without loading every quote
+_quote_ids_cache: Dict[str, List[int]] = {}
+# channel => word => ids of the quotes containing that word, only used when FTS5 is not available
+_quote_word_index: Dict[str, Dict[str, Set[int]]] = {}
+
+
+def _tokenize_quote_text(value: str) -> Set[str]:
+    return set(re.findall(r'\w+', value.lower()))
+
+
+def _invalidate_quote_caches(channel: str = None) -> None:
+    """clears the cached quote id lists and word indexes for the channel, or all channels if channel is None"""
+    if channel is None:
+        _quote_ids_cache.clear()
+        _quote_word_index.clear()
+    else:
+        _quote_ids_cache.pop(channel, None)
+        _quote_word_index.pop(channel, None)
+
+
+def _ensure_fts_enabled() -> bool:
+    """
+    sets up the sqlite FTS5 table for quotes if possible, returns if FTS5 can be used
+
+    FTS5 is only disabled for good if sqlite does not have it, other errors (ex: "database is locked") make this search
+    use the in-memory index, and the setup is tried again by the next search
+    """
+    global _fts_enabled
+    if _fts_enabled is not None:
+        return _fts_enabled
+
+    bind = session.get_bind()
+    if bind.dialect.name != 'sqlite':
+        _fts_enabled = False
+        return _fts_enabled
+
+    try:
+        with bind.begin() as conn:
+            fts_existed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': QUOTES_FTS_TABLE}).first() is not None
+            # the final statement rebuilds the index, which is only needed when the table was just created
+            for statement in _QUOTES_FTS_SETUP[:-1] if fts_existed else _QUOTES_FTS_SETUP:
+                conn.execute(text(statement))
+        _fts_enabled = True
+    except OperationalError as e:
+        if 'no such module: fts5' not in str(e).lower():
+            print(f'[QUOTES] failed to set up sqlite FTS5 quote search, it will be tried again on the next search: {e}')
+            return False
+
+        # sqlite was compiled without FTS5, fall back to the in-memory index
+        _fts_enabled = False
+        print(f'[QUOTES] sqlite FTS5 is not available, using in-memory quote search instead: {e}')
+
+    return _fts_enabled
+
+
+def _get_quote_word_index(channel: str) -> Dict[str, Set[int]]:
+    if channel not in _quote_word_index:
+        index = _quote_word_index[channel] = {}
+        for id, value in session.query(Quote.id, Quote.value).filter(Quote.channel == channel):
+            for word in _tokenize_quote_text(value):
+                index.setdefault(word, set()).add(id)
+
+    return _quote_word_index[channel]
 
 
 def quote_exist(channel: str, id: int = None, alias: str = None) -> bool:
@@ -31,6 +119,14 @@ def add_quote(quote: Quote) -> bool:
 
     session.add(quote)
     session.commit()
+    database_cache.invalidate(Quote, quote.channel)
+
+    if quote.channel in _quote_ids_cache:
+        _quote_ids_cache[quote.channel].append(quote.id)
+    if quote.channel in _quote_word_index:
+        for word in _tokenize_quote_text(quote.value):
+            _quote_word_index[quote.channel].setdefault(word, set()).add(quote.id)
+
     return True
 
 
@@ -52,22 +148,87 @@ def get_quote(channel: str, id_or_alias: Union[str, int]) -> Optional[Quote]:
     """
     try:
         return get_quote_by_id(channel, int(id_or_alias))
-    except ValueError:
+    except (ValueError, TypeError):
         return get_quote_by_alias(channel, str(id_or_alias))
 
 
+def get_cached_quote(channel: str, id_or_alias: Union[str, int]) -> Optional[Quote]:
+    """
+    cached version of get_quote, for reading a quote (ex: the !quote command)
+
+    READ-ONLY: the returned quote is a detached copy, changes made to it are NOT saved by session.commit()
+    """
+    try:
+        id = int(id_or_alias)
+        return database_cache.get(Quote, (channel, 'id', id), lambda: get_quote_by_id(channel, id))
+    except (ValueError, TypeError):
+        alias = str(id_or_alias)
+        return database_cache.get(Quote, (channel, 'alias', alias), lambda: get_quote_by_alias(channel, alias))
+
+
 def delete_quote_by_id(channel: str, id: int) -> None:
     assert isinstance(id, int), 'quote_id must be of type int'
     session.query(Quote).filter(Quote.channel == channel, Quote.id == id).delete()
     session.commit()
+    _invalidate_quote_caches(channel)
+    database_cache.invalidate(Quote, channel)
 
 
 def delete_quote_by_alias(channel: str, alias: str) -> None:
     assert isinstance(alias, str), 'quote_alias must be of type str'
     session.query(Quote).filter(Quote.channel == channel, Quote.alias == alias).delete()
     session.commit()
+    _invalidate_quote_caches(channel)
+    database_cache.invalidate(Quote, channel)
 
 
 def delete_all_quotes():
     session.query(Quote).delete()
     session.commit()
+    _invalidate_quote_caches()
+    database_cache.invalidate(Quote)
+
+
+def get_random_quote(channel: str) -> Optional[Quote]:
+    """
+    returns a random quote from the channel, or None if the channel has no quotes
+
+    the quote ids for the channel are cached, so only the chosen quote is loaded from the database
+    """
+    if channel not in _quote_ids_cache:
+        _quote_ids_cache[channel] = [id for id, in session.query(Quote.id).filter(Quote.channel == channel)]
+
+    ids = _quote_ids_cache[channel]
+    if not ids:
+        return None
+
+    return get_quote_by_id(channel, choice(ids))
+
+
+def search_quotes(channel: str, query: str, limit: int = 25) -> List[Quote]:
+    """
+    returns up to `limit` quotes from the channel that contain every word in the query
+
+    uses sqlite's FTS5 full-text index when available (best matches first), else a in-memory word index
+    """
+    words = _tokenize_quote_text(query)
+    if not words:
+        return []
+
+    if _ensure_fts_enabled():
+        # quote every word so user input is never interpreted as FTS5 query syntax
+        match = ' '.join(f'"{word}"' for word in words)
+        ids = [id for id, in session.execute(
+            text(f'SELECT quotes.id FROM {QUOTES_FTS_TABLE} JOIN quotes ON quotes.id = {QUOTES_FTS_TABLE}.rowid '
+                 f'WHERE {QUOTES_FTS_TABLE} MATCH :match AND quotes.channel = :channel ORDER BY rank LIMIT :limit'),
+            {'match': match, 'channel': channel, 'limit': limit})]
+    else:
+        index = _get_quote_word_index(channel)
+        ids = set.intersection(*(index.get(word, set()) for word in words))
+        ids = sorted(ids)[:limit]
+
+    if not ids:
+        return []
+
+    quotes = {quote.id: quote for quote in session.query(Quote).filter(Quote.channel == channel, Quote.id.in_(ids))}
+    return [quotes[id] for id in ids if id in quotes]
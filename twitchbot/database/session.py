@@ -1,10 +1,12 @@
 import os
 
 from sqlalchemy import create_engine, orm
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 
 from ..config import database_cfg
 from ..util import is_env_key
+from ..util.database_util import _clear_unique_index_cache
 
 __all__ = ('Base', 'engine', 'get_database_session', 'DB_FILENAME', 'init_tables', 'session')
 
@@ -57,3 +59,20 @@ def get_database_session():
 
 def init_tables():
     Base.metadata.create_all(engine)
+    _create_missing_indexes()
+
+
+def _create_missing_indexes():
+    """
+    create_all() only creates indexes for new tables, this adds indexes that were introduced after a table was created,
+    such as the unique indexes used for upserts
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except SQLAlchemyError as e:
+                # most likely existing duplicate rows, the upsert helpers fall back to check-then-insert without the index
+                print(f'[DATABASE] could not create index "{index.name}" on table "{table.name}": {e}')
+
+    _clear_unique_index_cache()
@@ -1,6 +1,7 @@
 from typing import Dict
 from dataclasses import dataclass, field
-from .util import get_url
+from .exceptions import TwitchAPICircuitOpenError
+from .util import get_url, twitch_api_response_cache
 
 
 @dataclass(frozen=True)
@@ -11,11 +12,17 @@ class Emote:
 
 
 GLOBAL_EMOTE_API = 'https://api.twitchemotes.com/api/v4/channels/0'
+GLOBAL_EMOTE_RESPONSE_CACHE_TTL = 60 * 60
+twitch_api_response_cache.set_endpoint_ttl(GLOBAL_EMOTE_API, GLOBAL_EMOTE_RESPONSE_CACHE_TTL)
 emotes: Dict[str, Emote] = {}
 
 
 async def update_global_emotes():
-    _, data = await get_url(GLOBAL_EMOTE_API)
+    try:
+        _, data = await get_url(GLOBAL_EMOTE_API)
+    except TwitchAPICircuitOpenError as e:
+        print(f'[EMOTES] {e}')
+        return
 
     if not data or 'emotes' not in data:
         return
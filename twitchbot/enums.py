@@ -61,12 +61,14 @@ class Event(NamedEnum):
     on_raw_message = auto()
     on_user_join = auto()
     on_user_part = auto()
+    on_channel_chatters_changed = auto()
     on_mod_reloaded = auto()
     on_channel_points_redemption = auto()
     on_bot_banned_from_channel = auto()
     on_bot_timed_out_from_channel = auto()
     on_poll_started = auto()
     on_poll_ended = auto()
+    on_poll_votes_tallied = auto()
     on_pubsub_received = auto()
     on_pubsub_custom_channel_point_reward = auto()
     on_pubsub_bits = auto()
@@ -0,0 +1,3 @@
+from .client import *
+from .adapters import *
+from .subscription_types import *
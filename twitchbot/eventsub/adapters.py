@@ -0,0 +1,178 @@
+from typing import Callable, Dict, Optional, Tuple
+
+from ..pubsub import PubSubData, PubSubTopics
+from .subscription_types import EventSubSubscriptionTypes
+
+__all__ = [
+    'EventSubData',
+    'eventsub_notification_to_pubsub_data',
+]
+
+
+class EventSubData(PubSubData):
+    """
+    a EventSub notification in the shape of a PubSub MESSAGE, so the PubSub models (PubSubBits, PubSubFollow, etc)
+    and the `on_pubsub_*` events work the same for both transports
+
+    the original notification is kept as `notification`, its `event` as `event`
+    """
+
+    def __init__(self, raw_data: dict, notification: dict):
+        super().__init__(raw_data)
+        self.notification: dict = notification
+
+    @property
+    def subscription_type(self) -> str:
+        return self.notification.get('metadata', {}).get('subscription_type', '')
+
+    @property
+    def event(self) -> dict:
+        return self.notification.get('payload', {}).get('event', {})
+
+
+def _channel_point_redemption(event: dict) -> Tuple[str, dict]:
+    channel_id = event.get('broadcaster_user_id', '')
+    return PubSubTopics.channel_points, {
+        'type': PubSubData.REWARD_REDEEMED_TYPE,
+        'data': {
+            'timestamp': event.get('redeemed_at', ''),
+            'redemption': {
+                'id': event.get('id', ''),
+                'user': {
+                    'id': event.get('user_id', ''),
+                    'login': event.get('user_login', ''),
+                    'display_name': event.get('user_name', ''),
+                },
+                'channel_id': channel_id,
+                'redeemed_at': event.get('redeemed_at', ''),
+                'reward': {**(event.get('reward') or {}), 'channel_id': channel_id},
+                'user_input': event.get('user_input', ''),
+                'status': event.get('status', '').upper(),
+            },
+        },
+    }
+
+
+def _bits(event: dict) -> Tuple[str, dict]:
+    return PubSubTopics.bits, {
+        'message_type': PubSubData.BITS_MESSAGE_TYPE,
+        'data': {
+            'user_name': event.get('user_login', ''),
+            'channel_name': event.get('broadcaster_user_login', ''),
+            'user_id': event.get('user_id', ''),
+            'channel_id': event.get('broadcaster_user_id', ''),
+            'chat_message': event.get('message', ''),
+            'bits_used': event.get('bits', 0),
+            'is_anonymous': event.get('is_anonymous', False),
+            'context': 'cheer',
+        },
+    }
+
+
+def _subscription(event: dict) -> Tuple[str, dict]:
+    is_gift = event.get('is_gift', False)
+    return PubSubTopics.channel_subscriptions, {
+        'channel_id': event.get('broadcaster_user_id', ''),
+        'channel_name': event.get('broadcaster_user_login', ''),
+        'user_id': event.get('user_id', ''),
+        'user_name': event.get('user_login', ''),
+        'display_name': event.get('user_name', ''),
+        'sub_plan': event.get('tier', ''),
+        'is_gift': is_gift,
+        'context': 'subgift' if is_gift else 'sub',
+    }
+
+
+def _follow(event: dict) -> Tuple[str, dict]:
+    return PubSubTopics.follows, {
+        'display_name': event.get('user_name', ''),
+        'username': event.get('user_login', ''),
+        'user_id': event.get('user_id', ''),
+    }
+
+
+def _poll(poll_update_type: str) -> Callable[[dict], Tuple[str, dict]]:
+    def adapter(event: dict) -> Tuple[str, dict]:
+        choices = []
+        for choice in event.get('choices', ()):
+            votes = choice.get('votes', 0)
+            bits = choice.get('bits_votes', 0)
+            channel_points = choice.get('channel_points_votes', 0)
+            choices.append({
+                'choice_id': choice.get('id', ''),
+                'title': choice.get('title', ''),
+                'votes': {'total': votes, 'bits': bits, 'channel_points': channel_points, 'base': max(0, votes - bits - channel_points)},
+            })
+
+        return PubSubTopics.twitch_poll_updates, {
+            'type': poll_update_type,
+            'data': {
+                'poll': {
+                    'poll_id': event.get('id', ''),
+                    'owned_by': event.get('broadcaster_user_id', ''),
+                    'created_by': event.get('broadcaster_user_id', ''),
+                    'title': event.get('title', ''),
+                    # only poll.end notifications have a status
+                    'status': event.get('status', 'active').upper(),
+                    'started_at': event.get('started_at', ''),
+                    'ended_at': event.get('ended_at') or event.get('ends_at', ''),
+                    'choices': choices,
+                    'votes': {'total': sum(choice['votes']['total'] for choice in choices)},
+                },
+            },
+        }
+
+    return adapter
+
+
+def _moderation_action(event: dict) -> Tuple[str, dict]:
+    action = event.get('action', '')
+    # the action's details are under the action's name, ex: {'action': 'ban', 'ban': {'user_login': ..., 'reason': ...}}
+    details = event.get(action) or {}
+    args = [arg for arg in (details.get('user_login', ''), details.get('reason', '')) if arg]
+    return PubSubTopics.moderation_actions, {
+        'type': 'moderation_action',
+        'data': {
+            'type': 'chat_login_moderation',
+            'moderation_action': action,
+            'args': args,
+            'created_by': event.get('moderator_user_login', ''),
+            'created_by_user_id': event.get('moderator_user_id', ''),
+            'msg_id': details.get('message_id', ''),
+            'target_user_id': details.get('user_id', ''),
+            'target_user_login': details.get('user_login', ''),
+            'from_automod': False,
+        },
+    }
+
+
+# subscription type => function returning the pubsub topic prefix and message for the notification's event
+_ADAPTERS: Dict[str, Callable[[dict], Tuple[str, dict]]] = {
+    EventSubSubscriptionTypes.channel_points_redemption: _channel_point_redemption,
+    EventSubSubscriptionTypes.bits: _bits,
+    EventSubSubscriptionTypes.channel_subscriptions: _subscription,
+    EventSubSubscriptionTypes.follows: _follow,
+    EventSubSubscriptionTypes.poll_begin: _poll('POLL_CREATE'),
+    EventSubSubscriptionTypes.poll_progress: _poll('POLL_UPDATE'),
+    EventSubSubscriptionTypes.poll_end: _poll('POLL_COMPLETE'),
+    EventSubSubscriptionTypes.moderation_actions: _moderation_action,
+}
+
+
+def eventsub_notification_to_pubsub_data(notification: dict) -> Optional[EventSubData]:
+    """returns the EventSub notification as a EventSubData, or None if there is no adapter for its subscription type"""
+    subscription_type = notification.get('metadata', {}).get('subscription_type', '')
+    adapter = _ADAPTERS.get(subscription_type)
+    if adapter is None:
+        return None
+
+    event = notification.get('payload', {}).get('event', {})
+    topic_prefix, message = adapter(event)
+    raw_data = {
+        'type': PubSubData.MESSAGE_TYPE,
+        'data': {
+            'topic': f'{topic_prefix}{event.get("broadcaster_user_id", "")}',
+            'message': message,
+        },
+    }
+    return EventSubData(raw_data, notification)
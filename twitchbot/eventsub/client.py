@@ -0,0 +1,303 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import websockets
+
+from ..enums import Event
+from ..event_util import forward_event
+from ..exceptions import TwitchAPICircuitOpenError
+from ..pubsub import PubSubPointRedemption, PubSubBits, PubSubSubscription, PubSubModerationAction, PubSubPollData, PubSubFollow
+from .adapters import EventSubData, eventsub_notification_to_pubsub_data
+from .subscription_types import EventSubSubscriptionTypes
+
+__all__ = [
+    'EventSubClient',
+    'EventSubSubscription',
+]
+
+
+class EventSubSubscription(NamedTuple):
+    type: str
+    version: str
+    condition: dict
+    # set once twitch accepted the subscription for the current session
+    id: str = ''
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.type, self.version, json.dumps(self.condition, sort_keys=True)
+
+
+class EventSubClient:
+    """
+    receives twitch events over a EventSub websocket, notifications are forwarded as the same `on_pubsub_*` events
+    (with the same models) as the PubSubClient's, see EventSubData
+
+    - keepalive: twitch sends a message at least every `keepalive_timeout_seconds` (from the session's welcome),
+      if nothing arrives for that long (plus KEEPALIVE_GRACE_SECONDS) the connection is treated as dead,
+      a new session is opened and all subscriptions are created again for it
+    - session_reconnect: a new connection is opened to the given reconnect url, once it is welcomed the old connection is closed,
+      the subscriptions move to the new session with it so they are not created again
+    - revocation: the subscription is forgotten, so it is not created again when reconnecting
+    """
+
+    TASK_NAME = 'eventsub_client_processor'
+    EVENTSUB_WEBSOCKET_URL = 'wss://eventsub.wss.twitch.tv/ws'
+    SUBSCRIPTIONS_API_URL = 'https://api.twitch.tv/helix/eventsub/subscriptions'
+    # how long to wait for the session_welcome message after connecting
+    WELCOME_TIMEOUT = 10
+    DEFAULT_KEEPALIVE_TIMEOUT = 10
+    KEEPALIVE_GRACE_SECONDS = 5
+    # twitch can send a message more than once, the ids of this many recent messages are kept to ignore duplicates
+    RECENT_MESSAGE_IDS_SIZE = 1000
+    MAX_RECONNECT_BACKOFF = 60
+
+    def __init__(self, headers: dict = None):
+        # headers for the subscriptions api, defaults to get_headers(), needs a user access token
+        self.headers: Optional[dict] = headers
+        self.socket: Optional['websockets.client.WebSocketClientProtocol'] = None
+        self.session_id: str = ''
+        self.keepalive_timeout: float = self.DEFAULT_KEEPALIVE_TIMEOUT
+        self.reconnects = 0
+        # EventSubSubscription.key => subscription
+        self.subscriptions: Dict[Tuple[str, str, str], EventSubSubscription] = {}
+        self._recent_message_ids: 'OrderedDict[str, None]' = OrderedDict()
+        self._connect_lock: Optional[asyncio.Lock] = None
+        # subscription type => event and model the notification is forwarded with
+        self._notification_events = {
+            EventSubSubscriptionTypes.channel_points_redemption: (Event.on_pubsub_custom_channel_point_reward, PubSubPointRedemption),
+            EventSubSubscriptionTypes.bits: (Event.on_pubsub_bits, PubSubBits),
+            EventSubSubscriptionTypes.channel_subscriptions: (Event.on_pubsub_subscription, PubSubSubscription),
+            EventSubSubscriptionTypes.follows: (Event.on_pubsub_user_follow, PubSubFollow),
+            EventSubSubscriptionTypes.poll_begin: (Event.on_pubsub_twitch_poll_update, PubSubPollData),
+            EventSubSubscriptionTypes.poll_progress: (Event.on_pubsub_twitch_poll_update, PubSubPollData),
+            EventSubSubscriptionTypes.poll_end: (Event.on_pubsub_twitch_poll_update, PubSubPollData),
+            EventSubSubscriptionTypes.moderation_actions: (Event.on_pubsub_moderation_action, PubSubModerationAction),
+        }
+
+    @property
+    def connected(self) -> bool:
+        return self.socket is not None and bool(self.session_id)
+
+    def _get_headers(self) -> dict:
+        from ..util import get_headers
+        headers = (self.headers or get_headers()).copy()
+        headers['Content-Type'] = 'application/json'
+        return headers
+
+    async def connect(self):
+        """opens a session (and starts the processor task) if there is none, concurrent callers share one connection attempt"""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self.socket is None:
+                self.socket, self.session_id, self.keepalive_timeout = await self._open_session(self.EVENTSUB_WEBSOCKET_URL)
+                self.start_loop()
+
+    async def _open_session(self, url: str) -> Tuple['websockets.client.WebSocketClientProtocol', str, float]:
+        """connects to the url and waits for its session_welcome, returns the socket, session id and keepalive timeout"""
+        socket = await websockets.connect(url)
+        try:
+            message = json.loads(await asyncio.wait_for(socket.recv(), self.WELCOME_TIMEOUT))
+            if message.get('metadata', {}).get('message_type') != 'session_welcome':
+                raise ValueError(f'expected a session_welcome message, got: {message}')
+        except BaseException:
+            await socket.close()
+            raise
+
+        session = message.get('payload', {}).get('session', {})
+        return socket, session.get('id', ''), session.get('keepalive_timeout_seconds') or self.DEFAULT_KEEPALIVE_TIMEOUT
+
+    async def subscribe(self, type: str, condition: dict, version: str = None) -> bool:
+        """
+        subscribes to the EventSub subscription type (see EventSubSubscriptionTypes) for the condition,
+        returns if twitch accepted the subscription, the subscription is created again for new sessions after reconnecting
+        :param version: defaults to the version the adapters are written for
+        """
+        version = version or EventSubSubscriptionTypes.VERSIONS.get(type, '1')
+        subscription = EventSubSubscription(type=type, version=version, condition=condition)
+        self.subscriptions[subscription.key] = subscription
+
+        await self.connect()
+        return await self._create_subscription(subscription)
+
+    async def subscribe_to_channel(self, channel_name: str, types: Iterable[str]) -> bool:
+        """subscribes to all the subscription types for the channel, returns if twitch accepted all of them"""
+        from ..config import get_nick
+        from ..util import get_user_id
+
+        broadcaster_id = str(await get_user_id(channel_name))
+        if broadcaster_id == '-1':
+            logging.warning(f'[EVENTSUB_CLIENT] unable to get user id in eventsub client for channel "{channel_name}"')
+            return False
+
+        conditions = []
+        for type in types:
+            condition = {'broadcaster_user_id': broadcaster_id}
+            if type in (EventSubSubscriptionTypes.follows, EventSubSubscriptionTypes.moderation_actions):
+                condition['moderator_user_id'] = str(await get_user_id(get_nick()))
+            conditions.append((type, condition))
+
+        return all(await asyncio.gather(*(self.subscribe(type, condition) for type, condition in conditions)))
+
+    async def unsubscribe(self, type: str, condition: dict, version: str = None) -> bool:
+        """deletes the subscription, returns if twitch deleted it"""
+        from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
+
+        version = version or EventSubSubscriptionTypes.VERSIONS.get(type, '1')
+        subscription = self.subscriptions.pop(EventSubSubscription(type=type, version=version, condition=condition).key, None)
+        if subscription is None or not subscription.id:
+            return False
+
+        try:
+            resp, _ = await enqueue_twitch_api_request(f'{self.SUBSCRIPTIONS_API_URL}?id={subscription.id}',
+                                                       headers=self._get_headers(), mode=PendingTwitchAPIRequestMode.DELETE)
+        except TwitchAPICircuitOpenError as e:
+            logging.warning(f'[EVENTSUB_CLIENT] failed to unsubscribe from {type} for {condition}: {e}')
+            return False
+        return resp is not None and resp.status == 204
+
+    async def _create_subscription(self, subscription: EventSubSubscription) -> bool:
+        from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
+
+        body = json.dumps({
+            'type': subscription.type,
+            'version': subscription.version,
+            'condition': subscription.condition,
+            'transport': {'method': 'websocket', 'session_id': self.session_id},
+        })
+        try:
+            resp, data = await enqueue_twitch_api_request(self.SUBSCRIPTIONS_API_URL, headers=self._get_headers(),
+                                                          mode=PendingTwitchAPIRequestMode.POST, body=body)
+        except TwitchAPICircuitOpenError as e:
+            logging.warning(f'[EVENTSUB_CLIENT] failed to subscribe to {subscription.type} for {subscription.condition}: {e}')
+            return False
+
+        if resp is None or resp.status != 202:
+            logging.warning(f'[EVENTSUB_CLIENT] failed to subscribe to {subscription.type} for {subscription.condition} '
+                            f'({resp.status if resp is not None else "no response"}): {(data or {}).get("message", "")}')
+            return False
+
+        created = (data.get('data') or [{}])[0]
+        if subscription.key in self.subscriptions:
+            self.subscriptions[subscription.key] = subscription._replace(id=created.get('id', ''))
+        return True
+
+    async def _resubscribe(self):
+        """creates all the subscriptions again, subscriptions belong to a session, so they are lost when a new session is opened"""
+        subscriptions = [subscription._replace(id='') for subscription in self.subscriptions.values()]
+        self.subscriptions = {subscription.key: subscription for subscription in subscriptions}
+        await asyncio.gather(*(self._create_subscription(subscription) for subscription in subscriptions))
+
+    def start_loop(self):
+        from ..util import add_task, task_exist
+        if not task_exist(self.TASK_NAME):
+            add_task(self.TASK_NAME, self._processor_loop())
+
+    async def _processor_loop(self):
+        while True:
+            try:
+                raw = await asyncio.wait_for(self.socket.recv(), self.keepalive_timeout + self.KEEPALIVE_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                logging.warning(f'[EVENTSUB_CLIENT] no message received within the keepalive timeout '
+                                f'({self.keepalive_timeout} seconds), reconnecting...')
+                await self._reconnect_loop()
+                continue
+            except websockets.exceptions.ConnectionClosed:
+                await self._reconnect_loop()
+                continue
+
+            try:
+                await self._handle(raw)
+            except Exception as e:
+                # one bad notification (or a failing event handler) must not stop the client from reading the next ones
+                logging.exception(f'[EVENTSUB_CLIENT] failed to handle message {raw!r}: {e}')
+
+    async def _reconnect_loop(self):
+        old_socket, self.session_id = self.socket, ''
+        if old_socket is not None:
+            await old_socket.close()
+
+        backoff = 1
+        while True:
+            logging.warning('[EVENTSUB_CLIENT] attempting reconnect...')
+            try:
+                self.socket, self.session_id, self.keepalive_timeout = await self._open_session(self.EVENTSUB_WEBSOCKET_URL)
+                break
+            except (ValueError, OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+                logging.warning(f'[EVENTSUB_CLIENT] reconnect failed, retrying in {backoff}')
+                await asyncio.sleep(backoff)
+                backoff = min(backoff << 1, self.MAX_RECONNECT_BACKOFF)
+
+        self.reconnects += 1
+        await self._resubscribe()
+
+    async def _migrate(self, reconnect_url: str):
+        """moves to the session at reconnect_url, keeping the current connection until the new one is welcomed"""
+        try:
+            socket, session_id, keepalive_timeout = await self._open_session(reconnect_url)
+        except (ValueError, OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+            logging.warning('[EVENTSUB_CLIENT] failed to connect to the reconnect url, opening a new session instead...')
+            await self._reconnect_loop()
+            return
+
+        old_socket = self.socket
+        self.socket, self.session_id, self.keepalive_timeout = socket, session_id, keepalive_timeout
+        self.reconnects += 1
+        await old_socket.close()
+
+    def _is_duplicate(self, message_id: str) -> bool:
+        if not message_id:
+            return False
+
+        if message_id in self._recent_message_ids:
+            return True
+
+        self._recent_message_ids[message_id] = None
+        if len(self._recent_message_ids) > self.RECENT_MESSAGE_IDS_SIZE:
+            self._recent_message_ids.popitem(last=False)
+        return False
+
+    async def _handle(self, raw: str):
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError:
+            logging.warning(f'[EVENTSUB_CLIENT] received invalid json: {raw!r}')
+            return
+
+        metadata = message.get('metadata', {})
+        if self._is_duplicate(metadata.get('message_id', '')):
+            return
+
+        message_type = metadata.get('message_type', '')
+        payload = message.get('payload', {})
+        if message_type == 'notification':
+            self._trigger_events(message)
+        elif message_type == 'session_reconnect':
+            await self._migrate(payload.get('session', {}).get('reconnect_url', '') or self.EVENTSUB_WEBSOCKET_URL)
+        elif message_type == 'revocation':
+            self._forget_subscription(payload.get('subscription', {}))
+
+    def _forget_subscription(self, revoked: dict):
+        for key, subscription in list(self.subscriptions.items()):
+            if subscription.id and subscription.id == revoked.get('id'):
+                del self.subscriptions[key]
+
+        logging.warning(f'[EVENTSUB_CLIENT] twitch revoked the {revoked.get("type")} subscription '
+                        f'for {revoked.get("condition")}: {revoked.get("status")}')
+
+    def _trigger_events(self, notification: dict):
+        data: Optional[EventSubData] = eventsub_notification_to_pubsub_data(notification)
+        if data is None:
+            return
+
+        forward_event(Event.on_pubsub_received, data)
+        event, model = self._notification_events[data.subscription_type]
+        forward_event(event, data, model(data))
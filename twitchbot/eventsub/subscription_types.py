@@ -0,0 +1,26 @@
+__all__ = [
+    'EventSubSubscriptionTypes',
+]
+
+
+class EventSubSubscriptionTypes:
+    channel_points_redemption = 'channel.channel_points_custom_reward_redemption.add'
+    bits = 'channel.cheer'
+    channel_subscriptions = 'channel.subscribe'
+    follows = 'channel.follow'
+    poll_begin = 'channel.poll.begin'
+    poll_progress = 'channel.poll.progress'
+    poll_end = 'channel.poll.end'
+    moderation_actions = 'channel.moderate'
+
+    # subscription type => the version the adapters are written for
+    VERSIONS = {
+        channel_points_redemption: '1',
+        bits: '1',
+        channel_subscriptions: '1',
+        follows: '2',
+        poll_begin: '1',
+        poll_progress: '1',
+        poll_end: '1',
+        moderation_actions: '2',
+    }
@@ -8,6 +8,7 @@ __all__ = [
     'BotNotRunningError',
     'InvalidArgumentsError',
     'BadTwitchAPIResponse',
+    'TwitchAPICircuitOpenError',
 ]
 
 
@@ -32,3 +33,12 @@ class InvalidArgumentsError(Exception):
 class BadTwitchAPIResponse(Exception):
     def __init__(self, endpoint, message):
         super().__init__(translate('bad_twitch_api_response', message=message, endpoint=endpoint))
+
+
+class TwitchAPICircuitOpenError(Exception):
+    """raised instead of sending a twitch api request while the circuit breaker for its endpoint is open"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f'circuit breaker for twitch api endpoint "{endpoint}" is open, retry in {retry_after:.1f} seconds')
+        self.endpoint: str = endpoint
+        self.retry_after: float = retry_after
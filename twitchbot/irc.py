@@ -66,6 +66,7 @@ class Irc:
         backoff = 1
 
         try:
+            # uses the cached validation result if the token was validated recently, so reconnects do not validate it again
             _check_token(await get_oauth_token_info(get_oauth(remove_prefix=True)))
         except Exception as e:
             print(f'failed to validate oauth token: {e}')
@@ -8,7 +8,7 @@ from importlib import import_module
 from inspect import isclass, getfile, getmodulename
 from pathlib import Path
 from traceback import print_exc
-from typing import Dict, Callable, Any, Optional
+from typing import Dict, Callable, Any, Optional, FrozenSet
 
 if typing.TYPE_CHECKING:
     from .poll import PollData
@@ -173,6 +173,14 @@ class Mod:
         :param channel: the channel that the user left
         """
 
+    async def on_channel_chatters_changed(self, channel: str, added: FrozenSet[str], removed: FrozenSet[str]):
+        """
+        triggered when a channel's chatters are updated from the twitch api and viewers joined or left
+        :param channel: the name of the channel
+        :param added: the viewers that are now in the channel's chatters
+        :param removed: the viewers that are no longer in the channel's chatters
+        """
+
     async def on_channel_subscription(self, subscriber: str, channel: Channel, msg: Message):
         """
         triggered when a user subscribes
@@ -197,6 +205,14 @@ class Mod:
         :param poll: the poll that has ended
         """
 
+    async def on_poll_votes_tallied(self, channel: Channel, poll: 'PollData', new_votes: int):
+        """
+        triggered at most once every POLL_TALLY_INTERVAL_SECONDS while a poll receives votes, with the votes batched together
+        :param channel: channel the poll originated in
+        :param poll: the poll that received the votes
+        :param new_votes: how many votes were received since the last time this was triggered for the poll
+        """
+
     async def on_pubsub_received(self, raw: 'PubSubData'):
         """
         triggered when data is received from the pubsub client
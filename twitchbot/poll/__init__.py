@@ -1 +1,2 @@
 from .polldata import *
+from .vote_ingestion import *
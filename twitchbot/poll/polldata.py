@@ -5,19 +5,32 @@ __all__ = [
     'active_polls',
     'get_active_channel_poll_count',
     'poll_event_processor_loop',
-    'POLL_CHECK_INTERVAL_SECONDS'
+    'POLL_CHECK_INTERVAL_SECONDS',
+    'POLL_TALLY_INTERVAL_SECONDS',
 ]
 
-from asyncio import sleep
+import asyncio
+import time
 from collections import defaultdict, Counter
 from datetime import datetime
+from heapq import heappush, heappop
 from typing import List, DefaultDict, Optional, Tuple, Set, Any, Dict
 
 from ..channel import Channel
 
+# no longer used, polls are ended at their deadline by poll_event_processor_loop(), kept for code that imports it
 POLL_CHECK_INTERVAL_SECONDS = 2
 
+# channel name => the polls that have not ended yet, in the order they were started
 active_polls: DefaultDict[str, List['PollData']] = defaultdict(list)
+# channel name => poll id => poll, index of active_polls for looking up polls by id
+_active_polls_by_id: Dict[str, Dict[int, 'PollData']] = {}
+# (deadline, poll id, poll) of the active polls, the poll that ends first is first
+_poll_deadlines: List[Tuple[float, int, 'PollData']] = []
+# set when a poll is started, so poll_event_processor_loop() wakes up if the new poll ends before the one it is waiting for
+_poll_started: Optional[asyncio.Event] = None
+# votes are batched into one on_poll_votes_tallied event per poll every this many seconds
+POLL_TALLY_INTERVAL_SECONDS = 10
 
 
 class PollData:
@@ -30,9 +43,14 @@ class PollData:
         self.channel: Channel = channel
         self.votes: Counter[int, int] = Counter()
         self.voter_choices: Dict[str, int] = {}
+        # votes received since the last on_poll_votes_tallied event
+        self.untallied_votes = 0
+        self._tally_handle: Optional[asyncio.TimerHandle] = None
         self.owner = owner
         self.title = title
         self.start_time = datetime.now()
+        # time.monotonic() time the poll ends at
+        self.deadline = time.monotonic() + duration_seconds
 
         PollData._last_id += 1
         self.id = PollData._last_id
@@ -43,11 +61,11 @@ class PollData:
 
     @property
     def done(self):
-        return (datetime.now() - self.start_time).total_seconds() > self.duration_seconds
+        return time.monotonic() >= self.deadline
 
     @property
     def seconds_left(self):
-        return max(0, round(self.duration_seconds - (datetime.now() - self.start_time).total_seconds(), 1))
+        return max(0, round(self.deadline - time.monotonic(), 1))
 
     def choice_to_str(self, choice_id: int, default: Any = None):
         if choice_id - 1 >= len(self.choices):
@@ -58,7 +76,7 @@ class PollData:
         return value.lower().strip()
 
     def is_valid_vote(self, choice_id: int) -> bool:
-        return choice_id in self.all_choice_ids
+        return 0 < choice_id <= len(self.choices)
 
     def add_choice(self, choice: str):
         normalized = self._format(choice)
@@ -69,8 +87,15 @@ class PollData:
     def remove_choice(self, choice: str):
         normalized = self._format(choice)
         if normalized in self.choices_normalized:
-            self.choices.remove(choice)
-            self.choices_normalized.remove(normalized)
+            index = self.choices_normalized.index(normalized)
+            del self.choices[index]
+            del self.choices_normalized[index]
+
+            # the choices after the removed one move down one id, so their votes and voters move with them
+            removed_id = index + 1
+            self.votes = Counter({choice_id - (choice_id > removed_id): count for choice_id, count in self.votes.items() if choice_id != removed_id})
+            self.voter_choices = {voter: choice_id - (choice_id > removed_id) for voter, choice_id in self.voter_choices.items()
+                                  if choice_id != removed_id}
 
     def has_already_voted(self, username: str):
         return username.lower().strip() in self.voter_choices
@@ -79,13 +104,35 @@ class PollData:
         if not self.is_valid_vote(choice_id):
             return False
 
-        voter_key = voter.lower().strip()
-        if voter_key in self.voter_choices:
-            self.votes[self.voter_choices[voter_key]] -= 1
+        self.add_normalized_vote(voter.lower().strip(), choice_id)
+        return True
+
+    def add_normalized_vote(self, voter_key: str, choice_id: int):
+        """
+        adds the vote without normalizing the voter or validating the choice id,
+        for callers that already did both (ex: twitch usernames from irc messages are already lowercase)
+        """
+        previous_choice_id = self.voter_choices.get(voter_key)
+        if previous_choice_id == choice_id:
+            return
+
+        if previous_choice_id is not None:
+            self.votes[previous_choice_id] -= 1
 
         self.voter_choices[voter_key] = choice_id
         self.votes[choice_id] += 1
-        return True
+        self.untallied_votes += 1
+        if self._tally_handle is None:
+            self._tally_handle = asyncio.get_event_loop().call_later(POLL_TALLY_INTERVAL_SECONDS, self._tally_votes)
+
+    def _tally_votes(self):
+        self._tally_handle = None
+        if get_channel_poll_by_id(self.channel_name, self.id) is not self:
+            return
+
+        new_votes, self.untallied_votes = self.untallied_votes, 0
+        from ..event_util import forward_event, Event
+        forward_event(Event.on_poll_votes_tallied, self.channel, self, new_votes, channel=self.channel.name)
 
     def format_poll_results(self, reverse: bool = True):
         """
@@ -111,13 +158,20 @@ class PollData:
         return ' '.join(f'{i}) {v}' for i, v in enumerate(self.choices, start=1))
 
     async def end(self):
-        # poll is removed from active poll from the event loop that calls .end()
+        # poll is removed from active poll by the event loop that calls .end()
         # scroll down to poll_event_processor_loop() to see
+        if self._tally_handle is not None:
+            self._tally_handle.cancel()
+            self._tally_handle = None
+
         from ..event_util import forward_event, Event
         forward_event(Event.on_poll_ended, self.channel, self, channel=self.channel.name)
 
     async def start(self):
         active_polls[self.channel_name].append(self)
+        _active_polls_by_id.setdefault(self.channel_name, {})[self.id] = self
+        heappush(_poll_deadlines, (self.deadline, self.id, self))
+        _get_poll_started_event().set()
         from ..event_util import forward_event, Event
         forward_event(Event.on_poll_started, self.channel, self, channel=self.channel.name)
 
@@ -136,28 +190,55 @@ class PollData:
 
 
 def get_channel_poll_by_id(channel: str, id: int) -> Optional[PollData]:
-    return next(filter(lambda x: x.id == id, active_polls[channel]), None)
+    poll = _active_polls_by_id.get(channel, {}).get(id)
+    if poll is not None:
+        return poll
+    # polls added to active_polls directly are not in the index
+    return next((poll for poll in active_polls.get(channel, ()) if poll.id == id), None)
 
 
 def get_active_channel_polls(channel: str) -> Tuple[PollData]:
-    return tuple(poll for poll in active_polls[channel] if not poll.done)
+    return tuple(active_polls.get(channel, ()))
 
 
 def get_active_channel_poll_count(channel: str) -> int:
-    return sum(1 for poll in active_polls[channel] if not poll.done)
+    return len(active_polls.get(channel, ()))
 
 
-async def poll_event_processor_loop():
-    to_remove = []
-    while True:
-        for channel_name, polls in active_polls.items():
-            for poll in polls:
-                if poll.done:
-                    to_remove.append((channel_name, poll))
+def _get_poll_started_event() -> asyncio.Event:
+    global _poll_started
+    if _poll_started is None:
+        _poll_started = asyncio.Event()
+    return _poll_started
+
+
+async def _end_poll(poll: PollData):
+    channel_polls = active_polls.get(poll.channel_name)
+    if channel_polls is None or poll not in channel_polls:
+        return
 
-        for channel_name, poll in to_remove:
-            await poll.end()
-            active_polls[channel_name].remove(poll)
+    channel_polls.remove(poll)
+    if not channel_polls:
+        del active_polls[poll.channel_name]
 
-        to_remove.clear()
-        await sleep(POLL_CHECK_INTERVAL_SECONDS)
+    polls_by_id = _active_polls_by_id.get(poll.channel_name, {})
+    polls_by_id.pop(poll.id, None)
+    if not polls_by_id:
+        _active_polls_by_id.pop(poll.channel_name, None)
+
+    await poll.end()
+
+
+async def poll_event_processor_loop():
+    """ends polls when their deadline is reached, sleeping until the next poll's deadline (or until a poll is started)"""
+    poll_started = _get_poll_started_event()
+    while True:
+        while _poll_deadlines and _poll_deadlines[0][0] <= time.monotonic():
+            await _end_poll(heappop(_poll_deadlines)[2])
+
+        poll_started.clear()
+        timeout = max(0.0, _poll_deadlines[0][0] - time.monotonic()) if _poll_deadlines else None
+        try:
+            await asyncio.wait_for(poll_started.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,95 @@
+from typing import Optional, Tuple
+
+from ..command import commands
+from ..command_whitelist import is_command_whitelisted
+from ..config import cfg
+from ..disabled_commands import is_command_disabled
+from ..message import Message
+from ..permission import perms
+from .polldata import PollData, active_polls, get_channel_poll_by_id
+
+__all__ = [
+    'try_ingest_vote',
+    'VOTE_COMMAND_NAME',
+    'VOTE_PERMISSION',
+    'MAX_BARE_VOTE_LENGTH',
+]
+
+VOTE_COMMAND_NAME = 'vote'
+VOTE_PERMISSION = 'vote'
+# chat messages that are only a number this long (or shorter) are counted as votes if the channel has one active poll
+# and cfg.enable_bare_number_votes is True
+MAX_BARE_VOTE_LENGTH = 3
+
+
+def _parse_int(value: str) -> Optional[int]:
+    return int(value) if value.isdigit() else None
+
+
+def _vote_command_poll_and_choice(msg: Message) -> Optional[Tuple[PollData, int]]:
+    """returns the poll and choice id for a valid `!vote <choice_id> (poll_id)` message, else None"""
+    polls = active_polls[msg.channel_name] if msg.channel_name in active_polls else None
+    if not polls or len(msg.parts) not in (2, 3):
+        return None
+
+    choice_id = _parse_int(msg.parts[1])
+    if len(msg.parts) == 3:
+        poll_id = _parse_int(msg.parts[2])
+        poll = get_channel_poll_by_id(msg.channel_name, poll_id) if poll_id is not None else None
+    else:
+        poll = polls[0] if len(polls) == 1 else None
+
+    if poll is None or choice_id is None or not poll.is_valid_vote(choice_id):
+        return None
+
+    return poll, choice_id
+
+
+def _can_use_vote_command(msg: Message, command_name: str) -> bool:
+    cmd = commands.get(command_name)
+    return (cmd is not None
+            and cmd.name == VOTE_COMMAND_NAME
+            and cmd.permission == VOTE_PERMISSION
+            and not is_command_disabled(msg.channel_name, cmd.fullname)
+            and is_command_whitelisted(cmd.name)
+            and perms.has_permission(msg.channel_name, msg.author, VOTE_PERMISSION))
+
+
+def try_ingest_vote(msg: Message) -> bool:
+    """
+    counts the message as a vote if it is one, this is a fast path for votes that skips the command pipeline
+    (on_permission_check events, cooldowns, argument casting, etc), as a channel can receive hundreds of votes per second
+
+    votes are either `<prefix>vote <choice_id> (poll_id)`, or a message that is only a choice id while the channel has one active poll
+    (if cfg.enable_bare_number_votes is True), both need the author to be allowed to use the vote command
+
+    returns True if the message was a vote command that was counted, so it does not need to be handled as a command,
+    bare choice ids are counted but still return False, as they are regular chat messages.
+    vote commands that are not valid (ex: unknown choice id) or need the full pipeline (ex: the `vote` permission is denied)
+    are not counted, so the vote command handles them as usual
+    """
+    if msg.channel_name not in active_polls or not msg.parts:
+        return False
+
+    vote_command_name = f'{cfg.prefix}{VOTE_COMMAND_NAME}'
+    if msg.parts[0].lower() == vote_command_name:
+        poll_and_choice = _vote_command_poll_and_choice(msg)
+        if poll_and_choice is None or not _can_use_vote_command(msg, vote_command_name):
+            return False
+
+        poll, choice_id = poll_and_choice
+        poll.add_normalized_vote(msg.author, choice_id)
+        return True
+
+    content = msg.content.strip()
+    if not cfg.enable_bare_number_votes or len(msg.parts) != 1 or len(content) > MAX_BARE_VOTE_LENGTH:
+        return False
+
+    polls = active_polls[msg.channel_name]
+    choice_id = _parse_int(content)
+    if len(polls) == 1 and choice_id is not None:
+        poll = polls[0]
+        if poll.is_valid_vote(choice_id) and _can_use_vote_command(msg, vote_command_name):
+            poll.add_normalized_vote(msg.author, choice_id)
+
+    return False
@@ -1,4 +1,5 @@
 from .client import *
+from .connection import *
 from .models import *
 from .topics import *
 from .point_redemption_model import PubSubPointRedemption
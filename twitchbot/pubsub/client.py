@@ -1,40 +1,68 @@
 import asyncio
 import json
 import logging
-import time
-from asyncio import sleep
-from typing import Optional, Iterable
+from typing import Optional, Iterable, Dict, Callable, List
 
 import websockets
 
 from ..enums import Event
+from ..event_util import forward_event
 
 __all__ = [
     'PubSubClient',
 ]
 
 from .models import PubSubData
+from .connection import PubSubConnection, PubSubConnectionMetrics
+from .topics import PubSubTopics
+from .point_redemption_model import PubSubPointRedemption
+from .bits_model import PubSubBits
+from .subscription_model import PubSubSubscription
+from .pubsub_moderation_action import PubSubModerationAction
+from .pubsub_poll_update import PubSubPollData
+from .pubsub_follow import PubSubFollow
 
 
 class PubSubClient:
     TASK_NAME = 'pubsub_client_processor'
     PUBSUB_WEBSOCKET_URL = 'wss://pubsub-edge.twitch.tv'
-    NONCE_REQUEST_VALUE = 'NONCE'
+    NONCE_REQUEST_VALUE = 'nonce'
     LISTEN_REQUEST_KEY = 'LISTEN'
     PING_SEND_INTERVAL = 60 * 4.6
     RECONNECT_PONG_TIMEOUT = 10
+    # twitch allows each connection to listen to at most 50 topics
+    MAX_TOPICS_PER_CONNECTION = 50
+    # each connection's pings are sent this many seconds before the previous connection's pings
+    PING_STAGGER_SECONDS = 15
+    # how long to wait for twitch's RESPONSE to a LISTEN request, and how many times a failed LISTEN request is sent
+    LISTEN_RESPONSE_TIMEOUT = 10
+    MAX_LISTEN_ATTEMPTS = 3
 
     def __init__(self):
-        self.socket: Optional[websockets.client.WebSocketClientProtocol] = None
+        self.connections: List[PubSubConnection] = []
         self.listen_count = 0
-        self._last_ping_sent_time = time.time()
-        self._waiting_for_pong = False
-        self._pong_received = False
-        self._previously_sent_listen_data = set()
+        # topic => the connection it is listened to on
+        self._topic_connections: Dict[str, PubSubConnection] = {}
+        # topic prefix (see PubSubTopics) => handler that forwards the topic's pubsub event,
+        # models passed to events only wrap the data, so its message is decoded once and only when it is accessed
+        self._topic_handlers: Dict[str, Callable[[PubSubData], None]] = {
+            PubSubTopics.channel_points: self._handle_channel_point_redemption,
+            PubSubTopics.community_channel_points: self._handle_channel_point_redemption,
+            PubSubTopics.bits: self._handle_bits,
+            PubSubTopics.channel_subscriptions: self._handle_subscription,
+            PubSubTopics.moderation_actions: self._handle_moderation_action,
+            PubSubTopics.twitch_poll_updates: self._handle_twitch_poll_update,
+            PubSubTopics.follows: self._handle_user_follow,
+        }
 
     @property
     def connected(self):
-        return self.socket and self.socket.open
+        return any(connection.connected for connection in self.connections)
+
+    @property
+    def socket(self) -> Optional['websockets.client.WebSocketClientProtocol']:
+        """the socket of the first connection in the pool"""
+        return self.connections[0].socket if self.connections else None
 
     def create_listen_request_data(self, nonce: str = None, topics=(), access_token: str = '') -> str:
         """
@@ -61,66 +89,88 @@ class PubSubClient:
 
         return json.dumps(data)
 
-    def _mark_pong_received(self):
-        self._pong_received = True
-        self._waiting_for_pong = False
+    def _least_loaded_connection(self) -> PubSubConnection:
+        """returns the connection with the fewest topics that still has room for one, opening a new connection if none has room"""
+        candidates = [connection for connection in self.connections if connection.has_room]
+        if candidates:
+            return min(candidates, key=lambda connection: connection.topic_count)
 
-    def _mark_ping_sent(self):
-        self._pong_received = False
-        self._waiting_for_pong = True
-        self._last_ping_sent_time = time.time()
-
-    def _check_needs_reconnect(self):
-        return not self.connected or (
-                self._waiting_for_pong
-                and not self._pong_received
-                and self.last_ping_time_diff > self.RECONNECT_PONG_TIMEOUT
-        )
+        index = len(self.connections)
+        connection = PubSubConnection(self, index, ping_offset=(index * self.PING_STAGGER_SECONDS) % self.PING_SEND_INTERVAL)
+        self.connections.append(connection)
+        return connection
 
     async def listen_to_channel(self, channel_name: str, topics: Iterable[str], access_token: str = '', nonce=None) -> bool:
-        if not self.connected:
-            self.start_loop()
-            await self._connect()
-
-        from ..util import get_user_id
+        """
+        listens to the topics for the channel, see `listen_to_channels`
+        :param nonce: optional prefix for the nonces of the LISTEN requests
+        """
+        return await self.listen_to_channels((channel_name,), topics, access_token=access_token, nonce=nonce)
 
-        if not self.socket or not self.socket.open:
-            await self._connect()
-            await sleep(.5)
+    async def listen_to_channels(self, channel_names: Iterable[str], topics: Iterable[str], access_token: str = '', nonce=None) -> bool:
+        """
+        listens to the topics for all the channels, returns if twitch acknowledged all of them
 
-        await sleep(.5)  # small thing to rate limit to a degree
+        topics are spread across the pool's connections (each assigned to the least loaded one), opening new connections when all of them are full,
+        each connection gets one LISTEN request with all of its new topics, and the requests are all sent at once
+        :param nonce: optional prefix for the nonces of the LISTEN requests
+        """
+        from ..util import get_user_ids
 
-        user_id = await get_user_id(channel_name)
-        if user_id == -1:
-            logging.warning(f'[PUBSUB-CLIENT] unable to get user id in pubsub client for channel "{channel_name}"')
-            return False
+        topics = list(topics)
+        user_ids = await get_user_ids(channel_names)
+        for channel_name, user_id in user_ids.items():
+            if user_id == -1:
+                logging.warning(f'[PUBSUB-CLIENT] unable to get user id in pubsub client for channel "{channel_name}"')
 
-        topics = [f'{topic}{user_id}' for topic in topics]
+        topics = [f'{topic}{user_id}' for user_id in user_ids.values() if user_id != -1 for topic in topics]
         if not topics:
             return False
 
-        listen_data = self.create_listen_request_data(topics=topics, access_token=access_token, nonce=nonce or channel_name).strip()
-        if listen_data not in self._previously_sent_listen_data:
-            self._previously_sent_listen_data.add(listen_data)
+        # connection => the new topics assigned to it
+        assigned: Dict[PubSubConnection, List[str]] = {}
+        for topic in topics:
+            if topic in self._topic_connections:
+                continue
 
-        await self.socket.send(listen_data)
-        return True
+            connection = self._least_loaded_connection()
+            connection.topics.add(topic)
+            self._topic_connections[topic] = connection
+            assigned.setdefault(connection, []).append(topic)
 
-    @property
-    def last_ping_time_diff(self):
-        return abs(time.time() - self._last_ping_sent_time)
+        results = await asyncio.gather(*(
+            connection.listen(connection_topics, access_token=access_token, nonce_prefix=f'{nonce}-' if nonce else '')
+            for connection, connection_topics in assigned.items()
+        ))
 
-    @property
-    def last_ping_time_diff_minutes(self):
-        return abs(time.time() - self._last_ping_sent_time) / 60
+        return all(results) and len(user_ids) == sum(user_id != -1 for user_id in user_ids.values())
+
+    def _forget_topics(self, connection: PubSubConnection, topics: Iterable[str], access_token: str = ''):
+        """removes topics twitch refused to listen to, so they do not take up room on the connection or get replayed"""
+        topics = list(topics)
+        for topic in topics:
+            if self._topic_connections.get(topic) is connection:
+                del self._topic_connections[topic]
+
+        connection.forget_topics(topics, access_token)
+
+    def start_loop(self):
+        for connection in self.connections:
+            connection.start_loop()
+
+    # the methods below are kept for code written before the connection pool, they use the first connection of the pool
 
-    async def _send_ping(self):
-        await self.socket.send(json.dumps({'type': 'PING'}))
-        self._mark_ping_sent()
+    def _first_connection(self) -> PubSubConnection:
+        return self.connections[0] if self.connections else self._least_loaded_connection()
 
     async def read(self, timeout: float = 10) -> Optional[str]:
+        """
+        reads the next message of the first connection, returns None if none arrived within timeout seconds
+
+        the connection's processor task also reads from the socket, so this should only be used before start_loop() was called
+        """
         try:
-            data = await asyncio.wait_for(self.socket.recv(), timeout=timeout)
+            data = await asyncio.wait_for(self._first_connection().socket.recv(), timeout=timeout)
         except asyncio.TimeoutError:
             return None
 
@@ -129,155 +179,48 @@ class PubSubClient:
         return data
 
     async def _connect(self) -> 'PubSubClient':
-        self.socket = await websockets.connect(self.PUBSUB_WEBSOCKET_URL)
-        self._last_ping_sent_time = time.time()
+        await self._first_connection()._connect()
         return self
 
-    def start_loop(self):
-        from ..util import add_task, task_exist
-        if not task_exist(self.TASK_NAME):
-            add_task(self.TASK_NAME, self._processor_loop())
-
-    async def _reconnect(self, listen_resend_interval=.7, reconnect_interval=5) -> bool:
-        import socket
-        try:
-            await self._connect()
-            # make sure connection is actually open
-            if not self.socket and not self.socket.open:
-                raise ValueError
-
-            # resend pubsub listen request
-            for listen_data in self._previously_sent_listen_data:
-                await self.socket.send(listen_data)
-                await asyncio.sleep(listen_resend_interval)
-
-            # signal reconnect was successful
-            return True
-        except (ValueError, socket.gaierror):
-            await asyncio.sleep(reconnect_interval)
-
-        # signal reconnect was unsuccessful
-        return False
+    async def _reconnect(self, reconnect_interval=5) -> bool:
+        return await self._first_connection()._reconnect(reconnect_interval=reconnect_interval)
 
     async def _processor_loop(self):
-        while True:
-            if self.socket is not None:
-                # keep reconnect logic behind the socket is not None check to be sure we had a previous connection
-                if self._check_needs_reconnect():
-                    await self._reconnect_loop()
-
-                try:
-                    await self._read_and_handle()
-                except (json.JSONDecodeError, TypeError):
-                    pass
-                except websockets.exceptions.ConnectionClosedError:
-                    # allow reconnect logic to try to re-establish a connection
-                    continue
-
-                await self._send_ping_if_needed()
-                if self._check_needs_reconnect():
-                    await self.socket.close()
-            else:
-                await sleep(2)
-
-    async def _reconnect_loop(self):
-        backoff = 1
-        while True:
-            logging.warning(f'[PUBSUB_CLIENT] attempting reconnect...')
-            if await self._reconnect():
-                break
-
-            logging.warning(f'[PUBSUB_CLIENT] reconnect failed, retrying in {backoff}')
-            await asyncio.sleep(backoff)
-            backoff <<= 1
-
-    async def _read_and_handle(self):
-        raw_resp = await self.read(timeout=10)
-        data = PubSubData(json.loads(raw_resp))
-
-        if data.is_pong:
-            self._mark_pong_received()
-
-        await self._trigger_events(data)
+        await self._first_connection()._processor_loop()
+
+    @property
+    def metrics(self) -> Dict[int, PubSubConnectionMetrics]:
+        """connection index => message handling time and PING/PONG latency metrics of the connection"""
+        return {connection.index: connection.metrics for connection in self.connections}
 
     async def _trigger_events(self, data: 'PubSubData'):
-        from ..event_util import forward_event
         forward_event(Event.on_pubsub_received, data)
 
-        # checks for and runs a matching pubsub event
-        (
-                self._check_for_channel_point_redemption(data)
-                or self._check_for_bits(data)
-                or self._check_for_moderation_action(data)
-                or self._check_for_subscription(data)
-                or self._check_for_twitch_poll_update(data)
-                or self._check_for_user_follow(data)
-                or self._noop()
-        )
-
-    def _noop(self, *_):
-        pass
-
-    def _check_for_channel_point_redemption(self, data: 'PubSubData'):
-        from ..event_util import forward_event
-        from .point_redemption_model import PubSubPointRedemption
-
-        if not data.is_channel_points_redeemed:
-            return False
-
-        forward_event(Event.on_pubsub_custom_channel_point_reward, data, PubSubPointRedemption(data))
-        return True
+        if not data.is_message:
+            return
 
-    def _check_for_bits(self, data: 'PubSubData'):
-        from ..event_util import forward_event
-        from .bits_model import PubSubBits
+        # route on the topic, so only the matching event's checks run
+        handler = self._topic_handlers.get(data.topic_prefix)
+        if handler is not None:
+            handler(data)
 
-        if not data.is_bits:
-            return False
+    def _handle_channel_point_redemption(self, data: 'PubSubData'):
+        if data.is_channel_points_redeemed:
+            forward_event(Event.on_pubsub_custom_channel_point_reward, data, PubSubPointRedemption(data))
 
+    def _handle_bits(self, data: 'PubSubData'):
         forward_event(Event.on_pubsub_bits, data, PubSubBits(data))
-        return True
-
-    def _check_for_subscription(self, data: 'PubSubData'):
-        from ..event_util import forward_event
-        from .subscription_model import PubSubSubscription
-
-        if not data.is_subscription:
-            return False
 
+    def _handle_subscription(self, data: 'PubSubData'):
         forward_event(Event.on_pubsub_subscription, data, PubSubSubscription(data))
-        return True
-
-    def _check_for_moderation_action(self, data: 'PubSubData'):
-        from ..event_util import forward_event
-        from .pubsub_moderation_action import PubSubModerationAction
-
-        if not data.is_moderation_action:
-            return False
-
-        forward_event(Event.on_pubsub_moderation_action, data, PubSubModerationAction(data))
-        return True
 
-    def _check_for_twitch_poll_update(self, data: 'PubSubData'):
-        from ..event_util import forward_event
-        from .pubsub_poll_update import PubSubPollData
+    def _handle_moderation_action(self, data: 'PubSubData'):
+        if data.is_moderation_action:
+            forward_event(Event.on_pubsub_moderation_action, data, PubSubModerationAction(data))
 
-        if not data.is_twitch_poll_update:
-            return False
-
-        forward_event(Event.on_pubsub_twitch_poll_update, data, PubSubPollData(data))
-        return True
-
-    def _check_for_user_follow(self, data: 'PubSubData'):
-        from ..event_util import forward_event
-        from .pubsub_follow import PubSubFollow
-
-        if not data.is_user_follow:
-            return False
+    def _handle_twitch_poll_update(self, data: 'PubSubData'):
+        if data.is_twitch_poll_update:
+            forward_event(Event.on_pubsub_twitch_poll_update, data, PubSubPollData(data))
 
+    def _handle_user_follow(self, data: 'PubSubData'):
         forward_event(Event.on_pubsub_user_follow, data, PubSubFollow(data))
-        return True
-
-    async def _send_ping_if_needed(self):
-        if self.last_ping_time_diff >= self.PING_SEND_INTERVAL:
-            await self._send_ping()
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import logging
+import time
+from asyncio import sleep
+from dataclasses import dataclass
+from typing import Optional, Set, TYPE_CHECKING, Dict, Iterable
+from uuid import uuid4
+
+import websockets
+
+from .models import PubSubData
+
+if TYPE_CHECKING:
+    from .client import PubSubClient
+
+__all__ = [
+    'PubSubConnection',
+    'PubSubConnectionMetrics',
+]
+
+
+@dataclass
+class PubSubConnectionMetrics:
+    """
+    metrics of a PubSubConnection, times are in seconds
+
+    handle times measure decoding and dispatching a message after it was read, not the time spent waiting for it (read latency)
+    """
+    messages_received: int = 0
+    # time spent decoding and dispatching messages, the next message is not read until the current one was handled
+    total_handle_time: float = 0.0
+    max_handle_time: float = 0.0
+    # time between sending a PING and receiving its PONG
+    last_pong_latency: float = -1.0
+    total_pong_latency: float = 0.0
+    pongs_received: int = 0
+    pongs_missed: int = 0
+    reconnects: int = 0
+
+    @property
+    def average_handle_time(self) -> float:
+        return self.total_handle_time / self.messages_received if self.messages_received else 0.0
+
+    @property
+    def average_pong_latency(self) -> float:
+        return self.total_pong_latency / self.pongs_received if self.pongs_received else -1.0
+
+    def record_handle_time(self, seconds: float):
+        self.messages_received += 1
+        self.total_handle_time += seconds
+        self.max_handle_time = max(self.max_handle_time, seconds)
+
+    def record_pong_latency(self, seconds: float):
+        self.pongs_received += 1
+        self.last_pong_latency = seconds
+        self.total_pong_latency += seconds
+
+
+class PubSubConnection:
+    """
+    one websocket connection of a PubSubClient's connection pool, twitch allows each connection to listen to 50 topics
+
+    each connection has its own processor task, and replays only its own topics when it reconnects
+
+    the processor task reads messages as they arrive, a separate heartbeat task sends PINGs and closes the connection
+    (so the processor task reconnects) if the PONG does not arrive within RECONNECT_PONG_TIMEOUT seconds
+
+    LISTEN requests are sent without waiting between them, each with a unique nonce, twitch's RESPONSE for the nonce
+    tells if it succeeded, only the requests that failed (or got no response) are sent again
+    """
+
+    # LISTEN errors that can succeed if the request is sent again (ERR_TIMEOUT = no response was received in time)
+    RETRYABLE_LISTEN_ERRORS = frozenset(('ERR_SERVER', 'ERR_TIMEOUT', 'ERR_CONNECTION_CLOSED'))
+
+    def __init__(self, client: 'PubSubClient', index: int, ping_offset: float = 0):
+        self.client: 'PubSubClient' = client
+        self.index: int = index
+        self.socket: Optional[websockets.client.WebSocketClientProtocol] = None
+        # topics assigned to this connection
+        self.topics: Set[str] = set()
+        # pings are sent `ping_offset` seconds earlier than the interval, so the pool's connections do not all ping at once
+        self.ping_offset: float = ping_offset
+        self._last_ping_sent_time = time.time() - ping_offset
+        # set to the PONG's arrival time once it is received
+        self._pong_waiter: Optional[asyncio.Future] = None
+        self.metrics = PubSubConnectionMetrics()
+        # access token => topics listened to with it, replayed when reconnecting
+        self._topics_by_access_token: Dict[str, Set[str]] = {}
+        # nonce of a sent LISTEN request => future set to its RESPONSE's error ('' if it succeeded)
+        self._pending_listen_responses: Dict[str, asyncio.Future] = {}
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def task_name(self) -> str:
+        return f'{self.client.TASK_NAME}_{self.index}'
+
+    @property
+    def heartbeat_task_name(self) -> str:
+        return f'{self.task_name}_heartbeat'
+
+    @property
+    def connected(self):
+        return self.socket and self.socket.open
+
+    @property
+    def topic_count(self) -> int:
+        return len(self.topics)
+
+    @property
+    def has_room(self) -> bool:
+        return self.topic_count < self.client.MAX_TOPICS_PER_CONNECTION
+
+    def _mark_pong_received(self):
+        if self._pong_waiter is not None and not self._pong_waiter.done():
+            self._pong_waiter.set_result(time.time())
+
+    def _mark_ping_sent(self):
+        self._pong_waiter = asyncio.get_event_loop().create_future()
+        self._last_ping_sent_time = time.time()
+
+    async def ensure_connected(self):
+        """
+        connects (and starts the processor task) if this connection was never connected, concurrent callers share one connection attempt,
+        once connected the processor task is responsible for reconnecting
+        """
+        if self.socket is not None:
+            return
+
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self.socket is None:
+                await self._connect()
+                self.start_loop()
+
+    async def listen(self, topics: Iterable[str], access_token: str = '', nonce_prefix: str = '') -> bool:
+        """
+        listens to all the topics with one LISTEN request, retrying it if it fails with a retryable error,
+        returns if twitch acknowledged it without an error
+
+        the topics are remembered so they are listened to again after reconnecting
+        """
+        topics = list(topics)
+        self._topics_by_access_token.setdefault(access_token, set()).update(topics)
+
+        await self.ensure_connected()
+        return await self._listen_with_retries(topics, access_token, nonce_prefix)
+
+    async def _send_listen(self, topics: Iterable[str], access_token: str, nonce: str) -> asyncio.Future:
+        response = asyncio.get_event_loop().create_future()
+        self._pending_listen_responses[nonce] = response
+        await self.socket.send(self.client.create_listen_request_data(nonce=nonce, topics=list(topics), access_token=access_token))
+        return response
+
+    async def _listen_with_retries(self, topics: Iterable[str], access_token: str, nonce_prefix: str = '') -> bool:
+        topics = list(topics)
+        for attempt in range(1, self.client.MAX_LISTEN_ATTEMPTS + 1):
+            nonce = f'{nonce_prefix}{uuid4().hex}'
+            try:
+                error = await asyncio.wait_for(await self._send_listen(topics, access_token, nonce), self.client.LISTEN_RESPONSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                error = 'ERR_TIMEOUT'
+            except (websockets.exceptions.ConnectionClosed, AttributeError):
+                # AttributeError: the socket is None because the connection was never made
+                error = 'ERR_CONNECTION_CLOSED'
+            finally:
+                self._pending_listen_responses.pop(nonce, None)
+
+            if not error:
+                return True
+
+            if error not in self.RETRYABLE_LISTEN_ERRORS:
+                logging.warning(f'[PUBSUB_CLIENT] twitch refused to LISTEN to topics {topics}: {error}')
+                self.client._forget_topics(self, topics, access_token)
+                return False
+
+            if attempt < self.client.MAX_LISTEN_ATTEMPTS:
+                logging.warning(f'[PUBSUB_CLIENT] LISTEN to topics {topics} failed ({error}), retrying...')
+                await asyncio.sleep(attempt)
+
+        logging.warning(f'[PUBSUB_CLIENT] LISTEN to topics {topics} failed {self.client.MAX_LISTEN_ATTEMPTS} times, '
+                        f'they will be sent again if connection {self.index} reconnects')
+        return False
+
+    def forget_topics(self, topics: Iterable[str], access_token: str = ''):
+        self.topics.difference_update(topics)
+        token_topics = self._topics_by_access_token.get(access_token)
+        if token_topics is not None:
+            token_topics.difference_update(topics)
+            if not token_topics:
+                del self._topics_by_access_token[access_token]
+
+    @property
+    def last_ping_time_diff(self):
+        return abs(time.time() - self._last_ping_sent_time)
+
+    async def _send_ping(self):
+        self._mark_ping_sent()
+        await self.socket.send(json.dumps({'type': 'PING'}))
+
+    async def _connect(self) -> 'PubSubConnection':
+        self.socket = await websockets.connect(self.client.PUBSUB_WEBSOCKET_URL)
+        self._last_ping_sent_time = time.time() - self.ping_offset
+        return self
+
+    def start_loop(self):
+        from ..util import add_task, task_exist
+        if not task_exist(self.task_name):
+            add_task(self.task_name, self._processor_loop())
+        if not task_exist(self.heartbeat_task_name):
+            add_task(self.heartbeat_task_name, self._heartbeat_loop())
+
+    async def _reconnect(self, reconnect_interval=5) -> bool:
+        try:
+            await self._connect()
+            # make sure connection is actually open
+            if not self.connected:
+                raise ValueError
+
+            self.metrics.reconnects += 1
+
+            # listen to this connection's topics again, the requests are sent right away and their responses
+            # are read by the processor loop, which is the loop this is called from, so they are not waited on here
+            from ..util import add_nameless_task
+            for access_token, topics in self._topics_by_access_token.items():
+                add_nameless_task(self._listen_with_retries(sorted(topics), access_token))
+
+            # signal reconnect was successful
+            return True
+        except (ValueError, OSError, websockets.exceptions.WebSocketException):
+            await asyncio.sleep(reconnect_interval)
+
+        # signal reconnect was unsuccessful
+        return False
+
+    async def _processor_loop(self):
+        while True:
+            if self.socket is None:
+                await sleep(2)
+                continue
+
+            # keep reconnect logic behind the socket is not None check to be sure we had a previous connection
+            if not self.connected:
+                await self._reconnect_loop()
+
+            try:
+                # ends when the socket is closed (by twitch, the network, or the heartbeat missing a PONG)
+                async for raw in self.socket:
+                    try:
+                        await self._handle(raw)
+                    except Exception as e:
+                        # one bad message (or a failing event handler) must not stop this connection from reading the next ones
+                        logging.exception(f'[PUBSUB_CLIENT] connection {self.index} failed to handle message {raw!r}: {e}')
+            except websockets.exceptions.ConnectionClosed:
+                # allow reconnect logic to try to re-establish a connection
+                pass
+
+    async def _heartbeat_loop(self):
+        while True:
+            next_ping_in = self.client.PING_SEND_INTERVAL - self.last_ping_time_diff
+            if next_ping_in > 0:
+                await sleep(next_ping_in)
+                # the time may have changed while sleeping (ex: the connection reconnected), so check it again
+                continue
+
+            if not self.connected:
+                # the processor task is reconnecting, which resets the ping time
+                await sleep(1)
+                continue
+
+            try:
+                await self._send_ping()
+                pong_received_time = await asyncio.wait_for(asyncio.shield(self._pong_waiter), self.client.RECONNECT_PONG_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.metrics.pongs_missed += 1
+                logging.warning(f'[PUBSUB_CLIENT] connection {self.index} did not receive a PONG within '
+                                f'{self.client.RECONNECT_PONG_TIMEOUT} seconds, reconnecting...')
+                await self.socket.close()
+            except websockets.exceptions.ConnectionClosed:
+                pass
+            else:
+                self.metrics.record_pong_latency(pong_received_time - self._last_ping_sent_time)
+
+    async def _reconnect_loop(self):
+        backoff = 1
+        while True:
+            logging.warning(f'[PUBSUB_CLIENT] connection {self.index} attempting reconnect...')
+            if await self._reconnect():
+                break
+
+            logging.warning(f'[PUBSUB_CLIENT] connection {self.index} reconnect failed, retrying in {backoff}')
+            await asyncio.sleep(backoff)
+            backoff <<= 1
+
+    async def _handle(self, raw: str):
+        start = time.perf_counter()
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+
+        try:
+            data = PubSubData(json.loads(raw))
+        except json.JSONDecodeError:
+            logging.warning(f'[PUBSUB_CLIENT] connection {self.index} received invalid json: {raw!r}')
+            return
+
+        if data.is_pong:
+            self._mark_pong_received()
+        elif data.is_response:
+            response = self._pending_listen_responses.get(data.nonce)
+            if response is not None and not response.done():
+                response.set_result(data.error)
+
+        await self.client._trigger_events(data)
+        self.metrics.record_handle_time(time.perf_counter() - start)
@@ -99,7 +99,7 @@ class PubSubData:
 
     @property
     def is_user_follow(self) -> bool:
-        return 'following.' in dict_get_value(self.raw_data, 'data.topic', default='')
+        return 'following.' in self.topic
 
     @property
     def has_message(self):
@@ -125,8 +125,14 @@ class PubSubData:
     def topic(self) -> str:
         return dict_get_value(self.raw_data, 'data', 'topic', default='')
 
+    @cached_property
+    def topic_prefix(self) -> str:
+        """the topic without the ids it was listened to for, ex: `channel-points-channel-v1.` (same format as PubSubTopics)"""
+        return f'{self.topic.split(".", 1)[0]}.' if self.topic else ''
+
     @cached_property
     def message_dict(self):
+        # the message is a json string inside the json message, it is only decoded the first time it is needed
         return try_parse_json(dict_get_value(self.raw_data, 'data', 'message', default='{}'))
 
     @cached_property
@@ -1,8 +1,7 @@
 from typing import Optional
 
 from .models import PubSubData
-from ..util import dict_get_value, try_parse_json, get_channel_name_from_user_id
-from ..cached_property import cached_property
+from ..util import get_channel_name_from_user_id
 from ..channel import channels, Channel
 
 # example pubsub follow data
@@ -25,14 +24,11 @@ class PubSubFollow:
 
     @property
     def topic(self):
-        return dict_get_value(self.data.raw_data, 'data.topic', default='')
+        return self.data.topic
 
-    @cached_property
+    @property
     def data_message_dict(self):
-        data = self.data.raw_data.get('data', {}).get('message', '')
-        if isinstance(data, str):
-            return try_parse_json(data)
-        return data
+        return self.data.message_dict
 
     @property
     def follower_display_name(self) -> str:
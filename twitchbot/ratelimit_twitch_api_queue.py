@@ -3,12 +3,14 @@ import sys
 import time
 import typing
 import enum
+from itertools import count
 from typing import NamedTuple, Optional, Tuple, Dict, Any, List, Union
 
 from aiohttp import ClientResponse
 
 from .data import RateLimit
-from .util import post_url, get_url, add_task, delete_url
+from .util import post_url, get_url, add_task, delete_url, add_nameless_task, SingleFlight
+from .util.twitch_api_util import _single_flight_key, twitch_api_response_cache
 
 __all__ = [
     'TwitchApiRatelimitQueue',
@@ -18,6 +20,8 @@ __all__ = [
     'twitch_api_queue_send_handler',
     'RATELIMITED_TWITCH_API_QUEUE_SEND_HANDLER_LOOP_TASK_NAME',
     'enqueue_twitch_api_request',
+    'MAX_CONCURRENT_TWITCH_API_REQUESTS',
+    'MAX_TWITCH_API_REQUEST_RATELIMITED_RETRIES',
 ]
 
 if typing.TYPE_CHECKING:
@@ -28,6 +32,13 @@ if sys.version_info >= (3, 10):
 else:
     ApiResponseFuture = asyncio.Future
 
+# how many requests can be waiting on a response from twitch at the same time
+MAX_CONCURRENT_TWITCH_API_REQUESTS = 8
+# how many times a request that got a 429 (Too Many Requests) response is put back in the queue before giving up
+MAX_TWITCH_API_REQUEST_RATELIMITED_RETRIES = 5
+HTTP_TOO_MANY_REQUESTS = 429
+
+
 class PendingTwitchAPIRequestMode(enum.Enum):
     POST = enum.auto()
     GET = enum.auto()
@@ -40,23 +51,42 @@ class _PendingTwitchApiRequest(NamedTuple):
     mode: PendingTwitchAPIRequestMode
     future: asyncio.Future
     body: Optional[Any] = None
+    attempts: int = 0
+    # the order the request was queued in, requests are sent in this order, even when they are requeued
+    seq: int = 0
 
 
 class TwitchApiRatelimitQueue:
     def __init__(self):
-        self.queue: asyncio.Queue[_PendingTwitchApiRequest] = asyncio.Queue()
+        # (seq, request), so a requeued request goes back ahead of the requests queued after it
+        self.queue: asyncio.PriorityQueue[Tuple[int, _PendingTwitchApiRequest]] = asyncio.PriorityQueue()
+        self._seq = count()
         self.requests_left = 0
         self.limit = -1
         self.ratelimit_reset = -1
+        self._ratelimit_updated: Optional[asyncio.Event] = None
 
     async def wait_till_not_ratelimited(self):
+        # sleep until the ratelimit resets (or a response updates it) instead of polling for it
         while self.is_currently_ratelimited:
-            await asyncio.sleep(0.3)
-
-    def update_ratelimit_reset(self, ratelimit: 'RateLimit'):
+            if self._ratelimit_updated is None:
+                self._ratelimit_updated = asyncio.Event()
+            self._ratelimit_updated.clear()
+            try:
+                await asyncio.wait_for(self._ratelimit_updated.wait(), max(0.0, self.ratelimit_reset - time.time()) + 0.05)
+            except asyncio.TimeoutError:
+                pass
+
+    def update_ratelimit_reset(self, ratelimit: 'RateLimit', requests_in_flight: int = 0):
+        """
+        updates the ratelimit info from the latest response,
+        requests_in_flight are subtracted from the remaining requests since twitch has not counted them yet
+        """
         self.ratelimit_reset = ratelimit.reset
-        self.requests_left = ratelimit.remaining
+        self.requests_left = ratelimit.remaining - requests_in_flight
         self.limit = ratelimit.limit
+        if self._ratelimit_updated is not None:
+            self._ratelimit_updated.set()
 
     @property
     def is_currently_ratelimited(self):
@@ -77,21 +107,36 @@ class TwitchApiRatelimitQueue:
             body: Optional[Any] = None
     ) -> ApiResponseFuture:
         fut = asyncio.Future()
-        self.queue.put_nowait(_PendingTwitchApiRequest(url=url, headers=headers, future=fut, mode=mode, body=body))
+        request = _PendingTwitchApiRequest(url=url, headers=headers, future=fut, mode=mode, body=body, seq=next(self._seq))
+        self.queue.put_nowait((request.seq, request))
         return fut
 
+    def requeue(self, request: _PendingTwitchApiRequest):
+        """puts the request back at the head of the queue, ahead of every request queued after it"""
+        self.queue.put_nowait((request.seq, request))
+
+    async def get(self) -> _PendingTwitchApiRequest:
+        """waits for the next request in the queue and returns it"""
+        _, request = await self.queue.get()
+        return request
+
     async def next_request(self) -> Optional[_PendingTwitchApiRequest]:
         if self.queue.empty():
             return None
-        return await self.queue.get()
+        return await self.get()
 
     def __bool__(self):
         return not self.queue.empty()
 
 
 class TwitchApiQueueSendHandler:
-    def __init__(self):
+    def __init__(self, max_concurrent_requests: int = MAX_CONCURRENT_TWITCH_API_REQUESTS):
         self.queue = TwitchApiRatelimitQueue()
+        # identical GET requests that are already queued or in flight are not queued again
+        self.get_single_flight = SingleFlight()
+        self.max_concurrent_requests = max_concurrent_requests
+        self.requests_in_flight = 0
+        self._request_slot_freed: Optional[asyncio.Event] = None
 
     @property
     def has_next_request(self):
@@ -111,37 +156,106 @@ class TwitchApiQueueSendHandler:
             mode: PendingTwitchAPIRequestMode,
             body: Optional[Any] = None
     ) -> ApiResponseFuture:
+        if mode is PendingTwitchAPIRequestMode.GET:
+            key = _single_flight_key('GET', url, headers)
+            # fresh cached responses do not need to wait in the queue or count against the ratelimit
+            cached = twitch_api_response_cache.get_fresh(key, url)
+            if cached is not None:
+                future = asyncio.get_event_loop().create_future()
+                future.set_result(cached)
+                return future
+
+            return self.get_single_flight.do(
+                key,
+                lambda: self.queue.append_url_request(url=url, headers=headers, mode=mode, body=body)
+            )
+
         return self.queue.append_url_request(url=url, headers=headers, mode=mode, body=body)
 
     async def handle_next_request(self):
+        """sends the next queued request (if any) and waits for its response"""
         if not self.has_next_request or self.queue.is_currently_ratelimited:
             return
 
-        ratelimit = None
+        await self._send_request(await self.queue.next_request())
+
+    async def dispatch_next_request(self):
+        """
+        waits for a free request slot, for the ratelimit to allow a request, and for a request to be queued,
+        then sends the request in the background without waiting for its response
+
+        the request is only taken from the queue once it can be sent,
+        so requests requeued meanwhile (ex: after a 429 response) are still sent in the order they were queued in
+        """
+        if self._request_slot_freed is None:
+            self._request_slot_freed = asyncio.Event()
+        while self.requests_in_flight >= self.max_concurrent_requests:
+            self._request_slot_freed.clear()
+            await self._request_slot_freed.wait()
+
+        await self.queue.wait_till_not_ratelimited()
+        request = await self.queue.get()
+
+        # a response received while waiting for a request to be queued can have used up the ratelimit
+        if self.queue.is_currently_ratelimited:
+            self.queue.requeue(request)
+            return
+
+        # count the request against the ratelimit now, so concurrent requests do not overshoot it
+        self.queue.requests_left -= 1
+        self.requests_in_flight += 1
+        add_nameless_task(self._send_request_in_slot(request))
+
+    async def _send_request_in_slot(self, request: _PendingTwitchApiRequest):
+        try:
+            await self._send_request(request)
+        finally:
+            self.requests_in_flight -= 1
+            if self._request_slot_freed is not None:
+                self._request_slot_freed.set()
+
+    async def _send_request(self, request: _PendingTwitchApiRequest):
         resp = None
         json = None
 
-        request = await self.queue.next_request()
-        if request.mode is PendingTwitchAPIRequestMode.POST:
-            resp, json = await post_url(request.url, headers=request.headers, body=request.body)
+        try:
+            if request.mode is PendingTwitchAPIRequestMode.POST:
+                resp, json = await post_url(request.url, headers=request.headers, body=request.body)
+
+            elif request.mode is PendingTwitchAPIRequestMode.GET:
+                resp, json = await get_url(request.url, headers=request.headers)
+
+            elif request.mode is PendingTwitchAPIRequestMode.DELETE:
+                resp, json = await delete_url(request.url, headers=request.headers)
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+            return
+
+        ratelimit = RateLimit.from_headers_or_none(resp.headers) if resp is not None else None
+        if ratelimit is not None:
+            # this request is still counted as in flight while its response is handled
+            self.queue.update_ratelimit_reset(ratelimit, max(0, self.requests_in_flight - 1))
+
+        if (
+                resp is not None
+                and resp.status == HTTP_TOO_MANY_REQUESTS
+                and request.attempts < MAX_TWITCH_API_REQUEST_RATELIMITED_RETRIES
+        ):
+            if ratelimit is None:
+                # no ratelimit headers to tell when it resets, so back off for a second
+                self.queue.update_ratelimit_reset(RateLimit(remaining=0, limit=self.queue.limit, reset=int(time.time()) + 1))
+            self.queue.requeue(request._replace(attempts=request.attempts + 1))
+            return
 
-        elif request.mode is PendingTwitchAPIRequestMode.GET:
-            resp, json = await get_url(request.url, headers=request.headers)
-        
-        elif request.mode is PendingTwitchAPIRequestMode.DELETE:
-            resp, json = await delete_url(request.url, headers=request.headers)
+        if request.future.done():
+            return
 
         if resp is not None and json is not None:
             request.future.set_result((resp, json))
         else:
             request.future.set_result((None, None))
 
-        if resp is not None:
-            ratelimit = RateLimit.from_headers_or_none(resp.headers)
-
-        if ratelimit is not None:
-            self.queue.update_ratelimit_reset(ratelimit)
-
 
 twitch_api_queue_send_handler = TwitchApiQueueSendHandler()
 
@@ -149,17 +263,15 @@ twitch_api_queue_send_handler = TwitchApiQueueSendHandler()
 async def _request_process_loop():
     while True:
         try:
-            await twitch_api_queue_send_handler.handle_next_request()
+            await twitch_api_queue_send_handler.dispatch_next_request()
 
         except asyncio.CancelledError:
-            pass
+            raise
 
         except Exception as _:
             import traceback
             traceback.print_exc()
 
-        await asyncio.sleep(0.1)
-
 
 RATELIMITED_TWITCH_API_QUEUE_SEND_HANDLER_LOOP_TASK_NAME = 'ratelimited_twitch_api_queue_send_handler_loop'
 
@@ -1,13 +1,16 @@
 import asyncio
 import inspect
 from asyncio import Future, TimeoutError
-from typing import List, Callable, Tuple, Awaitable, Union, Any
+from heapq import merge
+from itertools import count
+from typing import List, Callable, Tuple, Awaitable, Union, Any, Dict, Optional, Iterator
 
 from .message import Message
 
 __all__ = [
     'reply_wait_queue',
     'ReplyWaitType',
+    'ReplyWaitQueue',
     'same_author_and_channel_predicate',
     'same_channel_predicate',
     'wait_for_reply',
@@ -18,11 +21,114 @@ __all__ = [
 
 ReplyWaitType = Tuple[Future, Callable[..., Awaitable[bool]]]
 
-# list of futures and coroutines that are waiting for a message reply
-# first item in each tuple must be a Future, this is because it is later given a value if the Awaitable return True
-# second item in each tuple must be a Awaitable that return True or False
-# a True return from the Awaitable means the message was accepted, and the Future has its result set to the message
-reply_wait_queue: List[ReplyWaitType] = []
+# (channel name, author) the waiter's predicate only accepts messages from,
+# (channel name, None) if it only accepts messages from a channel, or None if it can accept any message
+ReplyWaitKey = Optional[Tuple[str, Optional[str]]]
+# attribute of a predicate that holds its ReplyWaitKey, set by the predicate factories in this module
+REPLY_WAIT_KEY_ATTRIBUTE = 'reply_wait_key'
+
+
+def _message_channel_key(msg: Message) -> str:
+    # whispers have no channel, '' keeps them apart from every channel's waiters
+    return msg.channel.name.lower() if msg.channel is not None else ''
+
+
+def _reply_wait_key(msg: Message, same_author: bool, same_channel: bool) -> ReplyWaitKey:
+    if same_channel and same_author:
+        return _message_channel_key(msg), msg.author
+    if same_channel:
+        return _message_channel_key(msg), None
+    return None
+
+
+def _with_reply_wait_key(predicate: Callable, key: ReplyWaitKey):
+    setattr(predicate, REPLY_WAIT_KEY_ATTRIBUTE, key)
+    return predicate
+
+
+class ReplyWaitQueue:
+    """
+    the futures and predicates that are waiting for a message reply, the future is given the message when its predicate returns True
+
+    waiters are indexed by the ReplyWaitKey of their predicate (see REPLY_WAIT_KEY_ATTRIBUTE),
+    so a message is only checked against the predicates that can accept it:
+    the ones for its (channel, author), the ones for its channel, and the ones without a key
+
+    it also supports the list operations used on reply_wait_queue when it was a list,
+    indexing, slicing, del, pop() and remove((future, predicate)), indexes are in the order the waiters were added
+    """
+
+    def __init__(self):
+        # key => future => (order it was added in, predicate), dicts keep insertion order, and removal is O(1)
+        self._waiters: Dict[ReplyWaitKey, Dict[Future, Tuple[int, Callable[..., Awaitable[bool]]]]] = {}
+        self._keys: Dict[Future, ReplyWaitKey] = {}
+        self._order = count()
+
+    def append(self, waiter: ReplyWaitType, key: ReplyWaitKey = None):
+        future, predicate = waiter
+        self._waiters.setdefault(key, {})[future] = next(self._order), predicate
+        self._keys[future] = key
+        # the waiter is removed as soon as its future is done (got a reply, timed out, or was cancelled)
+        future.add_done_callback(self.remove)
+
+    def remove(self, future: Union[Future, ReplyWaitType]) -> bool:
+        """removes the future's waiter (a (future, predicate) waiter can be passed too), returns if it was in the queue"""
+        if isinstance(future, tuple):
+            future = future[0]
+
+        if future not in self._keys:
+            return False
+
+        key = self._keys.pop(future)
+        waiters = self._waiters[key]
+        del waiters[future]
+        if not waiters:
+            del self._waiters[key]
+        return True
+
+    def candidates(self, msg: Message) -> List[ReplyWaitType]:
+        """returns the waiters whose predicate can accept the message, in the order they were added"""
+        channel = _message_channel_key(msg)
+        buckets = [waiters for waiters in (self._waiters.get((channel, msg.author)), self._waiters.get((channel, None)), self._waiters.get(None))
+                   if waiters]
+        if len(buckets) == 1:
+            return [(future, predicate) for future, (_, predicate) in buckets[0].items()]
+
+        ordered = merge(*([(order, future, predicate) for future, (order, predicate) in waiters.items()] for waiters in buckets),
+                        key=lambda waiter: waiter[0])
+        return [(future, predicate) for _, future, predicate in ordered]
+
+    def __iter__(self) -> Iterator[ReplyWaitType]:
+        ordered = sorted((order, future, predicate) for waiters in self._waiters.values() for future, (order, predicate) in waiters.items())
+        return iter([(future, predicate) for _, future, predicate in ordered])
+
+    def pop(self, index: int = -1) -> ReplyWaitType:
+        waiter = self[index]
+        self.remove(waiter)
+        return waiter
+
+    def clear(self):
+        for future in tuple(self._keys):
+            self.remove(future)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[ReplyWaitType, List[ReplyWaitType]]:
+        return list(self)[index]
+
+    def __delitem__(self, index: Union[int, slice]):
+        waiters = self[index]
+        for waiter in (waiters if isinstance(index, slice) else (waiters,)):
+            self.remove(waiter)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, item: Union[Future, ReplyWaitType]):
+        if isinstance(item, tuple):
+            item = item[0]
+        return item in self._keys
+
+
+reply_wait_queue: ReplyWaitQueue = ReplyWaitQueue()
 
 
 def same_author_and_channel_predicate(msg: Message):
@@ -33,7 +139,7 @@ def same_author_and_channel_predicate(msg: Message):
     async def _same_author_predicate(m):
         return m.channel == msg.channel and m.author == msg.author and m.content != msg.content
 
-    return _same_author_predicate
+    return _with_reply_wait_key(_same_author_predicate, _reply_wait_key(msg, same_author=True, same_channel=True))
 
 
 def same_channel_predicate(msg: Message):
@@ -44,7 +150,7 @@ def same_channel_predicate(msg: Message):
     async def _same_channel_predicate(m):
         return m.channel == msg.channel
 
-    return _same_channel_predicate
+    return _with_reply_wait_key(_same_channel_predicate, _reply_wait_key(msg, same_author=False, same_channel=True))
 
 
 def custom_predicate(custom_predicate: Callable[[Message], bool] = None,
@@ -72,7 +178,7 @@ def custom_predicate(custom_predicate: Callable[[Message], bool] = None,
 
         return True
 
-    return _custom_predicate
+    return _with_reply_wait_key(_custom_predicate, _reply_wait_key(msg, same_author, same_channel) if msg else None)
 
 
 def custom_async_predicate(msg: Message, custom_predicate: Callable[[Message], Awaitable[bool]] = None,
@@ -87,7 +193,7 @@ def custom_async_predicate(msg: Message, custom_predicate: Callable[[Message], A
 
         return True
 
-    return _custom_async_predicate
+    return _with_reply_wait_key(_custom_async_predicate, _reply_wait_key(msg, same_author, same_channel) if msg else None)
 
 
 class ReplyResult:
@@ -115,6 +221,11 @@ class ReplyResult:
         return str(self.raw_value)
 
 
+def _time_out_future(future: Future):
+    if not future.done():
+        future.set_exception(TimeoutError())
+
+
 TYPE_CALLABLE_PREDICATE = Union[Callable[['Message'], Awaitable[bool]], Callable[['Message'], bool]]
 
 
@@ -133,18 +244,8 @@ async def wait_for_reply(predicate: TYPE_CALLABLE_PREDICATE = None, timeout=30,
     raise_on_timeout is False by default
     """
 
-    async def _timeout_defaulter():
-        timed_out = False
-        try:
-            value = await asyncio.wait_for(future, timeout)
-        except TimeoutError:
-            timed_out = True
-            if raise_on_timeout:
-                raise
-            else:
-                value = default
-
-        return ReplyResult(value, default=default, timed_out=timed_out)
+    # predicates without a key (ex: user defined ones) are checked against every message
+    key = getattr(predicate, REPLY_WAIT_KEY_ATTRIBUTE, None)
 
     # ensures that the predicate is a coroutine (aka awaitable)
     if not inspect.iscoroutinefunction(predicate):
@@ -154,6 +255,23 @@ async def wait_for_reply(predicate: TYPE_CALLABLE_PREDICATE = None, timeout=30,
 
         predicate = _async_predicate_wrapper
 
-    future = asyncio.get_event_loop().create_future()
-    reply_wait_queue.append((future, predicate))
-    return await _timeout_defaulter()
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+    reply_wait_queue.append((future, predicate), key=key)
+    # the future is timed out by a timer instead of a wait_for() task, so a waiting reply costs nothing until a message or the timeout arrives
+    timeout_handle = loop.call_later(timeout, _time_out_future, future) if timeout is not None else None
+
+    timed_out = False
+    try:
+        value = await future
+    except TimeoutError:
+        timed_out = True
+        if raise_on_timeout:
+            raise
+        else:
+            value = default
+    finally:
+        if timeout_handle is not None:
+            timeout_handle.cancel()
+
+    return ReplyResult(value, default=default, timed_out=timed_out)
@@ -1,4 +1,8 @@
 from .register_util import *
+from .single_flight_util import *
+from .persistent_cache_util import *
+from .response_cache_util import *
+from .circuit_breaker_util import *
 from .twitch_api_util import *
 from .message_util import *
 from .task_util import *
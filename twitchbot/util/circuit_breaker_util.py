@@ -0,0 +1,100 @@
+import random
+import time
+from typing import Callable, NamedTuple, Optional
+
+__all__ = [
+    'CircuitBreaker',
+    'CircuitBreakerState',
+    'RetryPolicy',
+]
+
+
+class CircuitBreakerState:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class RetryPolicy(NamedTuple):
+    """how many times a failed request is attempted, and how long to wait between attempts"""
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 5.0
+
+    def delay(self, attempt: int) -> float:
+        """
+        returns how long to wait before retrying after the given failed attempt (starting at 1),
+        exponential backoff with full jitter, so clients that failed together do not retry together
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    fails fast while a endpoint is unhealthy
+
+    after `failure_threshold` consecutive failures the breaker opens and requests are refused,
+    once `reset_timeout` seconds passed it is half open and lets one request through to probe the endpoint,
+    which closes the breaker if it succeeds, or opens it again if it fails
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30,
+                 on_state_change: Optional[Callable[['CircuitBreaker', str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self.state = CircuitBreakerState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """returns if a request can be sent now, if this returns True the request's result MUST be recorded"""
+        if self.state == CircuitBreakerState.CLOSED:
+            return True
+
+        if self.state == CircuitBreakerState.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._set_state(CircuitBreakerState.HALF_OPEN)
+
+        # half open: only one probe at a time
+        if self._probe_in_flight:
+            return False
+
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != CircuitBreakerState.CLOSED:
+            self._set_state(CircuitBreakerState.CLOSED)
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == CircuitBreakerState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            if self.state != CircuitBreakerState.OPEN:
+                self._set_state(CircuitBreakerState.OPEN)
+
+    def release(self):
+        """call if a allowed request ends without a result (ex: it was cancelled)"""
+        self._probe_in_flight = False
+
+    @property
+    def retry_after(self) -> float:
+        """seconds until a open breaker lets a probe request through"""
+        if self.state != CircuitBreakerState.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def _set_state(self, state: str):
+        old, self.state = self.state, state
+        if self.on_state_change is not None:
+            self.on_state_change(self, old, state)
+
+    def __repr__(self):
+        return f'<CircuitBreaker name={self.name!r} state={self.state} consecutive_failures={self.consecutive_failures}>'
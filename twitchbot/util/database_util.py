@@ -1,10 +1,20 @@
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
 import sqlalchemy.orm
-from sqlalchemy import exists
+from sqlalchemy import exists, inspect
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 
 __all__ = [
-    'query_exists'
+    'query_exists',
+    'insert_or_ignore',
+    'upsert',
 ]
 
+Rows = Union[Dict[str, Any], Sequence[Dict[str, Any]]]
+
+# (table name, unique columns) => if the database has a unique index/constraint covering exactly those columns
+_unique_index_cache: Dict[Tuple[str, Tuple[str, ...]], bool] = {}
+
 
 def query_exists(session: sqlalchemy.orm.scoped_session, *constraints) -> bool:
     if not constraints:
@@ -15,3 +25,109 @@ def query_exists(session: sqlalchemy.orm.scoped_session, *constraints) -> bool:
         query = query.where(constraint)
 
     return session.query(query).scalar()
+
+
+def _as_row_list(rows: Rows) -> List[Dict[str, Any]]:
+    return [rows] if isinstance(rows, dict) else list(rows)
+
+
+def _has_unique_index(session, model, index_elements: Sequence[str]) -> bool:
+    """
+    returns if the model's table has a unique index/constraint on exactly index_elements,
+    without one the database cannot detect conflicts, so the helpers below fall back to check-then-insert
+    """
+    table = model.__table__
+    key = (table.name, tuple(sorted(index_elements)))
+    if key not in _unique_index_cache:
+        inspector = inspect(session.get_bind())
+        unique_column_sets = [inspector.get_pk_constraint(table.name)['constrained_columns']]
+        unique_column_sets.extend(index['column_names'] for index in inspector.get_indexes(table.name) if index['unique'])
+        unique_column_sets.extend(constraint['column_names'] for constraint in inspector.get_unique_constraints(table.name))
+        _unique_index_cache[key] = any(tuple(sorted(columns)) == key[1] for columns in unique_column_sets)
+
+    return _unique_index_cache[key]
+
+
+def _clear_unique_index_cache():
+    _unique_index_cache.clear()
+
+
+def _dialect_insert(session, model):
+    """returns a dialect specific INSERT construct that supports conflict handling, or None if the dialect has none"""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(model)
+    if dialect == 'mysql':
+        return mysql.insert(model)
+    if dialect == 'postgresql':
+        return postgresql.insert(model)
+    return None
+
+
+def _row_filters(model, row: Dict[str, Any], index_elements: Sequence[str]) -> list:
+    return [getattr(model, column) == row[column] for column in index_elements]
+
+
+def insert_or_ignore(session: sqlalchemy.orm.scoped_session, model, rows: Rows, index_elements: Sequence[str]) -> int:
+    """
+    inserts the row(s) in a single statement, skipping any row that conflicts on the unique index_elements
+    (sqlite/postgresql `ON CONFLICT DO NOTHING`, mysql `ON DUPLICATE KEY UPDATE` no-op)
+
+    does NOT commit, returns the number of rows inserted
+    """
+    rows = _as_row_list(rows)
+    if not rows:
+        return 0
+
+    stmt = _dialect_insert(session, model)
+    if stmt is None or not _has_unique_index(session, model, index_elements):
+        inserted = 0
+        for row in rows:
+            if not query_exists(session, *_row_filters(model, row, index_elements)):
+                session.add(model(**row))
+                inserted += 1
+        session.flush()
+        return inserted
+
+    stmt = stmt.values(rows)
+    if session.get_bind().dialect.name == 'mysql':
+        # assigning the primary key to itself turns the duplicate row into a no-op
+        pk = next(iter(model.__table__.primary_key.columns)).name
+        stmt = stmt.on_duplicate_key_update({pk: getattr(model, pk)})
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+    return session.execute(stmt).rowcount
+
+
+def upsert(session: sqlalchemy.orm.scoped_session, model, rows: Rows, index_elements: Sequence[str], update: Dict[str, Any]) -> None:
+    """
+    inserts the row(s) in a single statement, rows that conflict on the unique index_elements
+    have the `update` values applied to the existing row instead
+    (sqlite/postgresql `ON CONFLICT DO UPDATE`, mysql `ON DUPLICATE KEY UPDATE`)
+
+    `update` maps column names to values or expressions, expressions using the model's columns
+    refer to the existing row, ex: {'value': DBCounter.value + 1}
+
+    does NOT commit
+    """
+    rows = _as_row_list(rows)
+    if not rows:
+        return
+
+    stmt = _dialect_insert(session, model)
+    if stmt is None or not _has_unique_index(session, model, index_elements):
+        for row in rows:
+            filters = _row_filters(model, row, index_elements)
+            if not session.query(model).filter(*filters).update(update, synchronize_session=False):
+                session.add(model(**row))
+        session.flush()
+        return
+
+    stmt = stmt.values(rows)
+    if session.get_bind().dialect.name == 'mysql':
+        stmt = stmt.on_duplicate_key_update(update)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=update)
+
+    session.execute(stmt)
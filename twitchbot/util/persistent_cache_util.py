@@ -0,0 +1,259 @@
+import asyncio
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Set, Tuple, Union
+
+__all__ = [
+    'PersistentTTLCache',
+    'flush_persistent_caches',
+]
+
+_MISSING = object()
+# (expires_at, json value) of a entry waiting to be written to disk, None if the entry is waiting to be deleted
+PendingWrite = Optional[Tuple[float, str]]
+# caches that have disk writes waiting for their delayed flush
+_caches_pending_flush: Set['PersistentTTLCache'] = set()
+
+
+class PersistentTTLCache:
+    """
+    a key/value cache with a TTL per entry, stored in a small sqlite file so it survives restarts
+
+    recently used entries are also kept in a LRU bounded memory tier, the sqlite file is only opened on first use,
+    and entries are read from it one key at a time as they are needed
+
+    values must be json serializable
+
+    changes are applied to the memory tier right away, if made from a running event loop,
+    the disk writes are queued and written together in one transaction by a worker thread FLUSH_DELAY_SECONDS later,
+    call flush() to write them right away (ex: before exiting)
+    """
+
+    # changes made while a event loop is running are written to disk together this many seconds after the first one
+    FLUSH_DELAY_SECONDS = 1.0
+
+    def __init__(self, path: Union[str, Path], table: str, ttl: float, max_memory_items: int = 10_000):
+        self.path = Path(path)
+        self.table = table
+        self.ttl = ttl
+        self.max_memory_items = max_memory_items
+        self._memory: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._disk_disabled = False
+        # disk writes that are not written yet (or are being written by a worker thread), by key
+        self._pending: Dict[str, PendingWrite] = {}
+        # set by remove_expired(), entries that expire before this are deleted from disk by the next flush
+        self._pending_expired_before: Optional[float] = None
+        # incremented by each flush, the disk has the changes of `_written_version`
+        self._version = 0
+        self._written_version = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # the connection is shared by the event loop (reads) and the worker threads (writes)
+        self._lock = threading.RLock()
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        with self._lock:
+            if self._connection is None and not self._disk_disabled:
+                try:
+                    self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+                    self._connection.execute(
+                        f'CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+                    self._connection.commit()
+                except sqlite3.Error as e:
+                    self._disable_disk(e)
+
+            return self._connection
+
+    def _disable_disk(self, error: Exception):
+        print(f'[PERSISTENT_CACHE] disabling on-disk cache "{self.path}" ({self.table}), only caching in memory: {error}')
+        self._disk_disabled = True
+        self._connection = None
+        self._pending.clear()
+        self._pending_expired_before = None
+
+    def _remember(self, key: str, expires_at: float, value: Any):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: Hashable, default=None):
+        key = str(key)
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                return entry[1]
+            del self._memory[key]
+
+        # the disk does not have the pending writes yet
+        row = self._pending.get(key, _MISSING)
+        if row is _MISSING:
+            row = self._read_from_disk(key)
+        else:
+            row = row and (row[1], row[0])
+
+        if row is None or row[1] <= now:
+            return default
+
+        value = json.loads(row[0])
+        self._remember(key, row[1], value)
+        return value
+
+    def _read_from_disk(self, key: str) -> Optional[Tuple[str, float]]:
+        db = self._db()
+        if db is None:
+            return None
+
+        try:
+            with self._lock:
+                return db.execute(f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error as e:
+            self._disable_disk(e)
+            return None
+
+    def set(self, key: Hashable, value: Any):
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[Hashable, Any]):
+        """stores all the items, their disk writes are written together in one transaction"""
+        if not items:
+            return
+
+        expires_at = time.time() + self.ttl
+        for key, value in items.items():
+            self._remember(str(key), expires_at, value)
+            if not self._disk_disabled:
+                self._pending[str(key)] = (expires_at, json.dumps(value))
+
+        self._schedule_flush()
+
+    def pop(self, key: Hashable, default=None):
+        value = self.get(key, _MISSING)
+        key = str(key)
+        self._memory.pop(key, None)
+        if not self._disk_disabled:
+            self._pending[key] = None
+            self._schedule_flush()
+
+        return default if value is _MISSING else value
+
+    def remove_expired(self):
+        """removes expired entries from memory, and from disk with the next flush"""
+        now = time.time()
+        for key in [key for key, (expires_at, _) in self._memory.items() if expires_at <= now]:
+            del self._memory[key]
+
+        if not self._disk_disabled:
+            self._pending_expired_before = now
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.FLUSH_DELAY_SECONDS, self._flush_in_background)
+            _caches_pending_flush.add(self)
+
+    def _cancel_pending_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        _caches_pending_flush.discard(self)
+
+    def _snapshot_pending(self) -> Tuple[int, Dict[str, PendingWrite], Optional[float]]:
+        self._version += 1
+        return self._version, dict(self._pending), self._pending_expired_before
+
+    def _forget_written(self, pending: Dict[str, PendingWrite], expired_before: Optional[float]):
+        """removes the written changes from the pending ones, unless they were changed again since"""
+        for key, row in pending.items():
+            if self._pending.get(key, _MISSING) is row:
+                del self._pending[key]
+
+        if self._pending_expired_before == expired_before:
+            self._pending_expired_before = None
+
+    def flush(self):
+        """writes the pending changes to disk now (on the calling thread)"""
+        self._cancel_pending_flush()
+        if not self._pending and self._pending_expired_before is None:
+            return
+
+        snapshot = self._snapshot_pending()
+        self._write(*snapshot)
+        self._forget_written(*snapshot[1:])
+
+    def _flush_in_background(self):
+        self._cancel_pending_flush()
+        # the pending changes are copied on the event loop, as it can change them while the worker thread writes them
+        version, pending, expired_before = self._snapshot_pending()
+        future = asyncio.get_event_loop().run_in_executor(None, self._write, version, pending, expired_before)
+        future.add_done_callback(lambda f: self._on_background_write_done(f, pending, expired_before))
+
+    def _on_background_write_done(self, future: asyncio.Future, pending: Dict[str, PendingWrite], expired_before: Optional[float]):
+        self._forget_written(pending, expired_before)
+        # sqlite errors are handled by _write(), anything else would be lost with the future
+        if not future.cancelled() and future.exception() is not None:
+            print(f'[PERSISTENT_CACHE] unexpected error while writing "{self.path}" ({self.table}): {future.exception()!r}')
+
+    def _write(self, version: int, pending: Dict[str, PendingWrite], expired_before: Optional[float]):
+        with self._lock:
+            # a newer version was already written, it also has all the changes of this one
+            if version <= self._written_version:
+                return
+
+            db = self._db()
+            if db is None:
+                return
+
+            try:
+                if expired_before is not None:
+                    db.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (expired_before,))
+                db.executemany(f'DELETE FROM {self.table} WHERE key = ?', [(key,) for key, row in pending.items() if row is None])
+                db.executemany(f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                               [(key, row[1], row[0]) for key, row in pending.items() if row is not None])
+                db.commit()
+                self._written_version = version
+            except sqlite3.Error as e:
+                self._disable_disk(e)
+
+    def close(self):
+        """writes the pending changes to disk and closes the sqlite file"""
+        self.flush()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __getitem__(self, key: Hashable):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.set(key, value)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key, _MISSING) is not _MISSING
+
+
+def flush_persistent_caches():
+    """writes the pending disk changes of all persistent caches"""
+    for cache in list(_caches_pending_flush):
+        cache.flush()
+
+
+atexit.register(flush_persistent_caches)
@@ -0,0 +1,140 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NamedTuple, Optional, Tuple
+
+__all__ = [
+    'ResponseCache',
+    'CachedResponse',
+]
+
+HTTP_OK = 200
+HTTP_NOT_MODIFIED = 304
+RE_MAX_AGE = re.compile(r'max-age\s*=\s*(\d+)', re.IGNORECASE)
+
+
+class CachedResponse(NamedTuple):
+    """stands in for the ClientResponse of a response served from a ResponseCache"""
+    status: int
+    headers: Any
+    url: str
+
+
+class _Entry(NamedTuple):
+    expires_at: float
+    etag: Optional[str]
+    resp: CachedResponse
+    json: dict
+
+
+class ResponseCache:
+    """
+    a LRU bounded cache of GET responses for endpoints that have a TTL set with set_endpoint_ttl()
+
+    responses are kept for their `Cache-Control: max-age` if they have one (`no-store` responses are not cached),
+    else for their endpoint's TTL. expired responses that had an `ETag` are revalidated with `If-None-Match`,
+    a 304 (Not Modified) response then serves the cached response again without re-downloading it
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.evictions = 0
+        # url without its query string => TTL in seconds
+        self.endpoint_ttls: Dict[str, float] = {}
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+
+    def set_endpoint_ttl(self, url: str, ttl: float):
+        """caches responses from the endpoint (the url's query string is ignored) for ttl seconds"""
+        self.endpoint_ttls[url.split('?', 1)[0]] = ttl
+
+    def endpoint_ttl(self, url: str) -> Optional[float]:
+        """returns the TTL for the url's endpoint, or None if its responses are not cached"""
+        return self.endpoint_ttls.get(url.split('?', 1)[0])
+
+    def get_fresh(self, key: Hashable, url: str) -> Optional[Tuple[CachedResponse, dict]]:
+        """returns the cached (response, json) if it has not expired yet, else None"""
+        if self.endpoint_ttl(url) is None:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.resp, entry.json
+
+    def conditional_headers(self, key: Hashable, headers: dict) -> dict:
+        """returns the headers with `If-None-Match` added if there is a cached response with a ETag for the key"""
+        entry = self._entries.get(key)
+        if entry is None or entry.etag is None:
+            return headers
+
+        return {**headers, 'If-None-Match': entry.etag}
+
+    def store(self, key: Hashable, url: str, resp, json: dict) -> Tuple[Any, dict]:
+        """
+        updates the cache from the response to a request for the key's url, and returns the (response, json) to use,
+        which is the cached one if the response was a 304 (Not Modified)
+        """
+        endpoint_ttl = self.endpoint_ttl(url)
+        if endpoint_ttl is None or resp is None:
+            return resp, json
+
+        entry = self._entries.get(key)
+        if resp.status == HTTP_NOT_MODIFIED and entry is not None:
+            self.revalidations += 1
+            # the 304's headers are the most recent ones (ex: ratelimit headers)
+            cached = entry.resp._replace(headers=resp.headers)
+            self._put(key, entry._replace(expires_at=self._expires_at(resp.headers, endpoint_ttl), resp=cached))
+            return cached, entry.json
+
+        self.misses += 1
+        cache_control = resp.headers.get('Cache-Control', '')
+        if resp.status != HTTP_OK or 'no-store' in cache_control.lower():
+            self._entries.pop(key, None)
+            return resp, json
+
+        cached = CachedResponse(status=resp.status, headers=resp.headers, url=url)
+        self._put(key, _Entry(self._expires_at(resp.headers, endpoint_ttl), resp.headers.get('ETag'), cached, json))
+        return resp, json
+
+    def _expires_at(self, headers, endpoint_ttl: float) -> float:
+        cache_control = headers.get('Cache-Control', '')
+        match = RE_MAX_AGE.search(cache_control)
+        if 'no-cache' in cache_control.lower():
+            ttl = 0
+        elif match is not None:
+            ttl = int(match.group(1))
+        else:
+            ttl = endpoint_ttl
+
+        return time.monotonic() + ttl
+
+    def _put(self, key: Hashable, entry: _Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        served_from_cache = self.hits + self.revalidations
+        total = served_from_cache + self.misses
+        return {
+            'hits': self.hits,
+            'revalidations': self.revalidations,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'hit_rate': served_from_cache / total if total else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
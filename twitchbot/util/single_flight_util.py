@@ -0,0 +1,42 @@
+from asyncio import Future, ensure_future, shield
+from typing import Awaitable, Callable, Dict, Hashable
+
+__all__ = [
+    'SingleFlight',
+]
+
+
+class SingleFlight:
+    """
+    coalesces concurrent calls that share a key into one in-flight call
+
+    the first caller for a key starts the call, callers arriving before it finishes share its result (or exception),
+    once it is done the key is forgotten so the next caller starts a new call
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, factory: Callable[[], Awaitable]) -> Future:
+        """
+        returns a future for the in-flight call for key, calling factory() to start one if there is none
+
+        the returned future is shielded, so cancelling one caller does not cancel the call for the others
+        """
+        future = self._in_flight.get(key)
+        if future is None:
+            future = ensure_future(factory())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done, key=key: self._forget(key, done))
+
+        return shield(future)
+
+    def _forget(self, key: Hashable, future: Future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    def __contains__(self, key: Hashable):
+        return key in self._in_flight
+
+    def __len__(self):
+        return len(self._in_flight)
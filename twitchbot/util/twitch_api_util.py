@@ -1,24 +1,39 @@
+import asyncio
+import time
 import warnings
 
-from typing import Dict, Tuple, NamedTuple, Optional, Any
+from typing import Dict, Tuple, NamedTuple, Optional, Any, Iterable, List, AsyncIterator, Callable
 from collections import namedtuple
 from datetime import datetime
 from json import JSONDecodeError, JSONEncoder, dumps as json_dumps
 
-from aiohttp import ClientSession, ClientResponse, ContentTypeError
+from aiohttp import ClientSession, ClientResponse, ContentTypeError, TCPConnector, ClientError, ClientConnectorError
 from async_timeout import timeout
 
-from ..config import get_client_id, get_oauth, get_nick, DEFAULT_CLIENT_ID
+from .single_flight_util import SingleFlight
+from .persistent_cache_util import PersistentTTLCache
+from .response_cache_util import ResponseCache
+from .circuit_breaker_util import CircuitBreaker, CircuitBreakerState, RetryPolicy
+from ..config import cfg, get_client_id, get_oauth, get_nick, get_oauth_refresh_token, get_client_secret, DEFAULT_CLIENT_ID
 from ..data import UserFollowers, UserInfo, Follower
+from ..exceptions import TwitchAPICircuitOpenError
 
 __all__ = ('CHANNEL_CHATTERS_API_URL', 'get_channel_chatters', 'get_stream_data', 'get_url', 'get_user_data', 'get_user_id',
            'STREAM_API_URL', 'USER_API_URL', 'get_user_followers', 'USER_FOLLOWERS_API_URL', 'get_headers',
            'get_user_info', 'USER_ACCOUNT_AGE_API', 'CHANNEL_INFO_API', 'get_channel_info', 'ChannelInfo',
            'get_channel_name_from_user_id', 'OauthTokenInfo', 'get_oauth_token_info', '_check_token', 'post_url', 'USER_FOLLOWAGE_API_URL',
-           'get_user_followage', 'send_shoutout', 'send_announcement', 'send_ban', 'delete_url', 'send_unban', 'SendTwitchApiResponseStatus')
+           'get_user_followage', 'send_shoutout', 'send_announcement', 'send_ban', 'delete_url', 'send_unban', 'SendTwitchApiResponseStatus',
+           'get_client_session', 'close_client_session', 'get_user_ids', 'USERS_BATCH_API_URL', 'USERS_BATCH_MAX_SIZE',
+           'get_streams_data', 'STREAMS_BATCH_API_URL', 'STREAMS_BATCH_MAX_SIZE', 'iter_channel_chatters_pages',
+           'CHANNEL_CHATTERS_PAGE_SIZE', 'twitch_api_response_cache', 'RESPONSE_CACHE_MAX_SIZE',
+           'DEFAULT_TWITCH_API_RETRY_POLICY', 'twitch_api_retry_policies', 'twitch_api_circuit_breakers',
+           'get_twitch_api_circuit_breaker', 'get_twitch_api_circuit_breaker_states', 'OauthRefreshResult',
+           'refresh_oauth_token', 'oauth_token_revalidation_loop', 'OAUTH_TOKEN_REVALIDATION_TASK_NAME')
 
 USER_API_URL = 'https://api.twitch.tv/helix/users?login={}'
+USERS_BATCH_API_URL = 'https://api.twitch.tv/helix/users?{}'
 STREAM_API_URL = 'https://api.twitch.tv/helix/streams?user_login={}'
+STREAMS_BATCH_API_URL = 'https://api.twitch.tv/helix/streams?{}'
 CHANNEL_CHATTERS_API_URL = 'https://api.twitch.tv/helix/chat/chatters?moderator_id={}&broadcaster_id={}'
 USER_FOLLOWERS_API_URL = 'https://api.twitch.tv/helix/users/follows?to_id={}'
 USER_ACCOUNT_AGE_API = 'https://api.twitch.tv/kraken/users/{}'
@@ -29,31 +44,189 @@ ANNOUNCEMENTS_API_URL = 'https://api.twitch.tv/helix/chat/announcements?broadcas
 BAN_API_URL = 'https://api.twitch.tv/helix/moderation/bans?broadcaster_id={}&moderator_id={}'
 UNBAN_API_URL = 'https://api.twitch.tv/helix/moderation/bans?broadcaster_id={}&moderator_id={}&user_id={}'
 
-user_id_cache: Dict[str, int] = {}
+# helix /users accepts up to 100 login/id parameters per request
+USERS_BATCH_MAX_SIZE = 100
+# helix /streams accepts up to 100 user_login parameters per request
+STREAMS_BATCH_MAX_SIZE = 100
+# helix /chat/chatters returns at most 1000 chatters per page
+CHANNEL_CHATTERS_PAGE_SIZE = 1000
+# how long user lookups are collected before being sent as one batched request
+USERS_BATCH_WINDOW_SECONDS = 0.05
+
+# connection pool settings for the shared ClientSession used for all twitch api requests
+CLIENT_SESSION_CONNECTION_LIMIT = 100
+CLIENT_SESSION_KEEPALIVE_TIMEOUT = 60
+CLIENT_SESSION_DNS_CACHE_TTL = 300
+
+# failed requests are retried with jittered exponential backoff, per endpoint policies can be set in `twitch_api_retry_policies`
+DEFAULT_TWITCH_API_RETRY_POLICY = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=5)
+# responses with these statuses mean twitch is having problems, not that the request was bad
+RETRYABLE_TWITCH_API_STATUSES = frozenset((500, 502, 503, 504))
+# consecutive failures before a endpoint's circuit breaker opens, and how long it stays open
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5
+CIRCUIT_BREAKER_RESET_TIMEOUT = 30
+
+# user ids and channel names are cached on disk so restarts do not need to look them all up again
+TWITCH_API_CACHE_FILENAME = 'twitch_api_cache.sqlite'
+USER_ID_CACHE_TTL = 60 * 60 * 24 * 7
+CHANNEL_NAME_CACHE_TTL = 60 * 60 * 24
+
+# GET responses of endpoints whose data rarely changes are cached (and revalidated with their ETag once expired)
+RESPONSE_CACHE_MAX_SIZE = 1000
+CHANNEL_INFO_RESPONSE_CACHE_TTL = 60
+USER_DATA_RESPONSE_CACHE_TTL = 60 * 10
+
+twitch_api_response_cache = ResponseCache(RESPONSE_CACHE_MAX_SIZE)
+twitch_api_response_cache.set_endpoint_ttl(CHANNEL_INFO_API, CHANNEL_INFO_RESPONSE_CACHE_TTL)
+twitch_api_response_cache.set_endpoint_ttl(USER_API_URL, USER_DATA_RESPONSE_CACHE_TTL)
+
+user_id_cache = PersistentTTLCache(TWITCH_API_CACHE_FILENAME, 'user_ids', ttl=USER_ID_CACHE_TTL)
+
+# coalesces identical concurrent GET requests made with get_url()
+_get_url_single_flight = SingleFlight()
+
+_client_session: Optional[ClientSession] = None
+_client_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_client_session() -> ClientSession:
+    """
+    returns the shared ClientSession used for all twitch api requests,
+    reusing it keeps connections (and their TLS handshakes) alive between requests
+
+    a new session is created if there is none yet, it was closed, or it belongs to a different event loop
+    must be called from within a running event loop
+    """
+    global _client_session, _client_session_loop
+
+    loop = asyncio.get_event_loop()
+    if _client_session is None or _client_session.closed or _client_session_loop is not loop:
+        _client_session = ClientSession(connector=TCPConnector(limit=CLIENT_SESSION_CONNECTION_LIMIT,
+                                                               keepalive_timeout=CLIENT_SESSION_KEEPALIVE_TIMEOUT,
+                                                               ttl_dns_cache=CLIENT_SESSION_DNS_CACHE_TTL))
+        _client_session_loop = loop
+
+    return _client_session
+
+
+async def close_client_session():
+    """closes the shared ClientSession, a new one is created by the next request"""
+    global _client_session, _client_session_loop
+
+    if _client_session is not None and not _client_session.closed:
+        await _client_session.close()
+
+    _client_session = _client_session_loop = None
+
+
+# endpoint (url without its query string) => retry policy
+twitch_api_retry_policies: Dict[str, RetryPolicy] = {}
+# endpoint (url without its query string) => circuit breaker
+twitch_api_circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def _print_circuit_breaker_state_change(breaker: CircuitBreaker, old_state: str, new_state: str):
+    print(f'[TWITCH_API] circuit breaker for "{breaker.name}" changed from {old_state} to {new_state}')
+
+
+def _endpoint(url: str) -> str:
+    return url.split('?', 1)[0]
+
+
+def get_twitch_api_circuit_breaker(url: str) -> CircuitBreaker:
+    """returns the circuit breaker for the url's endpoint, creating it if needed"""
+    endpoint = _endpoint(url)
+    breaker = twitch_api_circuit_breakers.get(endpoint)
+    if breaker is None:
+        breaker = twitch_api_circuit_breakers[endpoint] = CircuitBreaker(
+            endpoint, CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT, _print_circuit_breaker_state_change)
+    return breaker
+
+
+def get_twitch_api_circuit_breaker_states() -> Dict[str, str]:
+    """returns endpoint => circuit breaker state (closed, open, half_open) for all endpoints that were requested"""
+    return {endpoint: breaker.state for endpoint, breaker in twitch_api_circuit_breakers.items()}
+
+
+def _can_retry_error(method: str, error: Exception) -> bool:
+    # a POST that failed after connecting may have been received by twitch, retrying it could apply it twice
+    return method != 'POST' or isinstance(error, ClientConnectorError)
+
+
+async def _request(method: str, url: str, headers: dict = None, **kwargs) -> Tuple[ClientResponse, dict]:
+    """
+    sends the request, retrying it according to its endpoint's retry policy if it fails with a connection error,
+    timeout, or 5xx status
+
+    raises TwitchAPICircuitOpenError without sending the request if the endpoint's circuit breaker is open
+    """
+    # headers are given per request so they are merged with the session's defaults instead of needing a session per set of headers
+    headers = headers if headers is not None else get_headers()
+    breaker = get_twitch_api_circuit_breaker(url)
+    policy = twitch_api_retry_policies.get(breaker.name, DEFAULT_TWITCH_API_RETRY_POLICY)
+
+    attempt = 0
+    while True:
+        attempt += 1
+        if not breaker.allow_request():
+            raise TwitchAPICircuitOpenError(breaker.name, breaker.retry_after)
+
+        try:
+            async with timeout(10):
+                async with get_client_session().request(method, url, headers=headers, **kwargs) as resp:
+                    resp, json = await _extract_response_and_json_from_request(resp)
+        except (ClientError, asyncio.TimeoutError) as e:
+            breaker.record_failure()
+            if attempt >= policy.max_attempts or not _can_retry_error(method, e) or breaker.state == CircuitBreakerState.OPEN:
+                raise
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            if resp.status not in RETRYABLE_TWITCH_API_STATUSES:
+                breaker.record_success()
+                return resp, json
+
+            breaker.record_failure()
+            if attempt >= policy.max_attempts or method == 'POST' or breaker.state == CircuitBreakerState.OPEN:
+                return resp, json
+
+        await asyncio.sleep(policy.delay(attempt))
+
+
+def _single_flight_key(method: str, url: str, headers: dict) -> tuple:
+    """key identifying requests that can share one response: same method, url, and auth (client id + token)"""
+    return method, url, headers.get(CLIENT_ID_KEY), headers.get(AUTHORIZATION_KEY)
 
 
 async def get_url(url: str, headers: dict = None) -> Tuple[ClientResponse, dict]:
+    """
+    sends a GET request, concurrent calls for the same url and auth share a single request,
+    and so also share the same (response, json) result
+
+    responses of endpoints that have a TTL in `twitch_api_response_cache` are served from it while they are fresh
+    """
     headers = headers if headers is not None else get_headers()
-    async with ClientSession(headers=headers) as session:
-        async with timeout(10):
-            async with session.get(url) as resp:
-                return await _extract_response_and_json_from_request(resp)
+    key = _single_flight_key('GET', url, headers)
+
+    cached = twitch_api_response_cache.get_fresh(key, url)
+    if cached is not None:
+        return cached
+
+    return await _get_url_single_flight.do(key, lambda: _get_url_with_response_cache(key, url, headers))
+
+
+async def _get_url_with_response_cache(key: tuple, url: str, headers: dict) -> Tuple[ClientResponse, dict]:
+    resp, json = await _request('GET', url, twitch_api_response_cache.conditional_headers(key, headers))
+    return twitch_api_response_cache.store(key, url, resp, json)
 
 
 async def post_url(url: str, headers: dict = None, body: Any = None) -> Tuple[ClientResponse, dict]:
-    headers = headers if headers is not None else get_headers()
-    async with ClientSession(headers=headers) as session:
-        async with timeout(10):
-            async with session.post(url, data=body) as resp:
-                return await _extract_response_and_json_from_request(resp)
+    return await _request('POST', url, headers, data=body)
 
 
 async def delete_url(url: str, headers: dict = None) -> Tuple[ClientResponse, dict]:
-    headers = headers if headers is not None else get_headers()
-    async with ClientSession(headers=headers) as session:
-        async with timeout(10):
-            async with session.delete(url) as resp:
-                return await _extract_response_and_json_from_request(resp)
+    return await _request('DELETE', url, headers)
 
 
 def _check_headers_has_auth(headers: dict) -> bool:
@@ -73,7 +246,11 @@ async def get_user_info(user: str) -> UserInfo:
         warnings.warn('[GET_USER_INFO] headers for the twitch api request are missing authorization', stacklevel=2)
         return UserInfo(-1, '', '', '', '', '', '', '', -1)
 
-    _, json = await get_url(USER_API_URL.format(user), headers)
+    try:
+        _, json = await get_url(USER_API_URL.format(user), headers)
+    except TwitchAPICircuitOpenError as e:
+        print(f'[GET_USER_INFO] {e}')
+        return UserInfo(-1, '', '', '', '', '', '', '', -1)
 
     if 'error' in json or not json.get('data', None):
         return UserInfo(-1, '', '', '', '', '', '', '', -1)
@@ -99,7 +276,11 @@ async def get_user_followers(user: str, headers: dict = None) -> UserFollowers:
         return UserFollowers(-1, '', -1, '', -1, [])
 
     user_id = await get_user_id(user, headers)
-    _, json = await get_url(USER_FOLLOWERS_API_URL.format(user_id), headers)
+    try:
+        _, json = await get_url(USER_FOLLOWERS_API_URL.format(user_id), headers)
+    except TwitchAPICircuitOpenError as e:
+        print(f'[GET_USER_FOLLOWERS] {e}')
+        return UserFollowers(-1, '', -1, '', -1, [])
 
     # covers invalid user id, or some other API error, such as invalid client-id
     if not json or json.get('status', -1) == 400:
@@ -109,7 +290,7 @@ async def get_user_followers(user: str, headers: dict = None) -> UserFollowers:
                          following=user,
                          following_id=user_id,
                          name=user,
-                         id=user_id_cache[user],
+                         id=user_id,
                          followers=json['data'])
 
 
@@ -121,7 +302,11 @@ async def get_user_followage(channel_name: str, follower: str, headers: dict = N
 
     channel_id = await get_user_id(channel_name, headers)
     follower_id = await get_user_id(follower, headers)
-    _, json = await get_url(USER_FOLLOWAGE_API_URL.format(channel_id, follower_id), headers)
+    try:
+        _, json = await get_url(USER_FOLLOWAGE_API_URL.format(channel_id, follower_id), headers)
+    except TwitchAPICircuitOpenError as e:
+        print(f'[GET_USER_FOLLOWAGE] {e}')
+        return Follower(-1, '', -1, '', datetime.min)
 
     # verify that the api response has data, and its total is not 0
     if not json or not json.get('total', 0) or not json.get('data'):
@@ -147,6 +332,12 @@ class SendTwitchApiResponseStatus(NamedTuple):
         return await self.resp.json()
 
 
+def _circuit_open_send_status(tag: str, error: TwitchAPICircuitOpenError) -> SendTwitchApiResponseStatus:
+    """the failed result of a send_* helper whose request was not sent because its endpoint's circuit breaker is open"""
+    warnings.warn(f'[{tag}] {error}', stacklevel=3)
+    return SendTwitchApiResponseStatus(success=False, status_code=-1, resp=None, text=str(error), json={})
+
+
 async def send_shoutout(channel_name: str, target_name: str, headers: dict = None) -> SendTwitchApiResponseStatus:
     headers = (headers.copy() if headers is not None else get_headers())
     if not _check_headers_has_auth(headers):
@@ -157,11 +348,14 @@ async def send_shoutout(channel_name: str, target_name: str, headers: dict = Non
     moderator_id = await get_user_id(get_nick(), headers)
 
     from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
-    resp, json = await enqueue_twitch_api_request(
-        SHOUTOUT_API_URL.format(channel_id, target_id, moderator_id),
-        headers=headers,
-        mode=PendingTwitchAPIRequestMode.POST
-    )
+    try:
+        resp, json = await enqueue_twitch_api_request(
+            SHOUTOUT_API_URL.format(channel_id, target_id, moderator_id),
+            headers=headers,
+            mode=PendingTwitchAPIRequestMode.POST
+        )
+    except TwitchAPICircuitOpenError as e:
+        return _circuit_open_send_status('SHOUTOUT', e)
 
     if (resp.status != 204):
         resp_text = await resp.text("utf-8")
@@ -197,12 +391,15 @@ async def send_announcement(channel_name: str, message: str, color: str = None,
 
     headers.update({'Content-Type': 'application/json'})
     from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
-    resp, json = await enqueue_twitch_api_request(
-        ANNOUNCEMENTS_API_URL.format(channel_id, moderator_id),
-        headers=headers,
-        body=body,
-        mode=PendingTwitchAPIRequestMode.POST
-    )
+    try:
+        resp, json = await enqueue_twitch_api_request(
+            ANNOUNCEMENTS_API_URL.format(channel_id, moderator_id),
+            headers=headers,
+            body=body,
+            mode=PendingTwitchAPIRequestMode.POST
+        )
+    except TwitchAPICircuitOpenError as e:
+        return _circuit_open_send_status('ANNOUNCEMENT', e)
 
     if (resp.status != 204):
         resp_text = await resp.text("utf-8")
@@ -228,7 +425,10 @@ async def send_unban(channel_name: str, username: str, headers: dict = None) ->
     broadcaster_id = await get_user_id(channel_name, headers)
     user_id = await get_user_id(username, headers)
     #                                                broadcaster_id={}&moderator_id={}&user_id={}
-    resp, json = await delete_url(UNBAN_API_URL.format(broadcaster_id, moderator_id, user_id))
+    try:
+        resp, json = await delete_url(UNBAN_API_URL.format(broadcaster_id, moderator_id, user_id))
+    except TwitchAPICircuitOpenError as e:
+        return _circuit_open_send_status('UNBAN', e)
 
     if resp.status != 204:
         resp_text = await resp.text()
@@ -282,12 +482,15 @@ async def send_ban(
 
     headers.update({'Content-Type': 'application/json'})
     from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
-    resp, json = await enqueue_twitch_api_request(
-        BAN_API_URL.format(channel_id, moderator_id),
-        headers=headers,
-        body=body,
-        mode=PendingTwitchAPIRequestMode.POST
-    )
+    try:
+        resp, json = await enqueue_twitch_api_request(
+            BAN_API_URL.format(channel_id, moderator_id),
+            headers=headers,
+            body=body,
+            mode=PendingTwitchAPIRequestMode.POST
+        )
+    except TwitchAPICircuitOpenError as e:
+        return _circuit_open_send_status('BAN', e)
 
     if resp is not None and resp.status != 200:
         returnMessage = json['message']
@@ -304,26 +507,92 @@ async def send_ban(
     )
 
 
+class _UserLookupBatcher:
+    """
+    collects user lookups made within a short window and resolves them with as few helix /users requests as possible,
+    each request looks up to USERS_BATCH_MAX_SIZE users, the results are handed back to each caller
+    """
+
+    def __init__(self):
+        # auth key => login => future for that login's user data
+        self._pending: Dict[tuple, Dict[str, asyncio.Future]] = {}
+        self._headers: Dict[tuple, dict] = {}
+        self._flush_handles: Dict[tuple, asyncio.TimerHandle] = {}
+
+    def lookup(self, login: str, headers: dict) -> asyncio.Future:
+        """returns a future that resolves to the user's helix data, or a empty dict if the user was not found"""
+        login = login.lower()
+        auth_key = _single_flight_key('GET', USERS_BATCH_API_URL, headers)
+        pending = self._pending.setdefault(auth_key, {})
+        self._headers[auth_key] = headers
+
+        if login not in pending:
+            pending[login] = asyncio.get_event_loop().create_future()
+
+        if len(pending) >= USERS_BATCH_MAX_SIZE:
+            self._flush(auth_key)
+        elif auth_key not in self._flush_handles:
+            self._flush_handles[auth_key] = asyncio.get_event_loop().call_later(USERS_BATCH_WINDOW_SECONDS, self._flush, auth_key)
+
+        return asyncio.shield(pending[login])
+
+    def _flush(self, auth_key: tuple):
+        from .task_util import add_nameless_task
+
+        handle = self._flush_handles.pop(auth_key, None)
+        if handle is not None:
+            handle.cancel()
+
+        pending = self._pending.pop(auth_key, {})
+        if pending:
+            add_nameless_task(self._send_batch(pending, self._headers.pop(auth_key)))
+
+    @staticmethod
+    async def _send_batch(pending: Dict[str, asyncio.Future], headers: dict):
+        from urllib.parse import urlencode
+        from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
+
+        try:
+            query = urlencode([('login', login) for login in pending])
+            _, json = await enqueue_twitch_api_request(USERS_BATCH_API_URL.format(query), headers, PendingTwitchAPIRequestMode.GET)
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        users = {data['login']: data for data in (json or {}).get('data') or ()}
+        user_id_cache.set_many({login: data['id'] for login, data in users.items()})
+        for login, future in pending.items():
+            if not future.done():
+                future.set_result(users.get(login, {}))
+
+
+_user_lookup_batcher = _UserLookupBatcher()
+
+
 async def get_user_data(user: str, headers: dict = None) -> dict:
+    """
+    gets the helix user data for the user, lookups from concurrent callers are batched together into
+    as few requests as possible
+    """
     headers = headers if headers is not None else get_headers()
     if not _check_headers_has_auth(headers):
         warnings.warn('[GET_USER_DATA] headers for the twitch api request are missing authorization', stacklevel=2)
         return {}
 
-    # _, json = await get_url(USER_API_URL.format(user), headers)
-    from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
-    _, json = await enqueue_twitch_api_request(USER_API_URL.format(user), headers, PendingTwitchAPIRequestMode.GET)
-
-    if not json.get('data'):
+    try:
+        return await _user_lookup_batcher.lookup(user, headers)
+    except TwitchAPICircuitOpenError as e:
+        print(f'[GET_USER_DATA] {e}')
         return {}
 
-    return json['data'][0]
-
 
 async def get_user_id(user: str, headers: dict = None, verbose=True) -> int:
-    # shortcut if the user's id was already requested
-    if user in user_id_cache:
-        return user_id_cache[user]
+    # shortcut if the user's id was already requested, ids are cached by their lowercase login
+    user_id = user_id_cache.get(user.lower())
+    if user_id is not None:
+        return user_id
 
     headers = headers if headers is not None else get_headers()
     if not _check_headers_has_auth(headers):
@@ -337,10 +606,20 @@ async def get_user_id(user: str, headers: dict = None, verbose=True) -> int:
             warnings.warn(f'[GET_USER_ID] unable to get user_id for username "{user}"', stacklevel=2)
         return -1
 
-    user_id_cache[user] = data['id']
+    # the user's id was added to user_id_cache by the batched lookup
     return data['id']
 
 
+async def get_user_ids(users: Iterable[str], headers: dict = None, verbose=True) -> Dict[str, int]:
+    """
+    gets the user ids for all the users, using batched requests for the ones that are not cached yet,
+    users that could not be found have a id of -1
+    """
+    users: List[str] = list(dict.fromkeys(users))
+    ids = await asyncio.gather(*(get_user_id(user, headers, verbose=verbose) for user in users))
+    return dict(zip(users, ids))
+
+
 async def get_stream_data(user_id: str, headers: dict = None) -> dict:
     headers = headers if headers is not None else get_headers()
     if not _check_headers_has_auth(headers):
@@ -348,7 +627,11 @@ async def get_stream_data(user_id: str, headers: dict = None) -> dict:
         return {}
     
     from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
-    _, json = await enqueue_twitch_api_request(STREAM_API_URL.format(user_id), headers, PendingTwitchAPIRequestMode.GET)
+    try:
+        _, json = await enqueue_twitch_api_request(STREAM_API_URL.format(user_id), headers, PendingTwitchAPIRequestMode.GET)
+    except TwitchAPICircuitOpenError as e:
+        print(f'[GET_STREAM_DATA] {e}')
+        return {}
 
     if not json.get('data'):
         return {}
@@ -356,6 +639,43 @@ async def get_stream_data(user_id: str, headers: dict = None) -> dict:
     return json['data'][0]
 
 
+async def get_streams_data(user_logins: Iterable[str], headers: dict = None) -> Dict[str, dict]:
+    """
+    gets the stream data for all the users, using one request per STREAMS_BATCH_MAX_SIZE users
+
+    returns a dict of lowercase login => stream data, users that are not live are not included
+
+    raises ValueError (or TwitchAPICircuitOpenError) if a request fails, instead of returning a partial result,
+    so callers do not mistake the users of a failed request for users that are not live
+    """
+    from urllib.parse import urlencode
+
+    headers = headers if headers is not None else get_headers()
+    if not _check_headers_has_auth(headers):
+        warnings.warn('[GET_STREAMS_DATA] headers for the twitch api request are missing authorization', stacklevel=2)
+        return {}
+
+    user_logins = list(dict.fromkeys(login.lower() for login in user_logins))
+
+    from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
+    responses = await asyncio.gather(*(
+        enqueue_twitch_api_request(
+            STREAMS_BATCH_API_URL.format(urlencode([('first', STREAMS_BATCH_MAX_SIZE)] + [('user_login', login) for login in batch])),
+            headers, PendingTwitchAPIRequestMode.GET)
+        for batch in (user_logins[i:i + STREAMS_BATCH_MAX_SIZE] for i in range(0, len(user_logins), STREAMS_BATCH_MAX_SIZE))
+    ))
+
+    streams = {}
+    for resp, json in responses:
+        if resp.status != 200:
+            raise ValueError(f'[GET_STREAMS_DATA] twitch responded with status {resp.status}: {json}')
+
+        for data in json.get('data') or ():
+            streams[data['user_login'].lower()] = data
+
+    return streams
+
+
 async def get_channel_chatters(channel: str, headers: dict = None) -> dict:
     headers = headers.copy() if headers is not None else get_headers()
 
@@ -364,10 +684,14 @@ async def get_channel_chatters(channel: str, headers: dict = None) -> dict:
         return {}
 
     from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
-    resp, data = await enqueue_twitch_api_request(
-        CHANNEL_CHATTERS_API_URL.format(await get_user_id(get_nick(), headers), await get_user_id(channel, headers)), headers,
-        PendingTwitchAPIRequestMode.GET
-    )
+    try:
+        resp, data = await enqueue_twitch_api_request(
+            CHANNEL_CHATTERS_API_URL.format(await get_user_id(get_nick(), headers), await get_user_id(channel, headers)), headers,
+            PendingTwitchAPIRequestMode.GET
+        )
+    except TwitchAPICircuitOpenError as e:
+        print(f'[GET_CHANNEL_CHATTERS] {e}')
+        return {}
 
     if resp.status == 403:
         print(f'[GET_CHANNEL_CHATTERS] Failed to get channel chatters for channel "{channel}"; Twitch responded with 403 (Forbidden).\n\t'
@@ -380,6 +704,49 @@ async def get_channel_chatters(channel: str, headers: dict = None) -> dict:
     return data
 
 
+async def iter_channel_chatters_pages(channel: str, headers: dict = None, on_forbidden: Callable[[], Any] = None) -> AsyncIterator[dict]:
+    """
+    yields every page of the channel's chatters, following the pagination cursor until twitch has no more pages,
+    so pages can be processed as they arrive instead of after the full list was received
+
+    stops without yielding anything (or any more pages) if a request fails (or the endpoint's circuit breaker is open),
+    on_forbidden is called if twitch responded with 403 (the token cannot read the channel's chatters)
+    """
+    headers = headers.copy() if headers is not None else get_headers()
+
+    if not _check_headers_has_auth(headers):
+        warnings.warn('[GET_CHANNEL_CHATTERS] headers for the twitch api request are missing authorization', stacklevel=2)
+        return
+
+    from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
+    url = f'{CHANNEL_CHATTERS_API_URL.format(await get_user_id(get_nick(), headers), await get_user_id(channel, headers))}' \
+          f'&first={CHANNEL_CHATTERS_PAGE_SIZE}'
+    cursor = None
+    while True:
+        try:
+            resp, data = await enqueue_twitch_api_request(url if cursor is None else f'{url}&after={cursor}', headers,
+                                                          PendingTwitchAPIRequestMode.GET)
+        except TwitchAPICircuitOpenError as e:
+            print(f'[GET_CHANNEL_CHATTERS] {e}')
+            return
+
+        if resp.status == 403:
+            print(f'[GET_CHANNEL_CHATTERS] Failed to get channel chatters for channel "{channel}"; Twitch responded with 403 (Forbidden).\n\t'
+                  f'Make sure that provided token has the scope access `moderator:read:chatters` for channel "{channel}"')
+            if on_forbidden is not None:
+                on_forbidden()
+            return
+
+        if resp.status != 200 or data.get('error') is not None:
+            return
+
+        yield data
+
+        cursor = (data.get('pagination') or {}).get('cursor')
+        if not cursor or not data.get('data'):
+            return
+
+
 CLIENT_ID_KEY = 'Client-ID'
 AUTHORIZATION_KEY = 'Authorization'
 
@@ -421,7 +788,11 @@ async def get_channel_info(broadcaster_name_or_id: str, headers: dict = None) ->
         user_id = broadcaster_name_or_id
         
     from ..ratelimit_twitch_api_queue import enqueue_twitch_api_request, PendingTwitchAPIRequestMode
-    _, json =  await enqueue_twitch_api_request(CHANNEL_INFO_API.format(user_id), headers, PendingTwitchAPIRequestMode.GET)
+    try:
+        _, json = await enqueue_twitch_api_request(CHANNEL_INFO_API.format(user_id), headers, PendingTwitchAPIRequestMode.GET)
+    except TwitchAPICircuitOpenError as e:
+        print(f'[GET_CHANNEL_INFO] {e}')
+        return None
     data = dict_get_value(json, 'data', 0)
 
     if not data:
@@ -431,14 +802,15 @@ async def get_channel_info(broadcaster_name_or_id: str, headers: dict = None) ->
                        broadcaster_language=data['broadcaster_language'], game_id=data['game_id'], game_name=data['game_name'], title=data['title'])
 
 
-_channel_id_to_name_cache = {}
+_channel_id_to_name_cache = PersistentTTLCache(TWITCH_API_CACHE_FILENAME, 'channel_names', ttl=CHANNEL_NAME_CACHE_TTL)
 
 
 async def get_channel_name_from_user_id(user_id: str, headers: dict = None) -> str:
     user_id = user_id.strip()
 
-    if user_id in _channel_id_to_name_cache:
-        return _channel_id_to_name_cache[user_id]
+    channel_name = _channel_id_to_name_cache.get(user_id)
+    if channel_name is not None:
+        return channel_name
 
     headers = headers if headers is not None else get_headers()
     if not _check_headers_has_auth(headers):
@@ -457,10 +829,42 @@ async def get_channel_name_from_user_id(user_id: str, headers: dict = None) -> s
 OauthTokenInfo = namedtuple('OauthTokenInfo', 'client_id login scopes user_id expires_in error_message status')
 
 
-async def get_oauth_token_info(token: str) -> OauthTokenInfo:
+OauthRefreshResult = namedtuple('OauthRefreshResult', 'access_token refresh_token expires_in error_message status')
+
+OAUTH_VALIDATE_URL = 'https://id.twitch.tv/oauth2/validate'
+OAUTH_TOKEN_URL = 'https://id.twitch.tv/oauth2/token'
+# twitch requires tokens to be validated at least once an hour while they are in use
+OAUTH_REVALIDATION_INTERVAL = 60 * 60
+# tokens that expire within this many seconds are refreshed (if a refresh token is configured)
+OAUTH_REFRESH_MARGIN = 60 * 10
+OAUTH_TOKEN_REVALIDATION_TASK_NAME = 'oauth_token_revalidation_loop'
+
+# token => (time.monotonic() it was validated at, token info), only valid tokens are cached
+_oauth_token_info_cache: Dict[str, Tuple[float, OauthTokenInfo]] = {}
+
+
+def _is_valid_token_info(info: OauthTokenInfo) -> bool:
+    return bool(info.login) and info.status == -1
+
+
+async def get_oauth_token_info(token: str, use_cache: bool = True) -> OauthTokenInfo:
+    """
+    validates the token with twitch
+
+    valid results are cached until the next hourly revalidation is due (or the token expires),
+    so reconnecting does not need to validate the token again, `use_cache=False` always asks twitch
+    """
     token = token.replace('oauth:', '')
-    _, json = await get_url('https://id.twitch.tv/oauth2/validate', headers={'Authorization': f'OAuth {token}'})
-    return OauthTokenInfo(client_id=json.get('client_id', ''),
+
+    cached = _oauth_token_info_cache.get(token)
+    if use_cache and cached is not None:
+        validated_at, info = cached
+        elapsed = time.monotonic() - validated_at
+        if elapsed < OAUTH_REVALIDATION_INTERVAL and (not info.expires_in or elapsed < info.expires_in):
+            return info._replace(expires_in=max(0, int(info.expires_in - elapsed)) if info.expires_in else info.expires_in)
+
+    _, json = await get_url(OAUTH_VALIDATE_URL, headers={'Authorization': f'OAuth {token}'})
+    info = OauthTokenInfo(client_id=json.get('client_id', ''),
                           login=json.get('login', ''),
                           scopes=json.get('scopes', []),
                           user_id=json.get('user_id', ''),
@@ -468,6 +872,83 @@ async def get_oauth_token_info(token: str) -> OauthTokenInfo:
                           error_message=json.get('message', ''),
                           status=json.get('status', -1))
 
+    if _is_valid_token_info(info):
+        _oauth_token_info_cache[token] = (time.monotonic(), info)
+    else:
+        _oauth_token_info_cache.pop(token, None)
+
+    return info
+
+
+async def refresh_oauth_token(refresh_token: str, client_id: str = None, client_secret: str = None) -> OauthRefreshResult:
+    """gets a new access token (and refresh token) for the refresh token"""
+    resp, json = await post_url(OAUTH_TOKEN_URL, headers={}, body={
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+        'client_id': client_id if client_id is not None else get_client_id(),
+        'client_secret': client_secret if client_secret is not None else get_client_secret(),
+    })
+
+    return OauthRefreshResult(access_token=json.get('access_token', ''),
+                              refresh_token=json.get('refresh_token', refresh_token),
+                              expires_in=json.get('expires_in', 0),
+                              error_message=json.get('message', ''),
+                              status=resp.status)
+
+
+async def _refresh_configured_oauth_token() -> Optional[OauthTokenInfo]:
+    """refreshes the oauth token in the config using its refresh token, returns the new token's info, or None if it was not refreshed"""
+    from .environment_util import is_env_key
+
+    refresh_token, client_secret = get_oauth_refresh_token(), get_client_secret()
+    if not refresh_token or not client_secret:
+        return None
+
+    if is_env_key(cfg.oauth) or is_env_key(cfg.oauth_refresh_token or ''):
+        print('[OAUTH] the oauth token is set from the environment, the refreshed token cannot be saved there, not refreshing it')
+        return None
+
+    result = await refresh_oauth_token(refresh_token)
+    if not result.access_token:
+        print(f'[OAUTH] failed to refresh the oauth token, twitch returned status code ({result.status}) and error message ({result.error_message})')
+        return None
+
+    cfg.data['oauth_refresh_token'] = result.refresh_token
+    cfg['oauth'] = f'oauth:{result.access_token}'
+    print('[OAUTH] refreshed the oauth token, it will be used the next time the bot connects to twitch')
+
+    return await get_oauth_token_info(result.access_token, use_cache=False)
+
+
+async def oauth_token_revalidation_loop():
+    """
+    revalidates the oauth token with twitch every hour (as twitch requires),
+    if a refresh token is configured the token is refreshed shortly before it expires, or if it is invalid
+    """
+    while True:
+        try:
+            info = await get_oauth_token_info(get_oauth(remove_prefix=True))
+        except TwitchAPICircuitOpenError as e:
+            # twitch could not be asked, that does not mean the token is invalid
+            print(f'[OAUTH] could not revalidate the oauth token: {e}')
+            await asyncio.sleep(max(e.retry_after, 1))
+            continue
+
+        if not _is_valid_token_info(info) or (info.expires_in and info.expires_in <= OAUTH_REFRESH_MARGIN):
+            refreshed = await _refresh_configured_oauth_token()
+            if refreshed is not None:
+                info = refreshed
+            elif not _is_valid_token_info(info):
+                print(f'[OAUTH] the oauth token is INVALID/EXPIRED, twitch returned status code ({info.status}) '
+                      f'and error message ({info.error_message})')
+
+        delay = OAUTH_REVALIDATION_INTERVAL
+        if _is_valid_token_info(info) and info.expires_in:
+            # wake up in time to refresh the token before it expires
+            delay = min(delay, max(info.expires_in - OAUTH_REFRESH_MARGIN, 60))
+
+        await asyncio.sleep(delay)
+
 
 def _print_quit(msg):
     print(msg)